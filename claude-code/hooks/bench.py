@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for Delobotomize hooks
+
+Claude Code runs a hook in a fresh interpreter on every tool call, so the
+cost that matters is wall time from exec to exit. This runs each hook
+repeatedly against a throwaway spool and reports its overhead over a bare
+`python -c pass`, with the hook helper running and with it disabled, plus
+the modules each hook imports beyond the bare interpreter (-X importtime).
+
+Usage:
+    python claude-code/hooks/bench.py [--runs 40] [--budget-ms 5] [--output results.json]
+
+Exits non-zero if a per-tool-call hook's overhead with the helper running
+exceeds --budget-ms at p50.
+"""
+
+import argparse
+import compileall
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+HOOKS = ('session_start', 'post_tool_use', 'pre_request', 'post_response')
+PER_CALL_HOOKS = ('post_tool_use', 'pre_request', 'post_response')
+SAMPLE_PAYLOAD = json.dumps({
+    'session_id': 'bench-session',
+    'tool_name': 'Read',
+    'tool_input': {'file_path': 'src/index.ts'},
+    'model': 'claude-3-5-sonnet-20241022',
+    'status': 200
+}).encode('utf-8')
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def time_runs(argv: list, runs: int, env: dict, cwd: str) -> dict:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, input=SAMPLE_PAYLOAD, env=env, cwd=cwd,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': round(percentile(samples, 0.5), 2), 'p95_ms': round(percentile(samples, 0.95), 2)}
+
+
+def import_times(argv: list, env: dict, cwd: str) -> dict:
+    """module -> (self us, cumulative us) from -X importtime"""
+    result = subprocess.run(argv[:1] + ['-X', 'importtime'] + argv[1:], input=SAMPLE_PAYLOAD,
+                            env=env, cwd=cwd, capture_output=True)
+    modules = {}
+    for line in result.stderr.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def extra_imports(hook_path: str, env: dict, cwd: str, baseline: dict) -> dict:
+    modules = import_times([sys.executable, hook_path], env, cwd)
+    extra = {name: times for name, times in modules.items() if name not in baseline}
+    top = sorted(extra.items(), key=lambda item: item[1][0], reverse=True)[:5]
+    return {
+        'count': len(extra),
+        'self_ms': round(sum(own for own, _ in extra.values()) / 1000, 2),
+        'top': {name: round(own / 1000, 2) for name, (own, _) in top}
+    }
+
+
+def stop_drainer(spool_dir: str):
+    try:
+        with open(os.path.join(spool_dir, 'drainer.lock')) as f:
+            os.kill(int(f.read()), signal.SIGTERM)
+    except (OSError, ValueError):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Delobotomize hook startup overhead')
+    parser.add_argument('--runs', type=int, default=40, help='invocations per hook and mode')
+    parser.add_argument('--budget-ms', type=float, default=5.0,
+                        help='max p50 overhead of a per-tool-call hook with the helper running')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    # Installed hooks run with a warm bytecode cache; make sure we measure
+    # that even when PYTHONDONTWRITEBYTECODE is set
+    compileall.compile_dir(HOOKS_DIR, maxlevels=0, quiet=1)
+
+    workdir = tempfile.mkdtemp(prefix='delobotomize-hook-bench-')
+    spool_dir = os.path.join(workdir, 'spool')
+    env = dict(os.environ)
+    env.update({
+        'DELOBOTOMIZE_SPOOL_DIR': spool_dir,
+        # Nothing listens here; the drainer just holds events and backs off
+        'DELOBOTOMIZE_SERVER_URL': 'http://127.0.0.1:9',
+        'DELOBOTOMIZE_DRAINER_IDLE_S': '30'
+    })
+    env.pop('CLAUDE_SESSION_ID', None)
+
+    baseline_argv = [sys.executable, '-c', 'pass']
+    baseline = time_runs(baseline_argv, args.runs, env, workdir)
+    baseline_imports = import_times(baseline_argv, env, workdir)
+    results = {'python': sys.version.split()[0], 'baseline': baseline, 'budget_ms': args.budget_ms, 'hooks': {}}
+
+    print(f"Bare interpreter: p50 {baseline['p50_ms']:.1f} ms  p95 {baseline['p95_ms']:.1f} ms")
+    print(f"{'hook':<16} {'mode':<11} {'p50':>7} {'p95':>7} {'overhead':>9}")
+
+    over_budget = []
+    try:
+        for hook in HOOKS:
+            hook_path = os.path.join(HOOKS_DIR, f'{hook}.py')
+            argv = [sys.executable, hook_path]
+            entry = {}
+            for mode, helper in (('helper', '1'), ('in-process', '0')):
+                mode_env = dict(env, DELOBOTOMIZE_HOOK_HELPER=helper)
+                # Warm up: the first call starts the drainer and its helper
+                subprocess.run(argv, input=SAMPLE_PAYLOAD, env=mode_env, cwd=workdir, stderr=subprocess.DEVNULL)
+                time.sleep(0.2)
+
+                timing = time_runs(argv, args.runs, mode_env, workdir)
+                timing['overhead_ms'] = round(timing['p50_ms'] - baseline['p50_ms'], 2)
+                timing['imports'] = extra_imports(hook_path, mode_env, workdir, baseline_imports)
+                entry[mode] = timing
+                print(f"{hook:<16} {mode:<11} {timing['p50_ms']:>7.1f} {timing['p95_ms']:>7.1f} "
+                      f"{timing['overhead_ms']:>+8.1f}  ({timing['imports']['count']} extra imports, "
+                      f"{timing['imports']['self_ms']:.1f} ms)")
+
+                if mode == 'helper' and hook in PER_CALL_HOOKS and timing['overhead_ms'] > args.budget_ms:
+                    over_budget.append(hook)
+            results['hooks'][hook] = entry
+    finally:
+        stop_drainer(spool_dir)
+
+    results['over_budget'] = over_budget
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if over_budget:
+        print(f"\nOver the {args.budget_ms:.1f} ms budget: {', '.join(over_budget)}")
+        return 1
+    print(f"\nAll per-tool-call hooks within the {args.budget_ms:.1f} ms budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
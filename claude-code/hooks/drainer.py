@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Spool drainer for Delobotomize hooks
+
+Started on demand by spool.py. Delivers spooled hook events to the
+monitoring server in the order they were written, then exits after
+DELOBOTOMIZE_DRAINER_IDLE_S seconds without new events.
+
+Events are sent to /api/events/batch as NDJSON, up to
+DELOBOTOMIZE_DRAINER_BATCH per request. Whatever hooks spool while a batch
+is in flight (or during the short poll interval) is claimed and sent as
+the next batch, so bursts of tool calls cost a few requests, not one each.
+
+The active spool file is claimed by renaming it to events.<ns>.ndjson, so
+hooks keep appending to a fresh file while the claimed one is delivered.
+Progress through a claimed file is checkpointed in a sidecar .offset file;
+after a crash or a server outage delivery resumes where it stopped. Events
+are delivered at least once - the server ignores ids it has already stored.
+While the server is unreachable the drainer backs off, and if the claimed
+files outgrow DELOBOTOMIZE_SPOOL_MAX_BYTES the oldest are discarded.
+
+The drainer doubles as the hook helper: it accepts raw hook invocations on
+helper.sock, builds their events and appends them to the spool, so
+per-tool-call hooks skip parsing and event building entirely.
+"""
+
+import http.client
+import os
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import fcntl
+
+from runtime import HELPER_ENABLED, HELPER_TIMEOUT_S, Invocation, build_event
+from spool import ACTIVE_FILE, HELPER_SOCKET, LOCK_FILE, SPOOL_DIR, SPOOL_MAX_BYTES, append, spool_path
+
+SERVER_URL = os.getenv('DELOBOTOMIZE_SERVER_URL', 'http://localhost:4000')
+TIMEOUT = int(os.getenv('DELOBOTOMIZE_TIMEOUT', '5'))
+IDLE_EXIT_S = float(os.getenv('DELOBOTOMIZE_DRAINER_IDLE_S', '60'))
+BATCH_SIZE = int(os.getenv('DELOBOTOMIZE_DRAINER_BATCH', '100'))
+
+POLL_S = 0.25
+# Hooks that opened the active file just before it was claimed may still
+# be writing to it; a claimed file is read once it has been quiet this long
+SETTLE_S = 0.2
+MIN_BACKOFF_S = 1.0
+MAX_BACKOFF_S = 60.0
+
+
+class DeliveryError(Exception):
+    """The server could not be reached or failed; retry later"""
+
+
+class Helper(threading.Thread):
+    """Spools events for hooks that hand their invocation over helper.sock"""
+
+    def __init__(self, path: str):
+        super().__init__(name='hook-helper', daemon=True)
+        self.path = path
+        self.server = None
+
+    def listen(self) -> bool:
+        try:
+            os.unlink(self.path)  # left behind by a drainer that was killed
+        except FileNotFoundError:
+            pass
+        try:
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.path)
+            self.server.listen(64)
+        except OSError:
+            # e.g. path too long for a unix socket; hooks spool in-process
+            self.server = None
+            return False
+        self.start()
+        return True
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return  # closed
+            with conn:
+                self.handle(conn)
+
+    def handle(self, conn: socket.socket):
+        conn.settimeout(HELPER_TIMEOUT_S)
+        try:
+            chunks = []
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            event = build_event(Invocation.decode(b''.join(chunks)))
+            conn.sendall(b'1' if append(event) else b'0')
+        except (OSError, ValueError, KeyError):
+            pass  # no ack: the hook spools the event itself
+
+    def close(self):
+        """Stop accepting hand-offs and wait for the one in progress"""
+        if self.server is None:
+            return
+        # Unlink first so new hooks fall back instead of queueing on a
+        # socket nobody will accept from
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        self.server = None
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(HELPER_TIMEOUT_S + 1)
+
+
+class Drainer:
+    def __init__(self, server_url: str = SERVER_URL):
+        url = urlparse(server_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.connection = None
+        self.backoff = MIN_BACKOFF_S
+        self.batch_supported = True
+
+    def claimed_files(self) -> list:
+        """Claimed spool files, oldest first"""
+        names = [
+            name for name in os.listdir(SPOOL_DIR)
+            if name.startswith('events.') and name.endswith('.ndjson') and name != ACTIVE_FILE
+        ]
+        return [spool_path(name) for name in sorted(names)]
+
+    def claim_active(self) -> bool:
+        """Move the active spool aside for delivery if it has any events"""
+        active = spool_path(ACTIVE_FILE)
+        try:
+            if os.path.getsize(active) == 0:
+                return False
+            os.rename(active, spool_path(f'events.{time.time_ns():020d}.ndjson'))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def enforce_limit(self, files: list) -> list:
+        """Drop the oldest claimed files while the spool is over its cap"""
+        sizes = [os.path.getsize(path) for path in files]
+        while len(files) > 1 and sum(sizes) > SPOOL_MAX_BYTES:
+            self.remove(files.pop(0))
+            sizes.pop(0)
+        return files
+
+    def drain_file(self, path: str):
+        """Deliver one claimed file from its checkpoint to the end"""
+        offset_path = path + '.offset'
+        try:
+            with open(offset_path) as f:
+                offset = int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                batch, end = [], offset
+                for line in f:
+                    end += len(line)
+                    if line.strip():
+                        batch.append(line)
+                    if len(batch) >= BATCH_SIZE:
+                        break
+                if end == offset:
+                    break
+
+                self.deliver(batch)
+                offset = end
+                self.checkpoint(offset_path, offset)
+
+        self.remove(path)
+
+    def deliver(self, batch: list):
+        """POST a batch as NDJSON; the server stores it in one transaction"""
+        if self.batch_supported:
+            status = self.post('/api/events/batch', b''.join(
+                line if line.endswith(b'\n') else line + b'\n' for line in batch
+            ), 'application/x-ndjson')
+            if status != 404:
+                # Per-event rejections and a 4xx for the whole batch won't
+                # change on retry; only server failures are retried
+                if status >= 500:
+                    raise DeliveryError(f'server returned {status}')
+                return
+            self.batch_supported = False  # server predates the batch endpoint
+
+        for line in batch:
+            status = self.post('/api/events', line, 'application/json')
+            if status >= 500:
+                raise DeliveryError(f'server returned {status}')
+
+    def post(self, path: str, body: bytes, content_type: str) -> int:
+        try:
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=TIMEOUT)
+            self.connection.request(
+                'POST', self.base_path + path, body=body,
+                headers={'Content-Type': content_type}
+            )
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise DeliveryError(str(e)) from e
+
+    def checkpoint(self, offset_path: str, offset: int):
+        tmp = offset_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp, offset_path)
+
+    def remove(self, path: str):
+        for victim in (path, path + '.offset'):
+            try:
+                os.unlink(victim)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def step(self) -> bool:
+        """Deliver whatever is ready; returns True if there was work"""
+        files = self.claimed_files()
+        if not files:
+            if not self.claim_active():
+                return False
+            files = self.claimed_files()
+
+        files = self.enforce_limit(files)
+        oldest = files[0]
+        quiet_for = time.time() - os.path.getmtime(oldest)
+        if quiet_for < SETTLE_S:
+            time.sleep(SETTLE_S - quiet_for)
+
+        try:
+            self.drain_file(oldest)
+            self.backoff = MIN_BACKOFF_S
+        except DeliveryError:
+            time.sleep(self.backoff)
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF_S)
+        return True
+
+    def run(self, lock_fd: int, helper: Helper = None):
+        idle_since = time.monotonic()
+        try:
+            while True:
+                if self.step():
+                    idle_since = time.monotonic()
+                    continue
+
+                if time.monotonic() - idle_since < IDLE_EXIT_S:
+                    time.sleep(POLL_S)
+                    continue
+
+                # A hook that appended while we held the lock did not start a
+                # drainer; release, then look once more before leaving. The
+                # helper stops first: an event it spooled after the last look
+                # would otherwise wait for some later hook to start a drainer.
+                if helper is not None:
+                    helper.close()
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                if not pending() or not try_lock(lock_fd):
+                    break
+                if helper is not None:
+                    helper = start_helper(helper.path)
+                idle_since = time.monotonic()
+        finally:
+            if helper is not None:
+                helper.close()
+            self.close()
+
+
+def start_helper(path: str):
+    """A listening Helper on path, or None when hooks should spool in-process"""
+    if not HELPER_ENABLED:
+        return None
+    helper = Helper(path)
+    return helper if helper.listen() else None
+
+
+def pending() -> bool:
+    try:
+        return os.path.getsize(spool_path(ACTIVE_FILE)) > 0
+    except FileNotFoundError:
+        return False
+
+
+def try_lock(fd: int) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def main():
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    lock_fd = os.open(spool_path(LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+    if not try_lock(lock_fd):
+        return 0  # another drainer is already running
+
+    os.ftruncate(lock_fd, 0)
+    os.write(lock_fd, str(os.getpid()).encode())
+
+    helper = start_helper(spool_path(HELPER_SOCKET))
+    try:
+        Drainer().run(lock_fd, helper)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(lock_fd)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
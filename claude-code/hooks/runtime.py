@@ -0,0 +1,184 @@
+"""
+Shared runtime for Delobotomize hooks
+
+Every hook script is a thin entry point that calls run('<hook name>'). Hooks
+start a fresh interpreter on every tool call, so this module keeps top-level
+work to a minimum: it imports only modules the interpreter has already
+loaded, and imports json only when it has to build an event itself.
+
+When the spool drainer is running it also listens on a unix socket
+(helper.sock in the spool directory). Per-tool-call hooks hand the raw
+hook payload to it and return without parsing anything; the drainer builds
+the event and spools it. If the helper is not reachable the hook builds and
+spools the event itself, which starts a drainer for the next call.
+"""
+
+import os
+import sys
+import time
+
+from spool import HELPER_SOCKET, spool_event, spool_path
+
+HELPER_ENABLED = os.getenv('DELOBOTOMIZE_HOOK_HELPER', '1') == '1'
+HELPER_TIMEOUT_S = 1.0
+
+# Hooks that fire on every tool call or API request; session_start runs
+# once and reports the session id, so it always runs in-process
+HELPER_HOOKS = ('post_tool_use', 'pre_request', 'post_response')
+
+
+def new_id() -> str:
+    """Random UUID4 string without importing uuid"""
+    b = bytearray(os.urandom(16))
+    b[6] = b[6] & 0x0F | 0x40
+    b[8] = b[8] & 0x3F | 0x80
+    h = b.hex()
+    return f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}'
+
+
+def iso_timestamp(ts: float) -> str:
+    """UTC ISO-8601 timestamp with a Z suffix, like datetime.utcnow().isoformat()"""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts)) + f'.{int(ts % 1 * 1e6):06d}Z'
+
+
+class Invocation:
+    """Everything a hook needs from its process, so it can be replayed elsewhere"""
+
+    def __init__(self, hook: str, timestamp: float, cwd: str, session_id: str, user: str, payload: bytes):
+        self.hook = hook
+        self.timestamp = timestamp
+        self.cwd = cwd
+        self.session_id = session_id
+        self.user = user
+        self.payload = payload
+
+    @classmethod
+    def current(cls, hook: str) -> 'Invocation':
+        payload = b'' if sys.stdin.isatty() else sys.stdin.buffer.read()
+        return cls(
+            hook, time.time(), os.getcwd(),
+            os.getenv('CLAUDE_SESSION_ID', ''), os.getenv('USER', 'unknown'), payload
+        )
+
+    def encode(self) -> bytes:
+        header = '\t'.join((self.hook, repr(self.timestamp), self.cwd, self.session_id, self.user))
+        return header.encode('utf-8') + b'\n' + self.payload
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'Invocation':
+        header, _, payload = data.partition(b'\n')
+        hook, timestamp, cwd, session_id, user = header.decode('utf-8').split('\t', 4)
+        return cls(hook, float(timestamp), cwd, session_id, user, payload)
+
+
+# Event builders: hook data -> (event type, context)
+
+def session_start(hook_data: dict, invocation: Invocation):
+    return 'session_start', {
+        'hook': 'session_start',
+        'project_root': invocation.cwd,
+        'user': invocation.user,
+        'cwd': invocation.cwd,
+        'data': hook_data
+    }
+
+
+def post_tool_use(hook_data: dict, invocation: Invocation):
+    return 'tool_use', {
+        'hook': 'post_tool_use',
+        'tool_name': hook_data.get('tool_name', 'unknown'),
+        'tool_input': hook_data.get('tool_input', {}),
+        'has_input': bool(hook_data.get('tool_input')),
+        'success': not hook_data.get('error'),
+        'error': hook_data.get('error')
+    }
+
+
+def pre_request(hook_data: dict, invocation: Invocation):
+    return 'api_request', {
+        'hook': 'pre_request',
+        'model': hook_data.get('model', 'unknown')
+    }
+
+
+def post_response(hook_data: dict, invocation: Invocation):
+    # Check for rate limits or errors
+    status = hook_data.get('status', 200)
+    event_type = 'api_response'
+
+    if status == 429:
+        event_type = 'rate_limit'
+    elif status >= 400:
+        event_type = 'api_error'
+
+    return event_type, {
+        'hook': 'post_response',
+        'status': status,
+        'error': hook_data.get('error')
+    }
+
+
+HOOKS = {
+    'session_start': session_start,
+    'post_tool_use': post_tool_use,
+    'pre_request': pre_request,
+    'post_response': post_response
+}
+
+
+def build_event(invocation: Invocation) -> dict:
+    """Turn a hook invocation into a monitoring server event"""
+    import json
+
+    try:
+        hook_data = json.loads(invocation.payload) if invocation.payload.strip() else {}
+    except ValueError:
+        hook_data = {}
+    if not isinstance(hook_data, dict):
+        hook_data = {}
+
+    event_type, context = HOOKS[invocation.hook](hook_data, invocation)
+    return {
+        'id': new_id(),
+        'type': event_type,
+        'timestamp': iso_timestamp(invocation.timestamp),
+        'session_id': invocation.session_id or hook_data.get('session_id') or new_id(),
+        'project_id': os.path.basename(invocation.cwd),
+        'context': context
+    }
+
+
+def hand_off(invocation: Invocation) -> bool:
+    """Pass an invocation to the helper; True once it has spooled the event"""
+    # _socket instead of socket: the wrapper module pulls in enum and
+    # selectors, which would triple this hook's import time
+    import _socket
+
+    if not hasattr(_socket, 'AF_UNIX'):
+        return False
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.settimeout(HELPER_TIMEOUT_S)
+        sock.connect(spool_path(HELPER_SOCKET))
+        sock.sendall(invocation.encode())
+        sock.shutdown(_socket.SHUT_WR)
+        return sock.recv(1) == b'1'
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def run(hook: str):
+    """Entry point for every hook script; never raises"""
+    try:
+        invocation = Invocation.current(hook)
+        if HELPER_ENABLED and hook in HELPER_HOOKS and hand_off(invocation):
+            return
+
+        event = build_event(invocation)
+        if spool_event(event) and hook == 'session_start':
+            print(f"✓ Session started: {event['session_id'][:12]}...", file=sys.stderr)
+    except Exception as e:
+        # Never fail - hooks must not block Claude Code
+        print(f"Error in {hook} hook: {e}", file=sys.stderr)
@@ -0,0 +1,120 @@
+"""
+Local event spool for Delobotomize hooks
+
+Hooks run synchronously inside Claude Code, so they must never wait on the
+network. Instead of POSTing to the monitoring server, a hook appends its
+event as one JSON line to a spool file and returns; a long-lived drainer
+process (drainer.py) delivers spooled events to the server in order.
+
+The append is a single O_APPEND write, so concurrent hooks never interleave
+lines. If no drainer holds the drainer lock, the hook starts one detached
+from its own process group. When the spool grows past
+DELOBOTOMIZE_SPOOL_MAX_BYTES (server down for a long time) new events are
+dropped rather than filling the disk.
+"""
+
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, deliver directly
+    fcntl = None
+
+SPOOL_DIR = os.getenv('DELOBOTOMIZE_SPOOL_DIR', os.path.join('.delobotomize', 'hook-spool'))
+SPOOL_MAX_BYTES = int(os.getenv('DELOBOTOMIZE_SPOOL_MAX_BYTES', str(16 * 1024 * 1024)))
+
+ACTIVE_FILE = 'events.ndjson'
+LOCK_FILE = 'drainer.lock'
+HELPER_SOCKET = 'helper.sock'
+
+
+def spool_path(name: str) -> str:
+    return os.path.join(SPOOL_DIR, name)
+
+
+def spool_event(event_data: dict) -> bool:
+    """Hand an event to the drainer; returns False if it was dropped"""
+    if fcntl is None:
+        return send_direct(event_data)
+
+    try:
+        if not append(event_data):
+            return False
+        ensure_drainer()
+        return True
+    except Exception:
+        return False
+
+
+def append(event_data: dict) -> bool:
+    """Append one event to the active spool file unless it is full"""
+    import json
+
+    line = (json.dumps(event_data, separators=(',', ':')) + '\n').encode('utf-8')
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+
+    fd = os.open(spool_path(ACTIVE_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        if os.fstat(fd).st_size + len(line) > SPOOL_MAX_BYTES:
+            return False
+        os.write(fd, line)
+        return True
+    finally:
+        os.close(fd)
+
+
+def drainer_running() -> bool:
+    """Whether a drainer currently holds the drainer lock"""
+    fd = os.open(spool_path(LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return False
+    finally:
+        os.close(fd)
+
+
+def ensure_drainer():
+    """Start a detached drainer unless one is already running.
+
+    Two hooks racing here may both spawn one; the loser fails to take the
+    lock and exits immediately.
+    """
+    if drainer_running():
+        return
+
+    import subprocess
+    drainer = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drainer.py')
+    subprocess.Popen(
+        [sys.executable, drainer],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        close_fds=True
+    )
+
+
+def send_direct(event_data: dict) -> bool:
+    """Synchronous POST, for platforms without a drainer"""
+    import json
+    import urllib.request
+
+    server_url = os.getenv('DELOBOTOMIZE_SERVER_URL', 'http://localhost:4000')
+    timeout = int(os.getenv('DELOBOTOMIZE_TIMEOUT', '5'))
+
+    try:
+        req = urllib.request.Request(
+            f'{server_url}/api/events',
+            data=json.dumps(event_data).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status == 200
+    except Exception:
+        return False
@@ -12,9 +12,13 @@ import { serve } from 'bun';
 import { join, dirname } from 'path';
 import { readFileSync, existsSync } from 'fs';
 import { fileURLToPath } from 'url';
+import { Rollups, BUCKET_SIZES, type BucketSize } from './rollups.js';
+import { EventHub, type StreamEvent } from './stream.js';
 
 const PORT = parseInt(process.env.PORT || '4000');
 const DB_PATH = process.env.DB_PATH || '.delobotomize/monitoring.db';
+const MAX_BATCH_EVENTS = parseInt(process.env.MAX_BATCH_EVENTS || '5000');
+const MAX_PAGE_SIZE = 1000;
 
 // Get dashboard path
 const __filename = fileURLToPath(import.meta.url);
@@ -24,6 +28,12 @@ const DASHBOARD_PATH = join(__dirname, '../dashboard/index.html');
 // Initialize SQLite database
 const db = new Database(DB_PATH, { create: true });
 
+// WAL lets dashboard reads run alongside ingest writes instead of waiting
+// for them; NORMAL sync is durable across application crashes in WAL mode
+db.run('PRAGMA journal_mode = WAL');
+db.run('PRAGMA synchronous = NORMAL');
+db.run('PRAGMA busy_timeout = 5000');
+
 // Create events table
 db.run(`
   CREATE TABLE IF NOT EXISTS events (
@@ -37,24 +47,153 @@ db.run(`
   )
 `);
 
-// Create index for faster queries
-db.run(`CREATE INDEX IF NOT EXISTS idx_session_id ON events(session_id)`);
-db.run(`CREATE INDEX IF NOT EXISTS idx_project_id ON events(project_id)`);
+// Create index for faster queries. Every index implicitly ends in rowid,
+// so these serve the (created_at, rowid) keyset order of /api/events
+// with or without a session/project filter.
+db.run(`CREATE INDEX IF NOT EXISTS idx_session_created ON events(session_id, created_at)`);
+db.run(`CREATE INDEX IF NOT EXISTS idx_project_created ON events(project_id, created_at)`);
+db.run(`CREATE INDEX IF NOT EXISTS idx_created_at ON events(created_at)`);
 db.run(`CREATE INDEX IF NOT EXISTS idx_timestamp ON events(timestamp)`);
+// Superseded by the composite indexes above
+db.run(`DROP INDEX IF EXISTS idx_session_id`);
+db.run(`DROP INDEX IF EXISTS idx_project_id`);
+
+// Per-bucket counts for /api/stats, maintained at ingest
+const rollups = new Rollups(db);
+const backfilled = rollups.backfill();
 
 console.log('📊 Delobotomize Monitoring Server');
 console.log('   Inspired by multi-agent-workflow by Apolo Pena\n');
 console.log(`   Database: ${DB_PATH}`);
 console.log(`   Port: ${PORT}\n`);
+if (backfilled) console.log(`   Built stats rollups for ${backfilled} existing events\n`);
 
 // Prepared statements for performance
 const insertEvent = db.prepare(`
-  INSERT INTO events (id, type, timestamp, session_id, project_id, context)
+  INSERT OR IGNORE INTO events (id, type, timestamp, session_id, project_id, context)
   VALUES (?, ?, ?, ?, ?, ?)
+  RETURNING rowid AS seq
 `);
 
+// Live event stream for dashboards
+const hub = new EventHub();
+
+/**
+ * Insert one event and count it in the rollups. Returns the event's
+ * sequence number (rowid), or null for an id that is already stored.
+ */
+function storeEvent(event: any): number | null {
+  // INSERT OR IGNORE returns no row for an id that is already stored
+  const row: any = insertEvent.get(
+    event.id,
+    event.type,
+    event.timestamp,
+    event.session_id,
+    event.project_id,
+    JSON.stringify(event.context || {})
+  );
+  if (!row) return null;
+  rollups.record(event);
+  return row.seq;
+}
+
+function streamEvent(event: any, seq: number): StreamEvent {
+  return {
+    seq,
+    id: event.id,
+    type: event.type,
+    timestamp: event.timestamp,
+    session_id: event.session_id,
+    project_id: event.project_id,
+    context: event.context || {}
+  };
+}
+
+const storeEventTransaction = db.transaction(storeEvent);
+
+const EVENT_COLUMNS = 'rowid AS seq, id, type, timestamp, session_id, project_id, context, created_at';
+
+/**
+ * Serialize a stored row, splicing in its context text as-is: it was
+ * written by JSON.stringify, so there is no need to parse and re-encode it
+ */
+function rowJson(row: any): string {
+  const { context, ...rest } = row;
+  return JSON.stringify(rest).slice(0, -1) + ',"context":' + context + '}';
+}
+
+// Keyset cursor: the (created_at, rowid) of the last event on a page
+function encodeCursor(row: any): string {
+  return Buffer.from(JSON.stringify([row.created_at, row.seq])).toString('base64url');
+}
+
+function decodeCursor(cursor: string): [string, number] | null {
+  try {
+    const [createdAt, seq] = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf-8'));
+    if (typeof createdAt !== 'string' || typeof seq !== 'number') return null;
+    return [createdAt, seq];
+  } catch {
+    return null;
+  }
+}
+
+type BatchResult = {
+  index: number;
+  id?: string;
+  seq?: number;
+  status: 'stored' | 'duplicate' | 'rejected';
+  error?: string;
+};
+
+function validateEvent(event: any): string | null {
+  if (!event || typeof event !== 'object' || Array.isArray(event)) return 'Event must be an object';
+  if (!event.id || !event.type || !event.timestamp || !event.session_id || !event.project_id) {
+    return 'Missing required fields';
+  }
+  return null;
+}
+
+/**
+ * Parse a batch body: a JSON array, or NDJSON with one event per line.
+ * NDJSON lines that are not valid JSON become per-event errors instead of
+ * failing the whole batch.
+ */
+function parseBatch(body: string): Array<{ event?: any; error?: string }> {
+  const trimmed = body.trimStart();
+  if (trimmed.startsWith('[')) {
+    const events = JSON.parse(trimmed);
+    return events.map((event: any) => ({ event }));
+  }
+
+  return body
+    .split('\n')
+    .filter(line => line.trim())
+    .map(line => {
+      try {
+        return { event: JSON.parse(line) };
+      } catch {
+        return { error: 'Invalid JSON' };
+      }
+    });
+}
+
+// Insert a whole batch in one transaction: one commit instead of one per event
+const insertBatch = db.transaction((items: Array<{ event?: any; error?: string }>): BatchResult[] => {
+  return items.map(({ event, error }, index): BatchResult => {
+    const invalid = error || validateEvent(event);
+    if (invalid) return { index, id: event?.id, status: 'rejected', error: invalid };
+
+    const seq = storeEvent(event);
+    return seq === null
+      ? { index, id: event.id, status: 'duplicate' }
+      : { index, id: event.id, seq, status: 'stored' };
+  });
+});
+
 const server = serve({
   port: PORT,
+  // Event streams stay open; heartbeats keep them inside this window
+  idleTimeout: 60,
   fetch(req) {
     const url = new URL(req.url);
 
@@ -97,22 +236,17 @@ const server = serve({
       return req.json().then(event => {
         try {
           // Validate event structure
-          if (!event.id || !event.type || !event.timestamp || !event.session_id || !event.project_id) {
+          const invalid = validateEvent(event);
+          if (invalid) {
             return new Response(
-              JSON.stringify({ error: 'Missing required fields' }),
+              JSON.stringify({ error: invalid }),
               { status: 400, headers }
             );
           }
 
           // Insert into database
-          insertEvent.run(
-            event.id,
-            event.type,
-            event.timestamp,
-            event.session_id,
-            event.project_id,
-            JSON.stringify(event.context || {})
-          );
+          const seq = storeEventTransaction(event);
+          if (seq !== null) hub.publish([streamEvent(event, seq)]);
 
           console.log(`✓ Event: ${event.type} (${event.session_id.slice(0, 8)}...)`);
 
@@ -130,14 +264,105 @@ const server = serve({
       });
     }
 
-    // GET /api/events - Query events
+    // POST /api/events/batch - Store many events (JSON array or NDJSON)
+    if (url.pathname === '/api/events/batch' && req.method === 'POST') {
+      return req.text().then(body => {
+        let items: Array<{ event?: any; error?: string }>;
+        try {
+          items = parseBatch(body);
+        } catch {
+          return new Response(
+            JSON.stringify({ error: 'Body must be a JSON array or NDJSON' }),
+            { status: 400, headers }
+          );
+        }
+
+        if (items.length > MAX_BATCH_EVENTS) {
+          return new Response(
+            JSON.stringify({ error: `Batch exceeds ${MAX_BATCH_EVENTS} events` }),
+            { status: 413, headers }
+          );
+        }
+
+        try {
+          const results = insertBatch(items);
+          hub.publish(results
+            .filter(r => r.status === 'stored')
+            .map(r => streamEvent(items[r.index].event, r.seq!)));
+
+          const stored = results.filter(r => r.status === 'stored').length;
+          const duplicates = results.filter(r => r.status === 'duplicate').length;
+          const rejected = results.length - stored - duplicates;
+
+          console.log(`✓ Batch: ${stored} stored, ${duplicates} duplicate, ${rejected} rejected`);
+
+          return new Response(
+            JSON.stringify({ success: rejected === 0, stored, duplicates, rejected, results }),
+            { headers }
+          );
+        } catch (error: any) {
+          console.error('Error storing batch:', error.message);
+          return new Response(
+            JSON.stringify({ error: error.message }),
+            { status: 500, headers }
+          );
+        }
+      });
+    }
+
+    // GET /api/events/stream - Server-sent events for newly stored events
+    if (url.pathname === '/api/events/stream' && req.method === 'GET') {
+      const filter = {
+        sessionId: url.searchParams.get('session_id'),
+        projectId: url.searchParams.get('project_id')
+      };
+
+      // Replay what a reconnecting client missed, up to one page; past that
+      // it is told to reload rather than silently skipping the rest
+      const since = parseInt(req.headers.get('last-event-id') || url.searchParams.get('since') || '');
+      let backlog: StreamEvent[] = [];
+      let resetSeq: number | null = null;
+      if (!isNaN(since)) {
+        let query = `SELECT ${EVENT_COLUMNS} FROM events WHERE rowid > ?`;
+        const params: any[] = [since];
+        if (filter.sessionId) {
+          query += ' AND session_id = ?';
+          params.push(filter.sessionId);
+        }
+        if (filter.projectId) {
+          query += ' AND project_id = ?';
+          params.push(filter.projectId);
+        }
+        query += ' ORDER BY rowid LIMIT ?';
+        params.push(MAX_PAGE_SIZE + 1);
+
+        const rows: any[] = db.prepare(query).all(...params);
+        if (rows.length > MAX_PAGE_SIZE) {
+          resetSeq = (db.prepare('SELECT MAX(rowid) AS seq FROM events').get() as any).seq;
+        } else {
+          backlog = rows.map((row: any) => ({ ...row, context: JSON.parse(row.context) }));
+        }
+      }
+
+      return new Response(hub.subscribe(filter, backlog, req.signal, resetSeq), {
+        headers: {
+          'Access-Control-Allow-Origin': '*',
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache',
+          'Connection': 'keep-alive'
+        }
+      });
+    }
+
+    // GET /api/events - Query events, newest first, one page at a time
     if (url.pathname === '/api/events' && req.method === 'GET') {
       try {
         const sessionId = url.searchParams.get('session_id');
         const projectId = url.searchParams.get('project_id');
-        const limit = parseInt(url.searchParams.get('limit') || '100');
+        const limit = Math.min(parseInt(url.searchParams.get('limit') || '100') || 100, MAX_PAGE_SIZE);
+        const cursorParam = url.searchParams.get('cursor');
 
-        let query = 'SELECT * FROM events WHERE 1=1';
+        let query = `SELECT ${EVENT_COLUMNS} FROM events WHERE 1=1`;
         const params: any[] = [];
 
         if (sessionId) {
@@ -150,20 +375,32 @@ const server = serve({
           params.push(projectId);
         }
 
-        query += ' ORDER BY created_at DESC LIMIT ?';
-        params.push(limit);
+        if (cursorParam) {
+          const cursor = decodeCursor(cursorParam);
+          if (!cursor) {
+            return new Response(
+              JSON.stringify({ error: 'Invalid cursor' }),
+              { status: 400, headers }
+            );
+          }
+          // Keyset pagination: continue after the last row of the previous
+          // page instead of counting past it with OFFSET
+          query += ' AND (created_at, rowid) < (?, ?)';
+          params.push(...cursor);
+        }
 
-        const stmt = db.prepare(query);
-        const events = stmt.all(...params);
+        // One extra row tells us whether there is a next page
+        query += ' ORDER BY created_at DESC, rowid DESC LIMIT ?';
+        params.push(limit + 1);
 
-        // Parse context JSON
-        const parsedEvents = events.map((e: any) => ({
-          ...e,
-          context: JSON.parse(e.context)
-        }));
+        const stmt = db.prepare(query);
+        const rows: any[] = stmt.all(...params);
+        const page = rows.slice(0, limit);
+        const nextCursor = rows.length > limit ? encodeCursor(page[page.length - 1]) : null;
 
         return new Response(
-          JSON.stringify({ events: parsedEvents, count: parsedEvents.length }),
+          `{"events":[${page.map(rowJson).join(',')}],"count":${page.length},` +
+          `"next_cursor":${JSON.stringify(nextCursor)}}`,
           { headers }
         );
       } catch (error: any) {
@@ -175,21 +412,38 @@ const server = serve({
       }
     }
 
-    // GET /api/stats - Get statistics
+    // GET /api/stats - Get statistics (from rollups)
     if (url.pathname === '/api/stats' && req.method === 'GET') {
       try {
-        const stats = db.prepare(`
-          SELECT
-            COUNT(*) as total_events,
-            COUNT(DISTINCT session_id) as total_sessions,
-            COUNT(DISTINCT project_id) as total_projects,
-            type,
-            COUNT(*) as count
-          FROM events
-          GROUP BY type
-        `).all();
-
-        return new Response(JSON.stringify({ stats }), { headers });
+        const from = url.searchParams.get('from');
+        const to = url.searchParams.get('to');
+        const bucket = url.searchParams.get('bucket') as BucketSize | null;
+
+        const fromDate = from ? new Date(from) : null;
+        const toDate = to ? new Date(to) : null;
+        if ((fromDate && isNaN(fromDate.getTime())) || (toDate && isNaN(toDate.getTime()))) {
+          return new Response(
+            JSON.stringify({ error: 'from and to must be ISO-8601 timestamps' }),
+            { status: 400, headers }
+          );
+        }
+        if (bucket && !BUCKET_SIZES.includes(bucket)) {
+          return new Response(
+            JSON.stringify({ error: `bucket must be one of: ${BUCKET_SIZES.join(', ')}` }),
+            { status: 400, headers }
+          );
+        }
+
+        const stats = rollups.stats({
+          from: fromDate,
+          to: toDate,
+          bucket: bucket || undefined,
+          projectId: url.searchParams.get('project_id'),
+          sessionId: url.searchParams.get('session_id'),
+          timeline: url.searchParams.get('timeline') === '1'
+        });
+
+        return new Response(JSON.stringify(stats), { headers });
       } catch (error: any) {
         return new Response(
           JSON.stringify({ error: error.message }),
@@ -210,7 +464,9 @@ console.log(`🚀 Server running at http://localhost:${PORT}`);
 console.log('\nEndpoints:');
 console.log('  GET    /            - Web Dashboard');
 console.log('  POST   /api/events  - Store event');
-console.log('  GET    /api/events  - Query events');
-console.log('  GET    /api/stats   - Get statistics');
+console.log('  POST   /api/events/batch - Store events (JSON array or NDJSON)');
+console.log('  GET    /api/events  - Query events (?cursor= for the next page)');
+console.log('  GET    /api/events/stream - Live events (server-sent events)');
+console.log('  GET    /api/stats   - Get statistics (?from=&to=&bucket=&timeline=1)');
 console.log('  GET    /healthz     - Health check\n');
 console.log(`📊 Open dashboard: http://localhost:${PORT}\n`);
@@ -0,0 +1,189 @@
+import type Database from 'bun:sqlite';
+
+/**
+ * Event Rollups
+ *
+ * Per-bucket event counts kept up to date at ingest, so /api/stats reads a
+ * table that grows with buckets x sessions x event types rather than with
+ * raw events. Every stored event increments one row for each bucket size
+ * (minute, hour, day) keyed by project, session and event type.
+ */
+
+export type BucketSize = 'minute' | 'hour' | 'day';
+
+export const BUCKET_SIZES: BucketSize[] = ['minute', 'hour', 'day'];
+
+// Characters of an ISO timestamp that identify each bucket
+const BUCKET_PREFIX: Record<BucketSize, number> = { minute: 16, hour: 13, day: 10 };
+const BUCKET_SUFFIX: Record<BucketSize, string> = { minute: ':00Z', hour: ':00:00Z', day: 'T00:00:00Z' };
+
+const HOUR_MS = 60 * 60 * 1000;
+const DAY_MS = 24 * HOUR_MS;
+
+// Events read per query while backfilling
+const BACKFILL_PAGE = 10000;
+
+/**
+ * Start of the bucket containing a timestamp, as an ISO string. Timestamps
+ * with an offset are converted to UTC; unparseable ones count at `fallback`.
+ */
+export function bucketStart(timestamp: string | Date, size: BucketSize, fallback?: Date): string {
+  let date = timestamp instanceof Date ? timestamp : new Date(timestamp);
+  if (isNaN(date.getTime())) date = fallback || new Date();
+  return date.toISOString().slice(0, BUCKET_PREFIX[size]) + BUCKET_SUFFIX[size];
+}
+
+/**
+ * Bucket size for a stats range: the finest one that keeps the scan small
+ */
+export function bucketSizeFor(from: Date | null, to: Date | null): BucketSize {
+  if (!from) return 'day';
+  const span = (to ? to.getTime() : Date.now()) - from.getTime();
+  if (span <= 6 * HOUR_MS) return 'minute';
+  if (span <= 14 * DAY_MS) return 'hour';
+  return 'day';
+}
+
+export interface StatsQuery {
+  from: Date | null;
+  to: Date | null;
+  bucket?: BucketSize;
+  projectId?: string | null;
+  sessionId?: string | null;
+  timeline?: boolean;
+}
+
+export class Rollups {
+  private db: Database;
+  private increment: any;
+
+  constructor(db: Database) {
+    this.db = db;
+
+    db.run(`
+      CREATE TABLE IF NOT EXISTS event_rollups (
+        bucket_size TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        project_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (bucket_size, bucket_start, project_id, session_id, type)
+      ) WITHOUT ROWID
+    `);
+
+    this.increment = db.prepare(`
+      INSERT INTO event_rollups (bucket_size, bucket_start, project_id, session_id, type, count)
+      VALUES (?, ?, ?, ?, ?, 1)
+      ON CONFLICT (bucket_size, bucket_start, project_id, session_id, type)
+      DO UPDATE SET count = count + 1
+    `);
+  }
+
+  /**
+   * Count one newly stored event; call inside the insert's transaction.
+   * An unparseable timestamp counts at `ingestedAt`, by default now.
+   */
+  record(event: { timestamp: string; project_id: string; session_id: string; type: string },
+         ingestedAt?: Date): void {
+    for (const size of BUCKET_SIZES) {
+      this.increment.run(
+        size, bucketStart(event.timestamp, size, ingestedAt), event.project_id, event.session_id, event.type
+      );
+    }
+  }
+
+  /**
+   * Build rollups for events stored before rollups existed
+   */
+  backfill(): number {
+    const hasRollups = this.db.prepare('SELECT 1 FROM event_rollups LIMIT 1').get();
+    if (hasRollups) return 0;
+
+    const events: any = this.db.prepare('SELECT COUNT(*) AS count FROM events').get();
+    if (!events?.count) return 0;
+
+    // Through record(), so timestamps with an offset or in another format
+    // land in the same buckets as they would have at ingest. created_at
+    // (UTC, without a zone) stands in for the time of ingest.
+    const page = this.db.prepare(`
+      SELECT rowid AS seq, timestamp, project_id, session_id, type, created_at
+      FROM events WHERE rowid > ? ORDER BY rowid LIMIT ?
+    `);
+    this.db.transaction(() => {
+      let after = 0;
+      while (true) {
+        const rows: any[] = page.all(after, BACKFILL_PAGE);
+        for (const row of rows) {
+          const ingestedAt = row.created_at ? new Date(row.created_at.replace(' ', 'T') + 'Z') : undefined;
+          this.record(row, ingestedAt && !isNaN(ingestedAt.getTime()) ? ingestedAt : undefined);
+        }
+        if (rows.length < BACKFILL_PAGE) break;
+        after = rows[rows.length - 1].seq;
+      }
+    })();
+    return events.count;
+  }
+
+  /**
+   * Event counts per type, plus distinct sessions and projects, for a range.
+   * The range is widened to whole buckets of the chosen size.
+   */
+  stats(query: StatsQuery) {
+    const bucket = query.bucket || bucketSizeFor(query.from, query.to);
+    const from = query.from ? bucketStart(query.from, bucket) : '';
+    const to = query.to ? bucketStart(query.to, bucket) : null;
+
+    let where = 'bucket_size = ? AND bucket_start >= ?';
+    const params: any[] = [bucket, from];
+    if (to) {
+      // A range ending inside a bucket includes that bucket
+      where += ' AND bucket_start <= ?';
+      params.push(to);
+    }
+    if (query.projectId) {
+      where += ' AND project_id = ?';
+      params.push(query.projectId);
+    }
+    if (query.sessionId) {
+      where += ' AND session_id = ?';
+      params.push(query.sessionId);
+    }
+
+    const totals: any = this.db.prepare(`
+      SELECT
+        COALESCE(SUM(count), 0) as total_events,
+        COUNT(DISTINCT session_id) as total_sessions,
+        COUNT(DISTINCT project_id) as total_projects
+      FROM event_rollups
+      WHERE ${where}
+    `).get(...params);
+
+    const byType = this.db.prepare(`
+      SELECT type, SUM(count) as count
+      FROM event_rollups
+      WHERE ${where}
+      GROUP BY type
+      ORDER BY count DESC
+    `).all(...params);
+
+    const result: any = {
+      range: { from: from || null, to, bucket },
+      totals,
+      // One row per type, carrying the totals, as /api/stats always returned
+      stats: byType.map((row: any) => ({ ...totals, ...row }))
+    };
+
+    if (query.timeline) {
+      result.timeline = this.db.prepare(`
+        SELECT bucket_start, type, SUM(count) as count
+        FROM event_rollups
+        WHERE ${where}
+        GROUP BY bucket_start, type
+        ORDER BY bucket_start
+      `).all(...params);
+    }
+
+    return result;
+  }
+}
@@ -0,0 +1,144 @@
+/**
+ * Event Stream
+ *
+ * Pushes newly stored events to dashboards over server-sent events, so
+ * they no longer re-query /api/events on a timer. Each subscriber may be
+ * filtered to one session or project. An event is serialized once and the
+ * same bytes are queued to every matching subscriber. A subscriber that
+ * stops reading is dropped instead of buffering without bound; its
+ * EventSource reconnects with Last-Event-ID and replays what it missed.
+ * When it missed more than one page, it is sent a `reset` event instead
+ * and reloads from /api/events.
+ */
+
+export interface StreamFilter {
+  sessionId?: string | null;
+  projectId?: string | null;
+}
+
+export interface StreamEvent {
+  seq: number;
+  id: string;
+  type: string;
+  timestamp: string;
+  session_id: string;
+  project_id: string;
+  context: any;
+  created_at?: string;
+}
+
+interface Subscriber {
+  filter: StreamFilter;
+  controller: ReadableStreamDefaultController<Uint8Array>;
+}
+
+// Frames a subscriber may have queued before it counts as stalled
+const MAX_QUEUED_FRAMES = 1024;
+const HEARTBEAT_MS = 15000;
+
+const encoder = new TextEncoder();
+
+export function matches(filter: StreamFilter, event: { session_id: string; project_id: string }): boolean {
+  if (filter.sessionId && event.session_id !== filter.sessionId) return false;
+  if (filter.projectId && event.project_id !== filter.projectId) return false;
+  return true;
+}
+
+export function frame(event: StreamEvent): Uint8Array {
+  return encoder.encode(`id: ${event.seq}\nevent: event\ndata: ${JSON.stringify(event)}\n\n`);
+}
+
+/**
+ * Tell a client its backlog was too long to replay. The id moves its
+ * Last-Event-ID past the gap, so the next reconnect resumes from here.
+ */
+export function resetFrame(seq: number): Uint8Array {
+  return encoder.encode(`id: ${seq}\nevent: reset\ndata: ${JSON.stringify({ seq })}\n\n`);
+}
+
+export class EventHub {
+  private subscribers = new Set<Subscriber>();
+  private heartbeat: ReturnType<typeof setInterval> | null = null;
+
+  get size(): number {
+    return this.subscribers.size;
+  }
+
+  /**
+   * Open a stream for one client. Events in `backlog` (already filtered)
+   * are sent first, or a reset at `resetSeq` when the backlog was too long
+   * to send, then every matching event published afterwards.
+   */
+  subscribe(filter: StreamFilter, backlog: StreamEvent[], signal?: AbortSignal,
+            resetSeq: number | null = null): ReadableStream<Uint8Array> {
+    let subscriber: Subscriber;
+
+    return new ReadableStream<Uint8Array>({
+      start: controller => {
+        subscriber = { filter, controller };
+        controller.enqueue(encoder.encode('retry: 2000\n\n'));
+        if (resetSeq !== null) controller.enqueue(resetFrame(resetSeq));
+        for (const event of backlog) controller.enqueue(frame(event));
+
+        this.subscribers.add(subscriber);
+        this.startHeartbeat();
+        signal?.addEventListener('abort', () => this.remove(subscriber));
+      },
+      cancel: () => {
+        this.remove(subscriber);
+      }
+    }, { highWaterMark: MAX_QUEUED_FRAMES });
+  }
+
+  /**
+   * Push stored events to every subscriber whose filter matches
+   */
+  publish(events: StreamEvent[]): void {
+    if (this.subscribers.size === 0) return;
+
+    for (const event of events) {
+      let data: Uint8Array | null = null;
+      for (const subscriber of this.subscribers) {
+        if (!matches(subscriber.filter, event)) continue;
+        data ??= frame(event);
+        this.send(subscriber, data);
+      }
+    }
+  }
+
+  private send(subscriber: Subscriber, data: Uint8Array): void {
+    const { controller } = subscriber;
+    if (controller.desiredSize !== null && controller.desiredSize <= 0) {
+      // Client is not reading; close so it reconnects and replays
+      this.remove(subscriber);
+      try {
+        controller.close();
+      } catch {
+        // Already closed
+      }
+      return;
+    }
+
+    try {
+      controller.enqueue(data);
+    } catch {
+      this.remove(subscriber);
+    }
+  }
+
+  private remove(subscriber: Subscriber): void {
+    this.subscribers.delete(subscriber);
+    if (this.subscribers.size === 0 && this.heartbeat) {
+      clearInterval(this.heartbeat);
+      this.heartbeat = null;
+    }
+  }
+
+  private startHeartbeat(): void {
+    if (this.heartbeat) return;
+    const ping = encoder.encode(': ping\n\n');
+    this.heartbeat = setInterval(() => {
+      for (const subscriber of this.subscribers) this.send(subscriber, ping);
+    }, HEARTBEAT_MS);
+  }
+}
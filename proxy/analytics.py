@@ -0,0 +1,943 @@
+#!/usr/bin/env python3
+"""
+Offline analytics over proxy logs.
+
+The audit phase reads proxy.log line by line into a fixed set of
+aggregates. This command answers the broader questions (latency percentiles
+per model, session, upstream or hour, busiest windows, stalls per session) over logs
+of any size, by loading them into columnar NumPy arrays and computing
+everything with array operations instead of per-line Python.
+
+Every log source is read: proxy.log and the per-worker proxy.w<N>.log of a
+multi-process proxy, each as its rotated segments (plain or .gz) followed
+by the active log. Files are read in blocks of whole lines; each block is
+tokenized by locating tabs and newlines in the raw bytes and converting the
+fixed-position fields in bulk, so only the decoded columns are kept
+(roughly 60 bytes per request). Lines without the ten base fields of the
+format in src/bridge/parser.ts, or with a malformed timestamp, status or
+number, are counted as malformed and skipped.
+
+The JSON output has the same top-level fields as the audit's incidents
+(session-incidents.json), computed with the audit's thresholds, plus an
+`analytics` section with the grouped breakdowns.
+
+NumPy is only needed for this command; the proxy itself does not use it.
+
+Usage:
+    python proxy/analytics.py report
+    python proxy/analytics.py report --log .delobotomize/proxy.log --group model,hour --output report.json
+    python proxy/analytics.py report --since 2025-11-18T00:00:00Z --session <session_id>
+    python proxy/analytics.py bench --size-mb 2048 --gzip
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+from logstore import SegmentIndex, list_segments, parse_timestamp, segment_path, write_index
+
+BLOCK_BYTES = 8 * 1024 * 1024
+BASE_FIELDS = 10
+
+# Audit thresholds (src/phases/audit.ts)
+CONTEXT_WINDOW = 200000
+SATURATION_RATIO = 0.85
+REASONING_OVERFLOW_TOKENS = 8000
+STALL_GAP_S = 300
+# Smallest prompt the proxy calibrates its pre-flight estimates on (preflight.py)
+MIN_CALIBRATION_TOKENS = 1024
+
+PERCENTILES = (0.5, 0.95, 0.99)
+GROUPINGS = ('model', 'session', 'upstream', 'hour', 'day')
+
+TAB = 9
+NEWLINE = 10
+# Widest numeric field accepted (digits, plus the decimal point for cost)
+MAX_NUMBER_WIDTH = 18
+# Longest session id, method or model kept; longer values are truncated
+MAX_TEXT_WIDTH = 128
+TIMESTAMP_WIDTH = 24  # 2025-11-18T05:00:00.123Z
+POW10 = 10 ** np.arange(MAX_NUMBER_WIDTH + 1, dtype=np.int64) if np else None
+
+# Column -> dtype of the loaded arrays; session, method, model and upstream
+# are codes into LogColumns' category tables; ttfb_ms, cache tokens and the pre-flight
+# estimate are -1 when the line does not carry them
+COLUMNS = {
+    'timestamp': 'int64',  # epoch milliseconds
+    'session': 'int32',
+    'method': 'int32',
+    'model': 'int32',
+    'upstream': 'int32',
+    'status': 'int16',
+    'prompt_tokens': 'int32',
+    'completion_tokens': 'int32',
+    'reasoning_tokens': 'int32',
+    'latency_ms': 'int32',
+    'cost': 'float64',
+    'ttfb_ms': 'int32',
+    'cache_creation_tokens': 'int32',
+    'cache_read_tokens': 'int32',
+    'estimated_tokens': 'int32'
+}
+
+
+def log_files(log_path: str) -> list:
+    """All files of every log source, each source's segments oldest first"""
+    root, ext = os.path.splitext(log_path)
+    workers = sorted(path for path in glob.glob(f"{glob.escape(root)}.w*{ext}")
+                     if re.fullmatch(re.escape(root) + r'\.w\d+' + re.escape(ext), path))
+
+    files = []
+    for source in [log_path] + workers:
+        for _, path, index_path in list_segments(source):
+            files.append((path, index_path, True))
+        if os.path.exists(source):
+            files.append((source, None, False))
+    return files
+
+
+def outside_window(index_path: str, since_ms: int, until_ms: int) -> bool:
+    """Whether a closed segment's index rules it out of [since, until]"""
+    if index_path is None or (since_ms is None and until_ms is None):
+        return False
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        first = parse_timestamp(index['first_timestamp']) * 1000
+        last = parse_timestamp(index['last_timestamp']) * 1000
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return False
+    return (since_ms is not None and last < since_ms) or (until_ms is not None and first > until_ms)
+
+
+def read_blocks(path: str, closed: bool, block_bytes: int = BLOCK_BYTES):
+    """Yield blocks of whole lines. A trailing partial line is still being
+    written in an active log and is skipped; in a closed segment it is kept."""
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        f = opener(path, 'rb')
+    except FileNotFoundError:
+        return  # compressed or removed since it was listed
+    with f:
+        rest = b''
+        while True:
+            data = f.read(block_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            if cut:
+                yield data[:cut]
+        if rest and closed:
+            yield rest + b'\n'
+
+
+class Categories:
+    """Stable integer codes for repeated strings (sessions, models, methods)"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, uniques) -> 'np.ndarray':
+        codes = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes
+
+    def decode(self, code: int) -> str:
+        return self.values[code].decode('utf-8', 'replace')
+
+
+class LogColumns:
+    """Columnar proxy log: one array per TSV field, one row per request"""
+
+    def __init__(self):
+        self.sessions = Categories()
+        self.models = Categories()
+        self.methods = Categories()
+        self.upstreams = Categories()
+        self.lines = 0
+        self.malformed = 0
+        self.bytes = 0
+        self.files = 0
+        self._parts = []
+        self.columns = None
+
+    def add_block(self, data: bytes, filters: dict):
+        block = parse_block(data)
+        self.bytes += len(data)
+        self.lines += block.pop('lines')
+        self.malformed += block.pop('malformed')
+
+        block['session'] = self.sessions.encode(block.pop('session_values'))[block['session']]
+        block['model'] = self.models.encode(block.pop('model_values'))[block['model']]
+        block['method'] = self.methods.encode(block.pop('method_values'))[block['method']]
+        block['upstream'] = self.upstreams.encode(block.pop('upstream_values'))[block['upstream']]
+
+        keep = None
+        if filters.get('since') is not None:
+            keep = block['timestamp'] >= filters['since']
+        if filters.get('until') is not None:
+            before = block['timestamp'] <= filters['until']
+            keep = before if keep is None else keep & before
+        if filters.get('session') is not None:
+            same = block['session'] == self.sessions.encode([filters['session'].encode('utf-8')])[0]
+            keep = same if keep is None else keep & same
+        if keep is not None:
+            block = {name: values[keep] for name, values in block.items()}
+        self._parts.append(block)
+
+    def finish(self):
+        """Concatenate the blocks and order rows by timestamp, as the audit
+        merges sources"""
+        if self._parts:
+            columns = {name: np.concatenate([part[name] for part in self._parts]) for name in COLUMNS}
+        else:
+            columns = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._parts = []
+        order = np.argsort(columns['timestamp'], kind='stable')
+        self.columns = {name: values[order] for name, values in columns.items()}
+        return self
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+
+class TsvBlock:
+    """Field offsets of every line in a block of whole TSV lines"""
+
+    def __init__(self, data: bytes):
+        a = np.frombuffer(data, dtype=np.uint8)
+        newlines = np.flatnonzero(a == NEWLINE)
+        self.row_starts = np.concatenate(([0], newlines[:-1] + 1))
+        self.delims = np.flatnonzero((a == TAB) | (a == NEWLINE))
+        # Index in delims of each line's first delimiter and of its newline
+        self.first = np.searchsorted(self.delims, self.row_starts)
+        self.last = np.searchsorted(self.delims, newlines)
+        self.fields = self.last - self.first + 1
+        self.blank = newlines == self.row_starts
+
+        # Zero padding lets any field be copied out as a fixed-width row,
+        # aligned on either its start or its end
+        padding = np.zeros(MAX_TEXT_WIDTH, dtype=np.uint8)
+        self._windows = sliding_window_view(np.concatenate((padding, a, padding)), MAX_TEXT_WIDTH)
+
+    def __len__(self):
+        return len(self.row_starts)
+
+    def bounds(self, k: int) -> tuple:
+        """Start and end offsets of field k in every line (empty when absent)"""
+        end = self.delims[np.minimum(self.first + k, self.last)]
+        if k == 0:
+            return self.row_starts, end
+        start = self.delims[np.minimum(self.first + k - 1, self.last)] + 1
+        return np.where(self.fields > k, start, end), end
+
+    def chars(self, start, width: int):
+        """(lines, width) bytes from each start offset"""
+        return self._windows[start + MAX_TEXT_WIDTH, :width]
+
+    def chars_before(self, end, width: int):
+        """(lines, width) bytes ending at each end offset"""
+        return self._windows[end + MAX_TEXT_WIDTH - width, :width]
+
+
+def parse_numbers(block: TsvBlock, k: int, decimal: bool = False) -> tuple:
+    """Parse field k as an unsigned integer (or decimal) in every line.
+    Returns (values, ok); ok is False for empty, oversized or non-numeric
+    fields."""
+    start, end = block.bounds(k)
+    length = end - start
+    ok = (length > 0) & (length <= MAX_NUMBER_WIDTH)
+    width = int(np.minimum(length, MAX_NUMBER_WIDTH).max()) if len(length) else 0
+    if width == 0:
+        return np.zeros(len(length), dtype=np.int64), ok
+
+    # Right-aligned digits, so column j always has place value 10^(width-1-j)
+    digits = block.chars_before(end, width) - np.uint8(48)  # non-digits wrap to >= 10
+    inside = np.arange(width) >= width - length[:, None]
+    is_digit = digits < 10
+    if not decimal:
+        ok &= (is_digit | ~inside).all(axis=1)
+        return np.where(inside, digits, np.uint8(0)) @ POW10[width - 1::-1], ok
+
+    is_dot = inside & (digits == np.uint8((ord('.') - 48) % 256))
+    ok &= (is_digit | is_dot | ~inside).all(axis=1) & (is_dot.sum(axis=1) <= 1)
+    raw = np.where(inside & is_digit, digits, np.uint8(0)) @ POW10[width - 1::-1]
+    # The point occupies a place: digits to its left are 10x too large
+    has_dot = is_dot.any(axis=1)
+    scale = POW10[np.where(has_dot, width - 1 - is_dot.argmax(axis=1), 0)]
+    fraction = raw % scale
+    return np.where(has_dot, (raw - fraction) // 10 + fraction, raw) / scale, ok
+
+
+def parse_timestamps(block: TsvBlock) -> tuple:
+    """Epoch milliseconds of the YYYY-MM-DDTHH:MM:SS.mmmZ first field"""
+    start, end = block.bounds(0)
+    chars = block.chars(start, TIMESTAMP_WIDTH)
+    digits = chars.astype(np.int16) - 48
+    separators = {4: '-', 7: '-', 10: 'T', 13: ':', 16: ':', 19: '.', 23: 'Z'}
+    ok = (end - start) == TIMESTAMP_WIDTH
+    for i in range(TIMESTAMP_WIDTH):
+        if i in separators:
+            ok &= chars[:, i] == ord(separators[i])
+        else:
+            ok &= (digits[:, i] >= 0) & (digits[:, i] <= 9)
+
+    def number(first, width):
+        value = np.zeros(len(chars), dtype=np.int64)
+        for i in range(first, first + width):
+            value = value * 10 + digits[:, i]
+        return value
+
+    year, month, day = number(0, 4), number(5, 2), number(8, 2)
+    # Days since 1970-01-01 in the proleptic Gregorian calendar
+    y = year - (month <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    seconds = ((days * 24 + number(11, 2)) * 60 + number(14, 2)) * 60 + number(17, 2)
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    return seconds * 1000 + number(20, 3), ok
+
+
+def parse_text(block: TsvBlock, k: int) -> tuple:
+    """Distinct byte strings of field k and each line's index into them"""
+    start, end = block.bounds(k)
+    length = np.minimum(end - start, MAX_TEXT_WIDTH)
+    width = max(8, -(-int(length.max()) // 8) * 8) if len(length) else 8
+    chars = np.where(np.arange(width) < length[:, None], block.chars(start, width), np.uint8(0))
+
+    # Group by a 64-bit hash of each value (sorting integers is much cheaper
+    # than sorting strings), then confirm every line matches its group's
+    # first line and fall back to exact string grouping on a collision
+    words = chars.view(np.uint64)
+    digest = length.astype(np.uint64)
+    for column in range(words.shape[1]):
+        digest = digest * np.uint64(0x100000001B3) ^ words[:, column]
+    order = np.argsort(digest)
+    ordered = digest[order]
+    new = np.empty(len(ordered), dtype=bool)
+    new[:1] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=new[1:])
+    first = order[new]
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(new) - 1
+    if not (words == words[first][inverse]).all():
+        values = chars.view(f'S{width}').ravel()
+        _, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    return [chars[i, :length[i]].tobytes() for i in first], inverse.astype(np.int32)
+
+
+def parse_block(data: bytes) -> dict:
+    """Tokenize a block of whole TSV lines into columns"""
+    block = TsvBlock(data)
+    lines = len(block) - int(block.blank.sum())
+    ok = ~block.blank & (block.fields >= BASE_FIELDS)
+
+    columns = {}
+    columns['timestamp'], valid = parse_timestamps(block)
+    ok &= valid
+    for k, name in ((3, 'status'), (4, 'prompt_tokens'), (5, 'completion_tokens'),
+                    (6, 'reasoning_tokens'), (7, 'latency_ms')):
+        columns[name], valid = parse_numbers(block, k)
+        ok &= valid
+    ok &= (columns['status'] >= 100) & (columns['status'] <= 599)
+    columns['cost'], valid = parse_numbers(block, 9, decimal=True)
+    ok &= valid
+
+    # Extended fields are optional; empty or unparsable ones are unknown
+    for k, name in ((10, 'ttfb_ms'), (11, 'cache_creation_tokens'), (12, 'cache_read_tokens'),
+                    (14, 'estimated_tokens')):
+        values, valid = parse_numbers(block, k)
+        columns[name] = np.where(valid, values, -1)
+
+    session_values, columns['session'] = parse_text(block, 1)
+    method_values, columns['method'] = parse_text(block, 2)
+    model_values, columns['model'] = parse_text(block, 8)
+    # Empty for answers the proxy gave itself and for older logs
+    upstream_values, columns['upstream'] = parse_text(block, 15)
+
+    parsed = {name: values[ok].astype(COLUMNS[name]) for name, values in columns.items()}
+    parsed.update({
+        'session_values': session_values,
+        'method_values': method_values,
+        'model_values': model_values,
+        'upstream_values': upstream_values,
+        'lines': lines,
+        'malformed': lines - int(ok.sum())
+    })
+    return parsed
+
+
+def load_logs(log_path: str, filters: dict = None, block_bytes: int = BLOCK_BYTES) -> LogColumns:
+    filters = filters or {}
+    log = LogColumns()
+    for path, index_path, closed in log_files(log_path):
+        if outside_window(index_path, filters.get('since'), filters.get('until')):
+            continue
+        log.files += 1
+        for block in read_blocks(path, closed, block_bytes):
+            log.add_block(block, filters)
+    return log.finish()
+
+
+def format_timestamps(ms) -> list:
+    text = np.datetime_as_string(np.asarray(ms, dtype='datetime64[ms]'), unit='ms')
+    return [value + 'Z' for value in text.tolist()]
+
+
+def group_percentiles(codes, values, groups: int, quantiles=PERCENTILES):
+    """Linear-interpolated percentiles of `values` per group code, as a
+    (groups, len(quantiles)) array; negative values (unknown) are ignored
+    and groups without values get NaN"""
+    known = values >= 0
+    codes = codes[known]
+    # One sort of (code, value) packed into an int64 orders values within groups
+    packed = np.sort((codes.astype(np.int64) << 32) | values[known].astype(np.int64))
+    values = (packed & 0xFFFFFFFF).astype(np.float64)
+
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((groups, len(quantiles)), np.nan)
+    has = counts > 0
+    for i, q in enumerate(quantiles):
+        position = q * (counts[has] - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, counts[has] - 1)
+        fraction = position - low
+        result[has, i] = (values[starts[has] + low] * (1 - fraction)
+                          + values[starts[has] + high] * fraction)
+    return result
+
+
+def percentile_dict(row) -> dict:
+    return {f"p{int(q * 100)}": (None if np.isnan(value) else round(float(value), 1))
+            for q, value in zip(PERCENTILES, row)}
+
+
+def group_codes(log: LogColumns, grouping: str):
+    """(codes, labels) assigning every row to a group"""
+    if grouping == 'model':
+        return log['model'], [log.models.decode(code) for code in range(len(log.models.values))]
+    if grouping == 'session':
+        return log['session'], [log.sessions.decode(code) for code in range(len(log.sessions.values))]
+    if grouping == 'upstream':
+        return log['upstream'], [log.upstreams.decode(code) or 'unknown' for code in range(len(log.upstreams.values))]
+
+    unit = 3_600_000 if grouping == 'hour' else 86_400_000
+    buckets, codes = np.unique(log['timestamp'] // unit, return_inverse=True)
+    labels = format_timestamps(buckets * unit)
+    labels = [label[:13] + ':00Z' if grouping == 'hour' else label[:10] for label in labels]
+    return codes, labels
+
+
+def breakdown(log: LogColumns, grouping: str, top: int = 0) -> list:
+    """Requests, errors, latency and ttfb percentiles, tokens and cost per group"""
+    codes, labels = group_codes(log, grouping)
+    groups = len(labels)
+    status = log['status']
+
+    def total(weights=None):
+        return np.bincount(codes, weights=weights, minlength=groups)
+
+    requests = total()
+    successes = total(status == 200)
+    errors = total(status >= 400)
+    rate_limits = total(status == 429)
+    prompt = total(log['prompt_tokens'])
+    completion = total(log['completion_tokens'])
+    reasoning = total(log['reasoning_tokens'])
+    cache_read = total(np.maximum(log['cache_read_tokens'], 0))
+    cost = total(log['cost'])
+    latency = group_percentiles(codes, log['latency_ms'], groups)
+    ttfb = group_percentiles(codes, log['ttfb_ms'], groups)
+
+    first_seen = np.full(groups, np.iinfo(np.int64).max)
+    np.minimum.at(first_seen, codes, log['timestamp'])
+    last_seen = np.full(groups, np.iinfo(np.int64).min)
+    np.maximum.at(last_seen, codes, log['timestamp'])
+
+    present = np.flatnonzero(requests > 0)
+    if grouping == 'session':
+        # Most expensive sessions first
+        present = present[np.argsort(-cost[present], kind='stable')]
+        if top:
+            present = present[:top]
+    elif grouping in ('model', 'upstream'):
+        present = present[np.argsort(-requests[present], kind='stable')]
+
+    first_text = format_timestamps(first_seen[present])
+    last_text = format_timestamps(last_seen[present])
+    return [{
+        'key': labels[g],
+        'requests': int(requests[g]),
+        'successCount': int(successes[g]),
+        'errors': int(errors[g]),
+        'rateLimits': int(rate_limits[g]),
+        'latencyMs': percentile_dict(latency[g]),
+        'ttfbMs': percentile_dict(ttfb[g]),
+        'promptTokens': int(prompt[g]),
+        'completionTokens': int(completion[g]),
+        'reasoningTokens': int(reasoning[g]),
+        'cacheReadTokens': int(cache_read[g]),
+        'cost': round(float(cost[g]), 4),
+        'firstSeen': first_text[i],
+        'lastSeen': last_text[i]
+    } for i, g in enumerate(present)]
+
+
+def peak_windows(log: LogColumns, width_s: float) -> dict:
+    """Busiest sliding windows of `width_s` seconds, each starting at a request"""
+    if len(log) == 0:
+        return {'widthS': width_s}
+    timestamp = log['timestamp']
+    ends = np.searchsorted(timestamp, timestamp + int(width_s * 1000), side='left')
+    starts = np.arange(len(timestamp))
+
+    def in_window(values):
+        cumulative = np.concatenate(([0], np.cumsum(values)))
+        return cumulative[ends] - cumulative[starts]
+
+    requests = ends - starts
+    errors = in_window(log['status'] >= 400)
+    cost = in_window(log['cost'])
+    tokens = in_window(log['prompt_tokens'].astype(np.int64) + log['completion_tokens'] + log['reasoning_tokens'])
+
+    def window(i, **values):
+        start, end = format_timestamps([timestamp[i], timestamp[i] + int(width_s * 1000)])
+        return dict({'start': start, 'end': end, 'requests': int(requests[i])}, **values)
+
+    busiest = int(np.argmax(requests))
+    worst = int(np.argmax(errors))
+    costliest = int(np.argmax(cost))
+    heaviest = int(np.argmax(tokens))
+    return {
+        'widthS': width_s,
+        'peakRequests': window(busiest, perMinute=round(requests[busiest] * 60 / width_s, 1)),
+        'peakErrors': window(worst, errors=int(errors[worst]),
+                             errorRate=round(float(errors[worst] / requests[worst]), 4)),
+        'peakCost': window(costliest, cost=round(float(cost[costliest]), 4)),
+        'peakTokens': window(heaviest, tokens=int(tokens[heaviest]))
+    }
+
+
+def gaps(timestamp, threshold_ms: int, same=None):
+    """Indices i where timestamp[i + 1] - timestamp[i] exceeds the threshold
+    (and same[i] holds, when given)"""
+    gap = np.diff(timestamp)
+    found = gap > threshold_ms
+    if same is not None:
+        found &= same
+    return np.flatnonzero(found), gap
+
+
+def find_stalls(log: LogColumns, gap_s: float, limit: int = 0) -> tuple:
+    """Stalls as the audit reports them (gaps between consecutive successful
+    requests across all sessions), and gaps within each session, both in
+    start order. Returns (stalls, session_stalls, counts); limit > 0 keeps
+    the first `limit` of each."""
+    threshold = int(gap_s * 1000)
+    success = log['status'] == 200
+    timestamp = log['timestamp'][success]
+    index, gap = gaps(timestamp, threshold)
+    counts = [len(index)]
+    index = index[:limit] if limit else index
+    starts, ends = format_timestamps(timestamp[index]), format_timestamps(timestamp[index + 1])
+    stalls = [{'startTime': s, 'endTime': e, 'duration': float(gap[i]) / 1000}
+              for s, e, i in zip(starts, ends, index.tolist())]
+
+    # Rows are in time order, so a stable sort by session orders each
+    # session's requests by time
+    order = np.argsort(log['session'][success], kind='stable')
+    session, timestamp = log['session'][success][order], timestamp[order]
+    index, gap = gaps(timestamp, threshold, session[1:] == session[:-1])
+    counts.append(len(index))
+    index = index[np.argsort(timestamp[index], kind='stable')]
+    index = index[:limit] if limit else index
+    starts, ends = format_timestamps(timestamp[index]), format_timestamps(timestamp[index + 1])
+    session_stalls = [{
+        'session_id': log.sessions.decode(int(session[i])),
+        'startTime': s,
+        'endTime': e,
+        'duration': float(gap[i]) / 1000
+    } for s, e, i in zip(starts, ends, index.tolist())]
+    return stalls, session_stalls, counts
+
+
+def incidents(log: LogColumns, gap_s: float = STALL_GAP_S, limit: int = 0) -> dict:
+    """Audit-compatible incidents; limit > 0 keeps only the first `limit`
+    entries of each list (incidentCounts always has the full counts)"""
+    status = log['status']
+    timestamp = log['timestamp']
+    prompt = log['prompt_tokens'].astype(np.int64)
+    reasoning = log['reasoning_tokens'].astype(np.int64)
+    local_methods = np.array([value.startswith(b'RATELIMIT ') for value in log.methods.values] or [False])
+    # Requests the proxy's pre-flight check rejected only have an estimate
+    preflight_methods = np.array([value.startswith(b'PREFLIGHT ') for value in log.methods.values] or [False])
+    preflight = preflight_methods[log['method']] & (status == 400)
+    context = np.where(preflight, np.maximum(log['estimated_tokens'], 0), prompt + reasoning)
+    usage = context / CONTEXT_WINDOW
+    session = log.sessions.decode
+    model = log.models.decode
+
+    masks = {
+        'rateLimits': status == 429,
+        'errors': (status >= 400) & (status != 429) & (status != 403),
+        'contextSaturations': usage > SATURATION_RATIO,
+        'reasoningOverflows': reasoning > REASONING_OVERFLOW_TOKENS,
+        'authFailures': status == 403
+    }
+
+    def entries(kind, build):
+        index = np.flatnonzero(masks[kind])
+        index = index[:limit] if limit else index
+        return [build(i, ts) for i, ts in zip(index.tolist(), format_timestamps(timestamp[index]))]
+
+    stalls, session_stalls, stall_counts = find_stalls(log, gap_s, limit)
+    return {
+        'totalRequests': len(log),
+        'successCount': int((status == 200).sum()),
+        'rateLimits': entries('rateLimits', lambda i, ts: {
+            'timestamp': ts,
+            'session_id': session(log['session'][i]),
+            'model': model(log['model'][i]),
+            'local': bool(local_methods[log['method'][i]])
+        }),
+        'errors': entries('errors', lambda i, ts: {
+            'timestamp': ts,
+            'status': int(status[i]),
+            'session_id': session(log['session'][i]),
+            'model': model(log['model'][i])
+        }),
+        'stalls': stalls,
+        'contextSaturations': entries('contextSaturations', lambda i, ts: dict({
+            'timestamp': ts,
+            'usage': float(usage[i]),
+            'tokens': int(context[i])
+        }, **({'estimated': True} if preflight[i] else {}))),
+        'reasoningOverflows': entries('reasoningOverflows', lambda i, ts: {
+            'timestamp': ts,
+            'tokens': int(reasoning[i])
+        }),
+        'authFailures': entries('authFailures', lambda i, ts: {
+            'timestamp': ts,
+            'session_id': session(log['session'][i])
+        }),
+        'averageLatency': int(round(float(log['latency_ms'].mean()))) if len(log) else 0,
+        'totalTokens': int(prompt.sum() + log['completion_tokens'].astype(np.int64).sum() + reasoning.sum()),
+        'totalCost': float(log['cost'].sum()),
+        'sessionStalls': session_stalls,
+        'incidentCounts': dict(
+            {kind: int(mask.sum()) for kind, mask in masks.items()},
+            stalls=stall_counts[0],
+            sessionStalls=stall_counts[1]
+        )
+    }
+
+
+def estimator_accuracy(log: LogColumns) -> dict:
+    """How the proxy's pre-flight estimates compare with the prompt tokens
+    the API reported, over the requests large enough to calibrate on"""
+    estimated = log['estimated_tokens'].astype(np.int64)
+    actual = log['prompt_tokens'].astype(np.int64)
+    sample = (estimated > 0) & (log['status'] < 400) & (actual >= MIN_CALIBRATION_TOKENS)
+    result = {'samples': int(sample.sum())}
+    if not result['samples']:
+        return result
+
+    error = (estimated[sample] - actual[sample]) / actual[sample]
+    ratio = actual[sample] / estimated[sample]
+    result.update({
+        'meanErrorPct': round(float(error.mean()) * 100, 2),
+        'absErrorPct': {f"p{round(q * 100)}": round(float(v) * 100, 2)
+                        for q, v in zip(PERCENTILES, np.quantile(np.abs(error), PERCENTILES))},
+        # Starting point for PROXY_PREFLIGHT_SCALE, relative to the factor in use
+        'ratioP50': round(float(np.median(ratio)), 4)
+    })
+    return result
+
+
+def analyze(log: LogColumns, groupings=('model', 'hour'), window_s: float = 300,
+            gap_s: float = STALL_GAP_S, top: int = 20, limit: int = 0) -> dict:
+    report = incidents(log, gap_s, limit)
+    report['analytics'] = {
+        'groups': {grouping: breakdown(log, grouping, top) for grouping in groupings},
+        'windows': peak_windows(log, window_s),
+        'estimator': estimator_accuracy(log)
+    }
+    return report
+
+
+def parse_time_arg(value: str):
+    return None if value is None else int(parse_timestamp(value) * 1000)
+
+
+def run_report(args):
+    filters = {
+        'since': parse_time_arg(args.since),
+        'until': parse_time_arg(args.until),
+        'session': args.session
+    }
+    started = time.perf_counter()
+    log = load_logs(args.log, filters, args.block_mb * 1024 * 1024)
+    loaded = time.perf_counter()
+    report = analyze(log, args.group, args.window, args.stall_gap, args.top, args.max_incidents)
+    done = time.perf_counter()
+
+    report['scan'] = {
+        'mode': 'full',
+        'linesRead': log.lines,
+        'malformed': log.malformed,
+        'files': log.files,
+        'bytes': log.bytes,
+        'loadMs': round((loaded - started) * 1000),
+        'analyzeMs': round((done - loaded) * 1000)
+    }
+    if log.files == 0:
+        report['note'] = 'No proxy.log found'
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Wrote {args.output}: {log.lines} lines from {log.files} files in "
+              f"{done - started:.2f}s", file=sys.stderr)
+    else:
+        print(text)
+
+
+def write_synthetic_log(directory: str, size_bytes: int, segment_bytes: int, compress: bool,
+                        sessions: int = 500, seed: int = 1) -> dict:
+    """Write a rotated proxy log of roughly size_bytes with realistic fields:
+    a mix of models and statuses, growing prompts, thinking tokens and the
+    occasional long pause"""
+    rng = np.random.default_rng(seed)
+    models = ['claude-3-5-sonnet-20241022', 'claude-3-opus-20240229', 'claude-3-5-haiku-20241022']
+    methods = ['POST /v1/messages', 'POST /v1/messages', 'POST /v1/messages', 'CACHE POST /v1/messages',
+               'RATELIMIT POST /v1/messages']
+    session_ids = [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(sessions)]
+
+    # Build a pool of line tails (everything after the timestamp) to sample from
+    tails = []
+    for _ in range(20000):
+        status = int(rng.choice([200] * 40 + [429, 500, 529, 403]))
+        method = methods[4] if status == 429 and rng.random() < 0.5 else methods[int(rng.integers(4))]
+        prompt = int(rng.gamma(2.0, 30000)) if status == 200 else 0
+        completion = int(rng.integers(50, 4000)) if status == 200 else 0
+        reasoning = int(rng.gamma(1.5, 3000)) if status == 200 and rng.random() < 0.4 else 0
+        latency = int(rng.lognormal(7.5, 0.6))
+        cache_read = int(prompt * rng.random()) if prompt else 0
+        tails.append('\t'.join([
+            session_ids[int(rng.integers(sessions))], method, str(status), str(prompt), str(completion),
+            str(reasoning), str(latency), models[int(rng.integers(len(models)))],
+            f"{(prompt * 3 + completion * 15) / 1e6:.4f}", str(int(latency * rng.random())), '0', str(cache_read)
+        ]))
+
+    os.makedirs(directory, exist_ok=True)
+    log_path = os.path.join(directory, 'proxy.log')
+    now_ms = int(datetime(2025, 11, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    # Timestamp plus tab in front of every tail
+    line_bytes = len('2025-11-01T00:00:00.000Z\t') + sum(len(tail) for tail in tails) / len(tails) + 1
+    written = lines = segment = 0
+    out = open(log_path, 'wb')
+    index = SegmentIndex()
+    while written < size_bytes:
+        if segment_bytes and index.bytes >= segment_bytes:
+            out.close()
+            segment += 1
+            closed = segment_path(log_path, segment)
+            os.rename(log_path, closed)
+            if compress:
+                with open(closed, 'rb') as src, gzip.open(closed + '.gz', 'wb', compresslevel=1) as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(closed)
+            write_index(closed, index, compress)
+            out = open(log_path, 'wb')
+            index = SegmentIndex()
+
+        # Size each batch to what is left of the segment and of the log, so
+        # rotation happens close to segment_bytes
+        budget = size_bytes - written
+        if segment_bytes:
+            budget = min(budget, segment_bytes - index.bytes)
+        batch = max(1, min(100_000, int(budget / line_bytes) + 1))
+
+        steps = rng.exponential(400, batch).astype(np.int64)
+        steps[rng.random(batch) < 0.0002] += 400_000  # pauses longer than the stall gap
+        stamps = now_ms + np.cumsum(steps)
+        now_ms = int(stamps[-1])
+        picks = rng.integers(len(tails), size=batch)
+        batch_lines = [f"{ts}Z\t{tails[p]}" for ts, p in zip(
+            np.datetime_as_string(stamps.astype('datetime64[ms]'), unit='ms').tolist(), picks.tolist())]
+        for line in batch_lines:
+            index.add(line)
+        data = ('\n'.join(batch_lines) + '\n').encode('utf-8')
+        out.write(data)
+        written += len(data)
+        lines += batch
+    out.close()
+    return {'bytes': written, 'lines': lines, 'segments': segment + 1}
+
+
+def baseline_scan(path: str, max_bytes: int) -> dict:
+    """Line-by-line parse and aggregation in the style of the audit, over
+    the first max_bytes of one plain log, for comparison"""
+    started = time.perf_counter()
+    read = lines = 0
+    totals = {'tokens': 0, 'cost': 0.0, 'latency': 0, 'saturations': 0, 'stalls': 0, 'errors': 0}
+    last_success = None
+    with open(path, 'rb') as f:
+        for raw in f:
+            read += len(raw)
+            if read > max_bytes:
+                break
+            parts = raw.decode('utf-8').rstrip('\n').split('\t')
+            if len(parts) < BASE_FIELDS:
+                continue
+            lines += 1
+            timestamp = parse_timestamp(parts[0])
+            status, prompt, completion, reasoning, latency = (int(value) for value in parts[3:8])
+            totals['tokens'] += prompt + completion + reasoning
+            totals['cost'] += float(parts[9])
+            totals['latency'] += latency
+            if status >= 400:
+                totals['errors'] += 1
+            elif status == 200:
+                if last_success is not None and timestamp - last_success > STALL_GAP_S:
+                    totals['stalls'] += 1
+                last_success = timestamp
+            if (prompt + reasoning) / CONTEXT_WINDOW > SATURATION_RATIO:
+                totals['saturations'] += 1
+    return {'bytes': min(read, max_bytes), 'lines': lines, 'seconds': time.perf_counter() - started}
+
+
+def run_bench(args):
+    work_dir = args.dir or tempfile.mkdtemp(prefix='delobotomize-analytics-')
+    try:
+        started = time.perf_counter()
+        generated = write_synthetic_log(work_dir, args.size_mb * 1024 * 1024, args.segment_mb * 1024 * 1024,
+                                        args.gzip, args.sessions)
+        generated['seconds'] = round(time.perf_counter() - started, 2)
+        print(f"Generated {generated['bytes'] / 2**20:.0f} MiB ({generated['lines']} lines, "
+              f"{generated['segments']} segments) in {generated['seconds']}s", file=sys.stderr)
+
+        log_path = os.path.join(work_dir, 'proxy.log')
+        started = time.perf_counter()
+        log = load_logs(log_path, block_bytes=args.block_mb * 1024 * 1024)
+        loaded = time.perf_counter()
+        report = analyze(log, GROUPINGS, limit=100)
+        done = time.perf_counter()
+
+        baseline = baseline_scan(log_path, args.baseline_mb * 1024 * 1024)
+        vectorized_rate = log.bytes / (done - started)
+        baseline_rate = baseline['bytes'] / baseline['seconds'] if baseline['seconds'] else None
+
+        results = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'numpy': np.__version__,
+            'generated': generated,
+            'analytics': {
+                'lines': log.lines,
+                'malformed': log.malformed,
+                'loadSeconds': round(loaded - started, 2),
+                'analyzeSeconds': round(done - loaded, 2),
+                'mbPerSecond': round(vectorized_rate / 2**20, 1),
+                'linesPerSecond': round(log.lines / (done - started)),
+                'totalRequests': report['totalRequests']
+            },
+            'baseline': {
+                'bytes': baseline['bytes'],
+                'lines': baseline['lines'],
+                'mbPerSecond': round(baseline_rate / 2**20, 1) if baseline_rate else None
+            },
+            'speedup': round(vectorized_rate / baseline_rate, 1) if baseline_rate else None,
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            'peakRssMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                               / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+        }
+        text = json.dumps(results, indent=2)
+        print(text)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + '\n')
+    finally:
+        if not args.dir and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized analytics over Delobotomize proxy logs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('report', help='Analyze proxy logs and print JSON')
+    report.add_argument('--log', default=os.getenv('PROXY_LOG_PATH', '.delobotomize/proxy.log'),
+                        help='Active log path; its rotated segments and worker logs are read too')
+    report.add_argument('--group', type=lambda value: [g for g in value.split(',') if g], default=['model', 'hour'],
+                        help=f"Comma-separated breakdowns: {', '.join(GROUPINGS)} (default: model,hour)")
+    report.add_argument('--since', help='Only requests at or after this ISO timestamp')
+    report.add_argument('--until', help='Only requests at or before this ISO timestamp')
+    report.add_argument('--session', help='Only requests of this session')
+    report.add_argument('--window', type=float, default=300, help='Sliding window width in seconds (default: 300)')
+    report.add_argument('--stall-gap', type=float, default=STALL_GAP_S,
+                        help=f'Gap in seconds counted as a stall (default: {STALL_GAP_S})')
+    report.add_argument('--top', type=int, default=20, help='Sessions listed by cost, 0 = all (default: 20)')
+    report.add_argument('--max-incidents', type=int, default=0,
+                        help='Keep at most N entries per incident list, 0 = all (default: 0)')
+    report.add_argument('--block-mb', type=int, default=BLOCK_BYTES // 2**20, help='Bytes read per block, in MiB')
+    report.add_argument('--output', help='Write JSON here instead of stdout')
+
+    bench = commands.add_parser('bench', help='Time the analytics on a synthetic log')
+    bench.add_argument('--size-mb', type=int, default=1024, help='Synthetic log size (default: 1024)')
+    bench.add_argument('--segment-mb', type=int, default=256, help='Rotate the synthetic log every N MiB')
+    bench.add_argument('--gzip', action='store_true', help='Gzip closed segments')
+    bench.add_argument('--sessions', type=int, default=500)
+    bench.add_argument('--baseline-mb', type=int, default=64,
+                       help='MiB parsed line by line for comparison (default: 64)')
+    bench.add_argument('--block-mb', type=int, default=BLOCK_BYTES // 2**20)
+    bench.add_argument('--dir', help='Write the synthetic log here and keep it (default: a temp directory)')
+    bench.add_argument('--keep', action='store_true', help='Keep the temp directory')
+    bench.add_argument('--output', help='Also write results JSON here')
+    args = parser.parse_args()
+
+    if np is None:
+        print("analytics.py needs NumPy: pip install numpy", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == 'report':
+        unknown = set(args.group) - set(GROUPINGS)
+        if unknown:
+            parser.error(f"Unknown grouping {', '.join(sorted(unknown))} (expected {', '.join(GROUPINGS)})")
+        run_report(args)
+    else:
+        run_bench(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Request/response body archive for the Delobotomize proxy.
+
+proxy.log keeps ten-odd numbers per request, which is rarely enough to tell
+why a session collapsed. With archiving enabled the proxy also keeps the
+bodies, without paying for the same history over and over: every turn of a
+session resends the system prompt, the tools and all earlier messages.
+
+A request is split into chunks at the places that repeat between turns:
+
+    system    one chunk per system block (one chunk for a string)
+    tools     one chunk for the whole list
+    messages  one chunk per content block, or per message if its content
+              is a plain string
+
+Each chunk is its compact JSON, named by its SHA-256 and compressed with a
+stdlib codec. A chunk that already exists is not written again, so the
+archive grows with new content rather than with transcript length. The
+response is stored as one chunk (SSE text for streams). A manifest line
+per request holds everything else: the remaining request fields, the chunk
+references in order, and the proxy.log fields that link the two. Its
+request_id is also written to proxy.log as an extended field.
+
+    archive/
+    ├── chunks/3f/3fa4...c1.z       chunk, compressed
+    └── manifests/2025-11-18.ndjson one manifest per line, by UTC day
+
+Requests are rebuilt as the same JSON value, not byte for byte: whitespace
+and escaping follow json.dumps. Bodies that are not JSON are stored whole.
+
+Writes happen on a single background thread. Handlers only queue the raw
+bodies; when the queue is full a request is counted as dropped and not
+archived, and the proxy carries on.
+
+Usage:
+    python proxy/archive.py show <request_id>
+    python proxy/archive.py stats
+    python proxy/archive.py gc              # after deleting old manifests
+"""
+
+import argparse
+import bz2
+import hashlib
+import json
+import logging
+import lzma
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# name -> (file suffix, compress, decompress)
+CODECS = {
+    'zlib': ('.z', lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': ('.xz', lzma.compress, lzma.decompress),
+    'bz2': ('.bz2', bz2.compress, bz2.decompress)
+}
+
+# Placeholder for a chunk inside a request skeleton
+CHUNK_KEY = '$chunk'
+# Chunks younger than this are kept by gc; a running proxy may not have
+# written the manifest that references them yet
+GC_GRACE_S = 3600
+# Digests remembered in memory before falling back to a stat per chunk
+MAX_KNOWN_CHUNKS = 1_000_000
+# How long a reused chunk is trusted to exist before its mtime is refreshed
+# again; keeps chunks in use well inside gc's grace window
+TOUCH_INTERVAL_S = 60
+
+_STOP = object()
+
+
+def encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def split_request(request: dict) -> tuple:
+    """Return (skeleton, chunks) for a decoded request body.
+
+    The skeleton is the request with repeated parts replaced by
+    {"$chunk": digest}; chunks maps each digest to its encoded JSON.
+    """
+    chunks = {}
+
+    def ref(value) -> dict:
+        data = encode(value)
+        digest = hashlib.sha256(data).hexdigest()
+        chunks[digest] = data
+        return {CHUNK_KEY: digest}
+
+    def split_message(message):
+        if isinstance(message, dict) and isinstance(message.get('content'), list):
+            return dict(message, content=[ref(block) for block in message['content']])
+        return ref(message)
+
+    skeleton = {}
+    for name, value in request.items():
+        if name == 'messages' and isinstance(value, list):
+            skeleton[name] = [split_message(message) for message in value]
+        elif name == 'system' and isinstance(value, list):
+            skeleton[name] = [ref(block) for block in value]
+        elif name in ('system', 'tools'):
+            skeleton[name] = ref(value)
+        else:
+            skeleton[name] = value
+    return skeleton, chunks
+
+
+def join_request(skeleton, load):
+    """Inverse of split_request; load(digest) returns a chunk's bytes"""
+    if isinstance(skeleton, dict):
+        if len(skeleton) == 1 and CHUNK_KEY in skeleton:
+            return json.loads(load(skeleton[CHUNK_KEY]))
+        return {name: join_request(value, load) for name, value in skeleton.items()}
+    if isinstance(skeleton, list):
+        return [join_request(value, load) for value in skeleton]
+    return skeleton
+
+
+class BodyArchive:
+    """Background writer for the deduplicated body archive"""
+
+    def __init__(self, directory: str, codec: str = 'zlib', max_queue: int = 64):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown archive codec '{codec}' (expected one of {tuple(CODECS)})")
+
+        self.directory = directory
+        self.codec = codec
+        # Pre-fork workers each append to their own manifest files
+        self.manifest_suffix = ''
+        self.archived = 0
+        self.dropped = 0
+        self.failed = 0
+        self.chunks_written = 0
+        self.chunks_reused = 0
+        self.bytes_received = 0   # raw request + response bytes
+        self.bytes_stored = 0     # compressed bytes of new chunks
+
+        self._suffix, self._compress, _ = CODECS[codec]
+        self._known = {}          # digest -> monotonic time it was last seen on disk
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._manifest = None
+        self._manifest_day = None
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._thread is None:
+            os.makedirs(os.path.join(self.directory, 'chunks'), exist_ok=True)
+            os.makedirs(os.path.join(self.directory, 'manifests'), exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='proxy-archive', daemon=True)
+            self._thread.start()
+
+    def put(self, record: dict, request_body: bytes, response_body: bytes):
+        """Queue one request for archiving; never blocks the caller.
+
+        record carries the proxy.log fields (request_id, timestamp,
+        session_id, method, status, model) stored in the manifest.
+        """
+        try:
+            self._queue.put_nowait((record, request_body, response_body))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.error(f"Archive queue full, dropped {self.dropped} requests")
+
+    def close(self, timeout: float = 10.0):
+        """Archive all queued requests and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            'archived': self.archived,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'chunks_written': self.chunks_written,
+            'chunks_reused': self.chunks_reused,
+            'bytes_received': self.bytes_received,
+            'bytes_stored': self.bytes_stored
+        }
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                try:
+                    self._archive(*item)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to archive request: {e}")
+        finally:
+            if self._manifest:
+                self._manifest.close()
+
+    def _archive(self, record: dict, request_body: bytes, response_body: bytes):
+        manifest = dict(record)
+        stored = 0
+
+        request = None
+        if request_body:
+            try:
+                request = json.loads(request_body)
+            except ValueError:
+                pass
+        if isinstance(request, dict):
+            skeleton, chunks = split_request(request)
+            for digest, data in chunks.items():
+                stored += self._store(digest, data)
+            manifest['request'] = {'json': skeleton}
+        elif request_body:
+            digest = hashlib.sha256(request_body).hexdigest()
+            stored += self._store(digest, request_body)
+            manifest['request'] = {'raw': digest}
+        else:
+            manifest['request'] = None
+
+        if response_body:
+            digest = hashlib.sha256(response_body).hexdigest()
+            stored += self._store(digest, response_body)
+            manifest['response'] = {'raw': digest}
+        else:
+            manifest['response'] = None
+
+        manifest['bytes'] = {
+            'request': len(request_body or b''),
+            'response': len(response_body or b''),
+            'stored': stored
+        }
+        self._write_manifest(manifest)
+        self.archived += 1
+        self.bytes_received += manifest['bytes']['request'] + manifest['bytes']['response']
+
+    def _store(self, digest: str, data: bytes) -> int:
+        """Write a chunk unless it exists; returns the bytes written.
+
+        A reused chunk has its mtime refreshed, so gc treats it as recent
+        until the manifest referencing it has been written.
+        """
+        now = time.monotonic()
+        if now - self._known.get(digest, -TOUCH_INTERVAL_S) < TOUCH_INTERVAL_S:
+            self.chunks_reused += 1
+            return 0
+        path = chunk_path(self.directory, digest, self._suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # never written, or removed by gc: write it again
+        else:
+            self._remember(digest, now)
+            self.chunks_reused += 1
+            return 0
+
+        compressed = self._compress(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers (and other workers) never see a partial chunk
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp, path)
+
+        self._remember(digest, now)
+        self.chunks_written += 1
+        self.bytes_stored += len(compressed)
+        return len(compressed)
+
+    def _remember(self, digest: str, now: float):
+        if len(self._known) >= MAX_KNOWN_CHUNKS:
+            self._known.clear()
+        self._known[digest] = now
+
+    def _write_manifest(self, manifest: dict):
+        day = manifest['timestamp'][:10]
+        if day != self._manifest_day:
+            if self._manifest:
+                self._manifest.close()
+            name = f"{day}{self.manifest_suffix}.ndjson"
+            self._manifest = open(os.path.join(self.directory, 'manifests', name), 'a', encoding='utf-8')
+            self._manifest_day = day
+        self._manifest.write(json.dumps(manifest, separators=(',', ':')) + '\n')
+        self._manifest.flush()
+
+
+def chunk_path(directory: str, digest: str, suffix: str) -> str:
+    return os.path.join(directory, 'chunks', digest[:2], digest + suffix)
+
+
+def load_chunk(directory: str, digest: str) -> bytes:
+    """Read a chunk written with any codec"""
+    for suffix, _, decompress in CODECS.values():
+        try:
+            with open(chunk_path(directory, digest, suffix), 'rb') as f:
+                return decompress(f.read())
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"Chunk {digest} is missing from {directory}")
+
+
+def iter_manifests(directory: str):
+    manifest_dir = os.path.join(directory, 'manifests')
+    for name in sorted(os.listdir(manifest_dir)) if os.path.isdir(manifest_dir) else []:
+        if not name.endswith('.ndjson'):
+            continue
+        with open(os.path.join(manifest_dir, name), encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def find_manifest(directory: str, request_id: str):
+    for manifest in iter_manifests(directory):
+        if manifest.get('request_id') == request_id:
+            return manifest
+    return None
+
+
+def restore(directory: str, manifest: dict) -> tuple:
+    """Return (request, response) for a manifest; request is the decoded
+    JSON value (or raw bytes), response the raw body bytes"""
+    def load(digest):
+        return load_chunk(directory, digest)
+
+    request = manifest.get('request')
+    if request and 'json' in request:
+        request = join_request(request['json'], load)
+    elif request:
+        request = load(request['raw'])
+    response = manifest.get('response')
+    return request, load(response['raw']) if response else None
+
+
+def referenced_chunks(manifest: dict) -> set:
+    digests = set()
+
+    def walk(value):
+        if isinstance(value, dict):
+            if len(value) == 1 and CHUNK_KEY in value:
+                digests.add(value[CHUNK_KEY])
+            else:
+                for item in value.values():
+                    walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    for part in (manifest.get('request'), manifest.get('response')):
+        if part and 'raw' in part:
+            digests.add(part['raw'])
+        elif part:
+            walk(part['json'])
+    return digests
+
+
+def collect_garbage(directory: str, grace: float = GC_GRACE_S) -> tuple:
+    """Delete chunks no manifest references; returns (files, bytes) removed"""
+    live = set()
+    for manifest in iter_manifests(directory):
+        live |= referenced_chunks(manifest)
+
+    removed = freed = 0
+    cutoff = time.time() - grace
+    for root, _, names in os.walk(os.path.join(directory, 'chunks')):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if name.split('.', 1)[0] in live or stat.st_mtime > cutoff:
+                continue
+            os.remove(path)
+            removed += 1
+            freed += stat.st_size
+    return removed, freed
+
+
+def archive_stats(directory: str) -> dict:
+    requests = received = 0
+    for manifest in iter_manifests(directory):
+        requests += 1
+        received += manifest['bytes']['request'] + manifest['bytes']['response']
+
+    chunks = stored = 0
+    for root, _, names in os.walk(os.path.join(directory, 'chunks')):
+        for name in names:
+            chunks += 1
+            stored += os.path.getsize(os.path.join(root, name))
+
+    return {
+        'requests': requests,
+        'chunks': chunks,
+        'bytes_received': received,
+        'bytes_stored': stored,
+        'ratio': round(received / stored, 1) if stored else None
+    }
+
+
+def main():
+    default_dir = os.path.join(os.path.dirname(os.getenv('PROXY_LOG_PATH', '.delobotomize/proxy.log')) or '.',
+                               'archive')
+    parser = argparse.ArgumentParser(description='Inspect the proxy body archive')
+    parser.add_argument('--dir', default=os.getenv('PROXY_ARCHIVE_DIR', default_dir),
+                        help='Archive directory (default: PROXY_ARCHIVE_DIR or <log dir>/archive)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    show = commands.add_parser('show', help='Print the request and response archived for a request_id')
+    show.add_argument('request_id')
+    show.add_argument('--part', choices=('request', 'response', 'manifest'), default='request')
+    commands.add_parser('stats', help='Print archive size and deduplication ratio')
+    gc = commands.add_parser('gc', help='Delete chunks no remaining manifest references')
+    gc.add_argument('--grace', type=float, default=GC_GRACE_S,
+                    help=f'Keep chunks written in the last N seconds (default: {GC_GRACE_S})')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        manifest = find_manifest(args.dir, args.request_id)
+        if manifest is None:
+            print(f"No archived request {args.request_id} in {args.dir}", file=sys.stderr)
+            sys.exit(1)
+        if args.part == 'manifest':
+            print(json.dumps(manifest, indent=2))
+            return
+        request, response = restore(args.dir, manifest)
+        if args.part == 'request':
+            print(json.dumps(request, indent=2, ensure_ascii=False) if not isinstance(request, bytes)
+                  else request.decode('utf-8', 'replace'))
+        elif response is not None:
+            sys.stdout.write(response.decode('utf-8', 'replace'))
+    elif args.command == 'stats':
+        print(json.dumps(archive_stats(args.dir), indent=2))
+    else:
+        removed, freed = collect_garbage(args.dir, args.grace)
+        print(f"Removed {removed} chunks ({freed} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the Delobotomize proxy.
+
+Starts stub_upstream.py and proxy/server.py on free local ports, drives the
+same concurrent load first directly at the stub and then through the proxy,
+and reports what the proxy adds:
+
+    - requests per second through the proxy
+    - p50/p99 added latency (proxy percentile minus direct percentile)
+    - peak RSS of the proxy (all processes in multi-process mode)
+    - log-write throughput (lines and bytes written per second)
+
+Results are written as JSON so builds can be compared; --compare exits
+non-zero when a result regresses past --tolerance against a baseline file.
+
+Each --upstream starts one more stub, with its own extra stub arguments, and
+points the proxy at all of them through PROXY_UPSTREAMS; the direct run goes
+to the first. The result then also has the share of requests each upstream
+served (from proxy.log) and the proxy's /upstreams view at the end.
+
+Usage:
+    python proxy/bench.py --concurrency 16 --requests 2000 --latency-ms 50
+    python proxy/bench.py --stream --output bench.json --compare baseline.json
+    python proxy/bench.py --proxy-env PROXY_PROCESSES=4
+    python proxy/bench.py --upstream "" --upstream "--latency-ms 200" --upstream "--fail-rate 0.5"
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+PROXY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def process_tree(pid: int) -> list:
+    """pid plus its direct children (pre-fork workers), Linux only"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+
+def peak_rss_bytes(pid: int):
+    """Sum of VmHWM over a process and its children, or None off Linux"""
+    total = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total or None
+
+
+def run_load(port: int, body: bytes, concurrency: int, total: int, stream: bool) -> dict:
+    """Send total requests over concurrency keep-alive connections"""
+    latencies = []
+    ttfbs = []
+    statuses = {}
+    errors = 0
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        nonlocal errors
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                conn.request('POST', '/v1/messages', body, {
+                    'Content-Type': 'application/json',
+                    'anthropic-version': '2023-06-01'
+                })
+                response = conn.getresponse()
+                if stream:
+                    response.read1(1)
+                    first = time.perf_counter()
+                response.read()
+                finished = time.perf_counter()
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+                continue
+            with lock:
+                latencies.append((finished - started) * 1000)
+                if stream:
+                    ttfbs.append((first - started) * 1000)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ttfbs.sort()
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'duration_s': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': _round(percentile(latencies, 0.50)),
+            'p99': _round(percentile(latencies, 0.99)),
+            'max': _round(latencies[-1] if latencies else None)
+        }
+    }
+    if stream:
+        result['ttfb_ms'] = {
+            'p50': _round(percentile(ttfbs, 0.50)),
+            'p99': _round(percentile(ttfbs, 0.99))
+        }
+    return result
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def request_body(prompt_bytes: int, stream: bool, model: str) -> bytes:
+    filler = 'lorem ipsum dolor sit amet ' * (prompt_bytes // 27 + 1)
+    return json.dumps({
+        'model': model,
+        'max_tokens': 1024,
+        'stream': stream,
+        'messages': [{'role': 'user', 'content': filler[:prompt_bytes]}]
+    }).encode('utf-8')
+
+
+def log_stats(log_dir: str) -> dict:
+    """Lines and bytes across proxy.log, worker logs and rotated segments"""
+    lines = 0
+    size = 0
+    for path in glob.glob(os.path.join(log_dir, 'proxy*.log*')):
+        if path.endswith('.json') or path.endswith('.gz'):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        lines += data.count(b'\n')
+        size += len(data)
+    return {'lines': lines, 'bytes': size}
+
+
+def wait_for_log_lines(log_dir: str, lines: int, timeout: float = 5.0):
+    """Wait until the proxy's batched writer has flushed at least lines"""
+    deadline = time.monotonic() + timeout
+    while log_stats(log_dir)['lines'] < lines and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def routed_counts(log_dir: str) -> dict:
+    """Requests per upstream, from the upstream field of proxy.log lines"""
+    counts = {}
+    for path in glob.glob(os.path.join(log_dir, 'proxy*.log*')):
+        if path.endswith('.json') or path.endswith('.gz'):
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                name = parts[15] if len(parts) > 15 and parts[15] else None
+                counts[name] = counts.get(name, 0) + 1
+    return {str(name): count for name, count in sorted(counts.items(), key=lambda item: -item[1])}
+
+
+def fetch_json(port: int, path: str):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', path)
+        return json.loads(conn.getresponse().read())
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    finally:
+        conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROXY_DIR,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of result against baseline beyond a relative tolerance"""
+    checks = [
+        ('proxy.rps', result['proxy']['rps'], baseline['proxy']['rps'], 'lower'),
+        ('added_latency_ms.p50', result['added_latency_ms']['p50'], baseline['added_latency_ms']['p50'], 'higher'),
+        ('added_latency_ms.p99', result['added_latency_ms']['p99'], baseline['added_latency_ms']['p99'], 'higher'),
+        ('peak_rss_bytes', result['peak_rss_bytes'], baseline['peak_rss_bytes'], 'higher'),
+    ]
+    regressions = []
+    for name, current, previous, bad in checks:
+        if current is None or previous is None:
+            continue
+        # Added latency can sit near zero, so allow an absolute 1ms of slack
+        slack = max(abs(previous) * tolerance, 1.0 if 'latency' in name else 0.0)
+        if (bad == 'higher' and current > previous + slack) or (bad == 'lower' and current < previous - slack):
+            regressions.append(f"{name}: {previous} -> {current}")
+    return regressions
+
+
+def run_bench(args, work_dir: str) -> dict:
+    """Run the stubs and the proxy with their logs in work_dir; return the results"""
+    stub_ports = [free_port() for _ in args.upstream or ['']]
+    stub_port = stub_ports[0]
+    proxy_port = free_port()
+    log_path = os.path.join(work_dir, 'proxy.log')
+
+    # Later arguments win, so each --upstream can override the shared ones
+    stubs = [subprocess.Popen([
+        sys.executable, os.path.join(PROXY_DIR, 'stub_upstream.py'),
+        '--port', str(port),
+        '--latency-ms', str(args.latency_ms),
+        '--response-bytes', str(args.response_bytes),
+        '--stream-events', str(args.stream_events),
+        '--error-rate', str(args.error_rate),
+        *shlex.split(extra)
+    ]) for port, extra in zip(stub_ports, args.upstream or [''])]
+
+    env = dict(os.environ)
+    env.update({
+        'ANTHROPIC_API_KEY': env.get('ANTHROPIC_API_KEY') or 'bench',
+        'ANTHROPIC_BASE_URL': f'http://127.0.0.1:{stub_port}',
+        'PROXY_PORT': str(proxy_port),
+        'PROXY_LOG_PATH': log_path,
+        'PROXY_WORKERS': str(max(32, args.concurrency)),
+        'PROXY_UPSTREAM_POOL_SIZE': str(max(16, args.concurrency)),
+        # Identical bench bodies would otherwise all be coalesced into one call
+        'PROXY_COALESCE': '0'
+    })
+    if args.upstream:
+        env['PROXY_UPSTREAMS'] = ','.join(
+            f'u{index}=http://127.0.0.1:{port}' for index, port in enumerate(stub_ports))
+    for item in args.proxy_env:
+        key, _, value = item.partition('=')
+        env[key] = value
+
+    proxy = subprocess.Popen(
+        [sys.executable, os.path.join(PROXY_DIR, 'server.py')],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    routing = None
+    try:
+        for port in stub_ports:
+            wait_for_port(port)
+        wait_for_port(proxy_port)
+
+        body = request_body(args.prompt_bytes, args.stream, args.model)
+        load = (body, args.concurrency, args.requests, args.stream)
+
+        if args.warmup:
+            run_load(stub_port, body, args.concurrency, args.warmup, args.stream)
+            warmup = run_load(proxy_port, body, args.concurrency, args.warmup, args.stream)
+            wait_for_log_lines(work_dir, warmup['requests'])
+        log_before = log_stats(work_dir)
+
+        direct = run_load(stub_port, *load)
+        through_proxy = run_load(proxy_port, *load)
+        rss = peak_rss_bytes(proxy.pid)
+        if args.upstream:
+            # Streams still count as in flight until they are logged
+            wait_for_log_lines(work_dir, log_before['lines'] + through_proxy['requests'])
+            routing = fetch_json(proxy_port, '/upstreams')
+    finally:
+        # SIGTERM lets the proxy drain its log writer before exiting
+        proxy.send_signal(signal.SIGTERM)
+        try:
+            proxy.wait(15)
+        except subprocess.TimeoutExpired:
+            proxy.kill()
+        for stub in stubs:
+            stub.terminate()
+            stub.wait(5)
+
+    log_after = log_stats(work_dir)
+    log_lines = log_after['lines'] - log_before['lines']
+    log_bytes = log_after['bytes'] - log_before['bytes']
+    duration = through_proxy['duration_s']
+
+    result = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('output', 'compare', 'tolerance', 'keep')
+        },
+        'direct': direct,
+        'proxy': through_proxy,
+        'added_latency_ms': {
+            q: _round(through_proxy['latency_ms'][q] - direct['latency_ms'][q])
+            if through_proxy['latency_ms'][q] is not None and direct['latency_ms'][q] is not None else None
+            for q in ('p50', 'p99')
+        },
+        'peak_rss_bytes': rss,
+        'log': {
+            'lines': log_lines,
+            'bytes': log_bytes,
+            'lines_per_s': round(log_lines / duration, 1) if duration else None,
+            'bytes_per_s': round(log_bytes / duration, 1) if duration else None
+        }
+    }
+    if args.upstream:
+        # Counts cover the warmup too; the snapshot is one worker's view
+        result['routing'] = {'requests': routed_counts(work_dir), 'upstreams': routing}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Delobotomize proxy against a local stub upstream')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=50, help='requests sent before measuring')
+    parser.add_argument('--prompt-bytes', type=int, default=20_000, help='size of each request prompt')
+    parser.add_argument('--response-bytes', type=int, default=2048)
+    parser.add_argument('--latency-ms', type=float, default=20, help='stub upstream latency')
+    parser.add_argument('--stream', action='store_true', help='send stream: true requests')
+    parser.add_argument('--stream-events', type=int, default=20)
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of stub responses that are 429s')
+    parser.add_argument('--model', default='claude-3-5-sonnet-20241022')
+    parser.add_argument('--proxy-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the proxy, e.g. PROXY_PROCESSES=4')
+    parser.add_argument('--upstream', action='append', default=[], metavar='STUB_ARGS',
+                        help='start another stub upstream with these extra arguments and route between them '
+                             '(repeatable), e.g. "--latency-ms 200"')
+    parser.add_argument('--output', help='write results JSON here (default: print only)')
+    parser.add_argument('--compare', metavar='BASELINE', help='baseline results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed relative regression (default 0.10)')
+    parser.add_argument('--keep', action='store_true', help='keep the temp directory with the proxy logs')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='delobotomize-bench-')
+    try:
+        result = run_bench(args, work_dir)
+    finally:
+        if args.keep:
+            print(f"Proxy logs kept in {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != result['config']:
+            print(f"Note: {args.compare} was run with a different configuration", file=sys.stderr)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions against ' + args.compare + ':', file=sys.stderr)
+            for regression in regressions:
+                print('  ' + regression, file=sys.stderr)
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Response cache for the Delobotomize proxy.
+
+Deterministic requests (temperature 0, non-streaming) are keyed on a hash of
+their normalized body. Responses live in an in-memory LRU tier backed by an
+on-disk store, both bounded by size and expired by TTL.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Request fields that determine the response; everything else (metadata,
+# client-side bookkeeping) is ignored when computing the key.
+KEY_FIELDS = (
+    'model', 'messages', 'system', 'tools', 'tool_choice', 'max_tokens',
+    'temperature', 'top_p', 'top_k', 'stop_sequences', 'thinking'
+)
+
+
+def is_cacheable(request_data: dict) -> bool:
+    """Whether a request is deterministic (non-streaming, temperature 0)"""
+    return not request_data.get('stream') and request_data.get('temperature') == 0
+
+
+def cache_key(path: str, request_data: dict):
+    """Return the cache key for a request, or None if it is not deterministic"""
+    if not is_cacheable(request_data):
+        return None
+    normalized = {field: request_data[field] for field in KEY_FIELDS if field in request_data}
+    normalized['path'] = path
+    encoded = json.dumps(normalized, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + disk) cache of upstream response bodies"""
+
+    def __init__(self, directory: str, ttl: float = 86400, max_entries: int = 512,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (stored_at, body)
+        self._disk = OrderedDict()    # key -> (stored_at, size), oldest first
+        self._disk_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_entries()
+
+    def get(self, key: str):
+        """Return a cached body, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._memory[key]
+
+            disk_entry = self._disk.get(key)
+            if not disk_entry or now - disk_entry[0] >= self.ttl:
+                if disk_entry:
+                    self._remove_disk_entry(key)
+                self.misses += 1
+                return None
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                body = f.read()
+        except OSError:
+            with self._lock:
+                self._remove_disk_entry(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._remember(key, disk_entry[0], body)
+            self.hits += 1
+            self.disk_hits += 1
+        return body
+
+    def put(self, key: str, body: bytes):
+        """Store a response body in both tiers"""
+        stored_at = time.time()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+
+        with self._lock:
+            self._remember(key, stored_at, body)
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)[1]
+            self._disk[key] = (stored_at, len(body))
+            self._disk_bytes += len(body)
+            while self._disk_bytes > self.max_bytes and self._disk:
+                self._remove_disk_entry(next(iter(self._disk)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes
+            }
+
+    def _remember(self, key: str, stored_at: float, body: bytes):
+        self._memory[key] = (stored_at, body)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _remove_disk_entry(self, key: str):
+        stored = self._disk.pop(key, None)
+        if stored:
+            self._disk_bytes -= stored[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_disk_entries(self):
+        """Index existing on-disk entries, dropping expired ones"""
+        now = time.time()
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp') or now - stat.st_mtime >= self.ttl:
+                    os.remove(path)
+                    continue
+                entries.append((stat.st_mtime, name, stat.st_size))
+
+        for stored_at, key, size in sorted(entries):
+            self._disk[key] = (stored_at, size)
+            self._disk_bytes += size
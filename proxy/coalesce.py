@@ -0,0 +1,101 @@
+"""
+Single-flight request coalescing for the Delobotomize proxy.
+
+Sub-agents and retried hook calls often send byte-identical /v1/messages
+bodies at the same moment. While one upstream call for a body is in flight,
+identical requests join it as followers: they wait for the leader's outcome
+and answer their own clients with the same status and body instead of
+issuing a second upstream call. A leader that fails hands its error to every
+follower.
+
+Only non-streaming requests are coalesced; a stream belongs to the client
+that opened it.
+"""
+
+import hashlib
+import threading
+
+
+def coalesce_key(path: str, body: bytes, api_version: str) -> str:
+    """Identity of a request for coalescing: path, API version and exact body"""
+    digest = hashlib.sha256()
+    digest.update(path.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(api_version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class Flight:
+    """Outcome of one in-flight upstream call, shared with its followers"""
+
+    __slots__ = ('key', 'status', 'body', 'headers', 'error', 'followers', '_done')
+
+    def __init__(self, key: str):
+        self.key = key
+        self.status = None
+        self.body = None
+        self.headers = None
+        self.error = None
+        self.followers = 0
+        self._done = threading.Event()
+
+    @property
+    def resolved(self) -> bool:
+        return self.status is not None
+
+    def resolve(self, status: int, body: bytes, headers: dict = None):
+        """Record the leader's upstream response, before it is sent to its own client"""
+        if not self.resolved:
+            self.status = status
+            self.body = body
+            self.headers = headers
+
+    def fail(self, status: int, message: str):
+        """Record a failure the leader could not turn into an upstream response"""
+        if not self.resolved:
+            self.status = status
+            self.error = message
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class SingleFlight:
+    """Registry of in-flight requests keyed by coalesce_key"""
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key: str):
+        """Return (flight, is_leader); the leader must call finish() when done"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight(key)
+            self.leaders += 1
+            return flight, True
+
+    def finish(self, flight: Flight):
+        """Release followers; later identical requests start a new flight"""
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        if not flight.resolved:
+            flight.fail(502, 'Coalesced upstream request did not complete')
+        flight._done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'in_flight': len(self._flights)
+            }
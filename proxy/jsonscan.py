@@ -0,0 +1,256 @@
+"""
+Low-copy field extraction for the Delobotomize proxy.
+
+Request bodies near the 200k-token context limit are several megabytes of
+JSON, but the proxy only needs a handful of top-level fields (model, stream,
+temperature) and, from responses, the usage block and thinking text. These
+helpers locate those values by scanning the raw bytes: strings are skipped
+with a single regex match and nested containers by bracket counting, so no
+Python objects are built for the bulk of the payload. Only the selected
+values are decoded.
+
+The conversation history under "messages" (and the "content" array of a
+response) is by far the largest value, so it is never walked token by token.
+Keys before it are read by walking forward from the start of the object;
+keys after it are found by locating the `],"key":` boundary that ends the
+array (a C-speed regex search) and walking forward from there. A candidate
+boundary that is really nested inside the array fails that walk on an
+unbalanced bracket and is skipped.
+
+The scan is bounded: malformed input, or a body that needs more than
+`max_steps` tokens to walk, falls back to a full json.loads. Bodies under
+FULL_PARSE_BELOW bytes are parsed outright, since json.loads is faster than
+the scan there and the allocation is negligible.
+"""
+
+import json
+import re
+
+# A complete JSON string literal, including escapes (unrolled for speed)
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+# Next character that can change nesting: a string start or a bracket
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+# Bare scalar value: number, true, false or null
+_SCALAR = re.compile(rb'[^,}\]\s]+')
+_SEPARATOR = re.compile(rb'\s*,?\s*')
+_COLON = re.compile(rb'\s*:\s*')
+_WHITESPACE = re.compile(rb'\s*')
+# Possible end of a top-level array value followed by the next key
+_ARRAY_BOUNDARY = re.compile(rb'\]\s*,\s*"')
+
+# Top-level arrays too large to walk; their span is found from the boundary
+BULKY_KEYS = (b'messages', b'content')
+
+# Object keys named "thinking" (i.e. followed by a colon) and the start of their value
+_THINKING_KEY = re.compile(rb'"thinking"\s*:\s*(?=")')
+
+DEFAULT_MAX_STEPS = 200_000
+FULL_PARSE_BELOW = 256 * 1024
+
+
+class ScanLimit(Exception):
+    """Raised when a scan exceeds its step budget"""
+
+
+def _skip_value(buf, pos: int, budget: list) -> int:
+    """Return the offset just past the JSON value starting at pos"""
+    first = buf[pos]
+
+    if first == 0x22:  # "
+        return _STRING.match(buf, pos).end()
+
+    if first not in (0x7b, 0x5b):  # { [
+        return _SCALAR.match(buf, pos).end()
+
+    depth = 0
+    while True:
+        budget[0] -= 1
+        if budget[0] < 0:
+            raise ScanLimit()
+        match = _STRUCTURAL.search(buf, pos)
+        if match is None:
+            raise ValueError('Unterminated JSON container')
+        char = buf[match.start()]
+        if char == 0x22:
+            pos = _STRING.match(buf, match.start()).end()
+            continue
+        pos = match.end()
+        if char in (0x7b, 0x5b):
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+def _walk_object(buf, pos: int, wanted: dict, spans: dict, budget: list, skip_bulky: bool):
+    """Walk key/value pairs of the top-level object starting at pos.
+
+    Returns ('end', offset of the closing brace, None) or, when skip_bulky is
+    set and a bulky array is reached, ('bulky', offset of its value, key).
+    """
+    while True:
+        pos = _SEPARATOR.match(buf, pos).end()
+        if buf[pos:pos + 1] == b'}':
+            return 'end', pos, None
+
+        key_match = _STRING.match(buf, pos)
+        if key_match is None:
+            raise ValueError(f'Expected a key at offset {pos}')
+        key = bytes(buf[key_match.start() + 1:key_match.end() - 1])
+
+        colon = _COLON.match(buf, key_match.end())
+        if colon is None:
+            raise ValueError(f'Expected ":" at offset {key_match.end()}')
+        start = colon.end()
+
+        if skip_bulky and key in BULKY_KEYS and buf[start:start + 1] == b'[':
+            return 'bulky', start, key
+
+        end = _skip_value(buf, start, budget)
+        if key in wanted:
+            spans[wanted[key]] = (start, end)
+        pos = end
+
+
+def top_level_spans(buf, keys, max_steps: int = DEFAULT_MAX_STEPS) -> dict:
+    """Return {key: (start, end)} byte spans of the requested top-level values.
+
+    Raises ValueError on malformed input and ScanLimit when the step budget
+    runs out.
+    """
+    wanted = {key.encode('utf-8'): key for key in keys}
+    spans = {}
+    budget = [max_steps]
+
+    pos = _WHITESPACE.match(buf, 0).end()
+    if buf[pos:pos + 1] != b'{':
+        raise ValueError('Expected a JSON object')
+
+    outcome, pos, bulky_key = _walk_object(buf, pos + 1, wanted, spans, budget, skip_bulky=True)
+    if outcome == 'end':
+        return spans
+
+    # The first boundary that walks cleanly to the final closing brace is the
+    # end of the bulky array; if none does, the array is the last member.
+    last = len(buf) - 1
+    while buf[last] in b' \t\r\n':
+        last -= 1
+    array_end = last
+    for boundary in _ARRAY_BOUNDARY.finditer(buf, pos + 1):
+        budget[0] -= 1
+        if budget[0] < 0:
+            raise ScanLimit()
+        tail = {}
+        try:
+            _, end, _ = _walk_object(buf, boundary.end() - 1, wanted, tail, budget, skip_bulky=False)
+        except (ValueError, AttributeError, IndexError):
+            continue
+        if end == last:
+            spans.update(tail)
+            array_end = boundary.start() + 1
+            break
+    else:
+        while buf[array_end - 1] in b' \t\r\n':
+            array_end -= 1
+
+    if bulky_key in wanted:
+        spans[wanted[bulky_key]] = (pos, array_end)
+    return spans
+
+
+def array_items(buf, pos: int, max_steps: int = DEFAULT_MAX_STEPS):
+    """Yield (start, end) byte spans of the items of a JSON array.
+
+    pos is just inside the array: after its opening bracket, or after an
+    item already seen. Stops at the closing bracket; raises ValueError on
+    malformed input and ScanLimit when the step budget runs out.
+    """
+    budget = [max_steps]
+    while True:
+        pos = _SEPARATOR.match(buf, pos).end()
+        if buf[pos:pos + 1] == b']':
+            return
+        if pos >= len(buf):
+            raise ValueError('Unterminated JSON array')
+        end = _skip_value(buf, pos, budget)
+        yield pos, end
+        pos = end
+
+
+def scan_fields(buf, keys, max_steps: int = DEFAULT_MAX_STEPS) -> dict:
+    """Decode only the requested top-level fields of a JSON object.
+
+    Missing keys are absent from the result. Falls back to a full parse if
+    the bounded scan cannot complete.
+    """
+    if not buf:
+        return {}
+    if len(buf) < FULL_PARSE_BELOW:
+        data = json.loads(buf)
+        return {key: data[key] for key in keys if key in data}
+    try:
+        spans = top_level_spans(buf, keys, max_steps)
+        return {key: json.loads(buf[start:end]) for key, (start, end) in spans.items()}
+    except (ScanLimit, ValueError, AttributeError, IndexError):
+        data = json.loads(buf)
+        return {key: data[key] for key in keys if key in data}
+
+
+def _string_end(buf, start: int, end: int) -> int:
+    """Return the offset just past the string literal opening at start, or -1.
+
+    Uses memchr-speed find() rather than the regex, which is faster for long
+    prose with few escaped quotes.
+    """
+    pos = start + 1
+    while True:
+        quote = buf.find(b'"', pos, end)
+        if quote < 0:
+            return -1
+        backslashes = 0
+        while buf[quote - 1 - backslashes] == 0x5c:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return quote + 1
+        pos = quote + 1
+
+
+def count_thinking_words(buf, start: int = 0, end: int = None) -> int:
+    """Count words in every "thinking" string value within buf[start:end]"""
+    end = len(buf) if end is None else end
+    words = 0
+    for key_match in _THINKING_KEY.finditer(buf, start, end):
+        value_end = _string_end(buf, key_match.end(), end)
+        if value_end > 0:
+            # Decode the string so escapes split into words exactly as the
+            # full parse would; json's scanstring is C speed
+            try:
+                text = json.loads(bytes(buf[key_match.end():value_end]))
+            except ValueError:
+                continue
+            words += len(text.split())
+    return words
+
+
+def response_usage(buf, max_steps: int = DEFAULT_MAX_STEPS):
+    """Return (usage dict, thinking word count) from a Messages API response body"""
+    spans = None
+    if len(buf) >= FULL_PARSE_BELOW:
+        try:
+            spans = top_level_spans(buf, ('usage', 'content'), max_steps)
+        except (ScanLimit, ValueError, AttributeError, IndexError):
+            pass
+
+    if spans is None:
+        data = json.loads(buf)
+        thinking = sum(
+            len(block.get('thinking', '').split())
+            for block in data.get('content', [])
+            if block.get('type') == 'thinking'
+        )
+        return data.get('usage', {}), thinking
+
+    usage = json.loads(buf[slice(*spans['usage'])]) if 'usage' in spans else {}
+    thinking = count_thinking_words(buf, *spans['content']) if 'content' in spans else 0
+    return usage, thinking
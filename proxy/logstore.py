@@ -0,0 +1,332 @@
+"""
+Log storage for the Delobotomize proxy.
+
+Request handlers hand finished TSV lines to a LogWriter, which appends them
+to proxy.log from a single background thread. Handlers never touch the file
+themselves, so client responses do not wait on disk I/O and lines from
+concurrent requests cannot interleave.
+
+The active log is rotated into numbered segments once it exceeds a size or
+age limit:
+
+    proxy.log                    active segment (always appended to)
+    proxy.log.000001[.gz]        closed segment, optionally gzip-compressed
+    proxy.log.000001.idx.json    sidecar index for the closed segment
+
+Each index records the segment's time range, line count, the sessions it
+contains and periodic (timestamp, byte offset) checkpoints, so readers can
+skip segments outside a time window or session without opening them. Byte
+offsets always refer to the uncompressed TSV stream. The line format inside
+every segment is unchanged.
+
+In multi-process mode each worker owns a separate log, proxy.w<N>.log,
+rotated the same way; readers merge the worker logs by timestamp.
+"""
+
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('none', 'flush', 'fsync')
+INDEX_SUFFIX = '.idx.json'
+INDEX_VERSION = 1
+
+_STOP = object()
+
+
+def segment_path(log_path: str, number: int) -> str:
+    """Path of closed segment `number` for the given active log path"""
+    return f"{log_path}.{number:06d}"
+
+
+def worker_log_path(log_path: str, worker: int) -> str:
+    """Active log of a pre-fork worker: proxy.log -> proxy.w0.log"""
+    root, ext = os.path.splitext(log_path)
+    return f"{root}.w{worker}{ext}"
+
+
+def list_segments(log_path: str) -> list:
+    """Return closed segments of a log as (number, path, index_path) tuples, oldest first"""
+    directory = os.path.dirname(log_path) or '.'
+    pattern = re.compile(re.escape(os.path.basename(log_path)) + r'\.(\d{6})(\.gz)?$')
+    found = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        match = pattern.match(name)
+        # While a segment is being compressed both copies exist; prefer the .gz
+        if match and (int(match.group(1)) not in found or match.group(2)):
+            found[int(match.group(1))] = os.path.join(directory, name)
+    return [
+        (number, found[number], segment_path(log_path, number) + INDEX_SUFFIX)
+        for number in sorted(found)
+    ]
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """Convert a proxy.log timestamp to epoch seconds"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+
+class SegmentIndex:
+    """Running summary of one log segment, saved as a sidecar JSON index"""
+
+    CHECKPOINT_EVERY = 1000
+
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.sessions = {}
+        self.checkpoints = []
+
+    def add(self, line: str):
+        """Account for one line appended at the current end of the segment"""
+        offset = self.bytes
+        timestamp, _, rest = line.partition('\t')
+        session_id = rest.partition('\t')[0]
+
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            self.sessions[session_id] = {'first_offset': offset, 'last_offset': offset, 'lines': 1}
+        else:
+            session['last_offset'] = offset
+            session['lines'] += 1
+
+        if self.lines % self.CHECKPOINT_EVERY == 0:
+            self.checkpoints.append([timestamp, offset])
+
+        self.lines += 1
+        self.bytes += len(line.encode('utf-8')) + 1
+
+    @classmethod
+    def scan(cls, path: str) -> 'SegmentIndex':
+        """Rebuild the index of an existing plain-text segment"""
+        index = cls()
+        try:
+            with open(path, 'r', encoding='utf-8', newline='\n') as f:
+                for line in f:
+                    if line.endswith('\n'):
+                        index.add(line[:-1])
+                    else:
+                        # Partial trailing line: count its bytes but do not index it
+                        index.bytes += len(line.encode('utf-8'))
+        except FileNotFoundError:
+            pass
+        return index
+
+    def started_at(self) -> float:
+        """Epoch time of the first line, or None for an empty segment"""
+        if self.first_timestamp is None:
+            return None
+        try:
+            return parse_timestamp(self.first_timestamp)
+        except ValueError:
+            return None
+
+    def to_dict(self, segment_name: str, compressed: bool) -> dict:
+        return {
+            'version': INDEX_VERSION,
+            'segment': segment_name,
+            'compressed': compressed,
+            'lines': self.lines,
+            'bytes': self.bytes,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'sessions': self.sessions,
+            'checkpoints': self.checkpoints
+        }
+
+
+def write_index(closed_path: str, index: SegmentIndex, compressed: bool):
+    """Write the sidecar index of a closed segment (closed_path without .gz)"""
+    name = os.path.basename(closed_path) + ('.gz' if compressed else '')
+    index_path = closed_path + INDEX_SUFFIX
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index.to_dict(name, compressed), f)
+    os.replace(index_path + '.tmp', index_path)
+
+
+class LogWriter:
+    """Background writer that appends queued log lines to a file in batches
+
+    Durability controls what happens after each batch is written:
+        none  - leave data in the process buffer (fastest, lost on crash)
+        flush - hand data to the OS (survives a proxy crash)
+        fsync - force data to disk (survives a host crash)
+
+    Rotation starts a new segment before a batch once the active one holds
+    more than max_bytes or its first line is older than max_age seconds
+    (0 disables either limit). Closed segments are gzipped in the background
+    when compress is set.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.2, batch_size: int = 256,
+                 durability: str = 'flush', max_queue: int = 100_000,
+                 max_bytes: int = 0, max_age: float = 0, compress: bool = False):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown log durability '{durability}' (expected one of {DURABILITY_MODES})")
+
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.durability = durability
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.dropped = 0
+        self.written = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._file = None
+        self._index = None
+        self._started_at = None
+        self._compressors = []
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='proxy-log-writer', daemon=True)
+            self._thread.start()
+
+    def write(self, line: str):
+        """Queue a line for writing; never blocks the caller"""
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.error(f"Log queue full, dropped {self.dropped} lines")
+
+    def close(self, timeout: float = 5.0):
+        """Flush all queued lines and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        for compressor in self._compressors:
+            compressor.join(timeout)
+
+    def _next_batch(self) -> list:
+        """Block for the first line, then gather more until the batch is full
+        or the flush interval has elapsed."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        self._open_active()
+        try:
+            while True:
+                batch = self._next_batch()
+                stopping = batch[-1] is _STOP
+                if stopping:
+                    batch.pop()
+
+                if batch:
+                    try:
+                        if self._should_rotate():
+                            self._rotate()
+                        self._file.write('\n'.join(batch) + '\n')
+                        for line in batch:
+                            self._index.add(line)
+                        self.written += len(batch)
+                        self._sync(self._file)
+                    except Exception as e:
+                        logger.error(f"Failed to write log: {e}")
+
+                if stopping:
+                    return
+        finally:
+            self._file.close()
+
+    def _sync(self, f):
+        if self.durability == 'none':
+            return
+        f.flush()
+        if self.durability == 'fsync':
+            os.fsync(f.fileno())
+
+    def _open_active(self):
+        """Open the active segment, indexing whatever it already contains"""
+        self._index = SegmentIndex.scan(self.path) if self.max_bytes or self.max_age else SegmentIndex()
+        self._started_at = self._index.started_at()
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=1 << 16)
+
+    def _should_rotate(self) -> bool:
+        if self._index.lines == 0:
+            return False
+        if self.max_bytes and self._index.bytes >= self.max_bytes:
+            return True
+        if self.max_age and self._started_at is not None:
+            return time.time() - self._started_at >= self.max_age
+        return False
+
+    def _rotate(self):
+        """Close the active segment, move it to the next number and index it"""
+        self._file.close()
+
+        segments = list_segments(self.path)
+        number = segments[-1][0] + 1 if segments else 1
+        closed_path = segment_path(self.path, number)
+        os.rename(self.path, closed_path)
+
+        index = self._index
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=1 << 16)
+        self._index = SegmentIndex()
+        self._started_at = time.time()
+
+        if self.compress:
+            # Compress off the writer thread; the index is written once the
+            # .gz exists so it never points at a missing file.
+            compressor = threading.Thread(
+                target=self._compress_segment, args=(closed_path, index),
+                name='proxy-log-compress', daemon=True
+            )
+            self._compressors = [t for t in self._compressors if t.is_alive()] + [compressor]
+            compressor.start()
+        else:
+            self._write_index(closed_path, index, compressed=False)
+
+        logger.info(f"Rotated proxy log to {os.path.basename(closed_path)} ({index.lines} lines)")
+
+    def _compress_segment(self, closed_path: str, index: SegmentIndex):
+        gz_path = closed_path + '.gz'
+        try:
+            with open(closed_path, 'rb') as src, gzip.open(gz_path + '.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(gz_path + '.tmp', gz_path)
+            self._write_index(closed_path, index, compressed=True)
+            os.remove(closed_path)
+        except Exception as e:
+            logger.error(f"Failed to compress {closed_path}: {e}")
+            self._write_index(closed_path, index, compressed=False)
+
+    @staticmethod
+    def _write_index(closed_path: str, index: SegmentIndex, compressed: bool):
+        write_index(closed_path, index, compressed)
@@ -0,0 +1,243 @@
+"""
+In-process metrics for the Delobotomize proxy.
+
+Every logged request is also recorded here: counts by model and status,
+latency and time-to-first-byte histograms, token totals and cost. Recording
+is a handful of dict updates under one lock, so it adds no measurable work
+to a request. Aggregates are served by the proxy at /metrics in Prometheus
+text format and at /metrics.json.
+
+Histograms use fixed millisecond buckets; p50/p95/p99 are estimated by
+interpolating within the bucket that contains the requested rank.
+"""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+# Upper bounds (ms) of the latency histogram buckets; a final +Inf bucket is implicit
+LATENCY_BUCKETS_MS = (
+    10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000
+)
+QUANTILES = (0.5, 0.95, 0.99)
+TOKEN_TYPES = ('prompt', 'completion', 'reasoning', 'cache_creation', 'cache_read')
+
+# Metric names are prefixed so they do not collide with other exporters
+PREFIX = 'delobotomize_proxy'
+
+
+class Histogram:
+    """Cumulative-friendly bucket histogram with quantile estimates"""
+
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: 'Histogram'):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q: float):
+        """Estimate the q-th quantile, or None if nothing was observed"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i else 0
+                if i == len(LATENCY_BUCKETS_MS):
+                    # Overflow bucket has no upper bound; report its lower edge
+                    return float(lower)
+                upper = LATENCY_BUCKETS_MS[i]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return float(LATENCY_BUCKETS_MS[-1])
+
+    def summary(self) -> dict:
+        result = {'count': self.count, 'sum_ms': self.total}
+        for q in QUANTILES:
+            value = self.quantile(q)
+            result[f"p{int(q * 100)}_ms"] = round(value, 1) if value is not None else None
+        return result
+
+
+class SeriesStats:
+    """Aggregates for one label set"""
+
+    __slots__ = ('requests', 'latency', 'ttfb', 'tokens', 'cost')
+
+    def __init__(self):
+        self.requests = 0
+        self.latency = Histogram()
+        self.ttfb = Histogram()
+        self.tokens = dict.fromkeys(TOKEN_TYPES, 0)
+        self.cost = 0.0
+
+    def record(self, latency_ms, ttfb_ms, cost, tokens: dict):
+        self.requests += 1
+        self.latency.observe(latency_ms)
+        if ttfb_ms is not None:
+            self.ttfb.observe(ttfb_ms)
+        for token_type, count in tokens.items():
+            self.tokens[token_type] += count
+        self.cost += cost
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'latency': self.latency.summary(),
+            'ttfb': self.ttfb.summary(),
+            'tokens': dict(self.tokens),
+            'cost': round(self.cost, 6)
+        }
+
+
+class ProxyMetrics:
+    """Thread-safe request aggregates by (model, status) and by session
+
+    Sessions are kept in an LRU capped at max_sessions so a long-running
+    proxy does not grow without bound; they are only exposed as JSON since
+    per-session Prometheus labels would explode series cardinality.
+    """
+
+    def __init__(self, max_sessions: int = 1000):
+        self.max_sessions = max_sessions
+        self.started_at = time.time()
+        self.evicted_sessions = 0
+
+        self._lock = threading.Lock()
+        self._series = {}               # (model, status) -> SeriesStats
+        self._sessions = OrderedDict()  # session_id -> SeriesStats
+
+    def record(self, session_id: str, model: str, status: int, latency_ms: int,
+               prompt_tokens: int = 0, completion_tokens: int = 0, reasoning_tokens: int = 0,
+               cost: float = 0.0, ttfb_ms: int = None,
+               cache_creation_tokens: int = 0, cache_read_tokens: int = 0):
+        """Account for one finished request"""
+        values = (latency_ms, ttfb_ms, cost, {
+            'prompt': prompt_tokens,
+            'completion': completion_tokens,
+            'reasoning': reasoning_tokens,
+            'cache_creation': cache_creation_tokens,
+            'cache_read': cache_read_tokens
+        })
+        with self._lock:
+            series = self._series.get((model, status))
+            if series is None:
+                series = self._series[(model, status)] = SeriesStats()
+            series.record(*values)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = SeriesStats()
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_sessions += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.record(*values)
+
+    def snapshot(self, extra: dict = None) -> dict:
+        """JSON-serializable view of all aggregates"""
+        with self._lock:
+            series = [
+                {'model': model, 'status': status, **stats.to_dict()}
+                for (model, status), stats in sorted(self._series.items(), key=lambda item: item[0])
+            ]
+            sessions = {session_id: stats.to_dict() for session_id, stats in self._sessions.items()}
+            totals = SeriesStats()
+            for stats in self._series.values():
+                totals.requests += stats.requests
+                totals.latency.merge(stats.latency)
+                totals.ttfb.merge(stats.ttfb)
+                for token_type in TOKEN_TYPES:
+                    totals.tokens[token_type] += stats.tokens[token_type]
+                totals.cost += stats.cost
+
+        result = {
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'totals': totals.to_dict(),
+            'series': series,
+            'sessions': sessions,
+            'evicted_sessions': self.evicted_sessions
+        }
+        if extra:
+            result.update(extra)
+        return result
+
+    def render_prometheus(self, gauges: dict = None) -> str:
+        """Render aggregates in the Prometheus text exposition format.
+
+        gauges maps extra metric names (without prefix) to numeric values,
+        e.g. cache or log writer counters owned by other components.
+        """
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda item: item[0])
+            # Copy so rendering happens outside the lock
+            items = [
+                (labels, stats.to_dict(), {'latency': list(stats.latency.counts), 'ttfb': list(stats.ttfb.counts)})
+                for labels, stats in items
+            ]
+
+        lines = [
+            f"# HELP {PREFIX}_uptime_seconds Seconds since the proxy started",
+            f"# TYPE {PREFIX}_uptime_seconds gauge",
+            f"{PREFIX}_uptime_seconds {time.time() - self.started_at:.1f}",
+            f"# HELP {PREFIX}_requests_total Requests handled, by model and status",
+            f"# TYPE {PREFIX}_requests_total counter"
+        ]
+        for (model, status), stats, _ in items:
+            lines.append(f'{PREFIX}_requests_total{{{_labels(model, status)}}} {stats["requests"]}')
+
+        for name, key, help_text in (
+            ('request_latency_ms', 'latency', 'End-to-end request latency in milliseconds'),
+            ('ttfb_ms', 'ttfb', 'Time until the first upstream response byte in milliseconds'),
+        ):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} histogram")
+            for (model, status), stats, histograms in items:
+                counts = histograms[key]
+                labels = _labels(model, status)
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS_MS + ('+Inf',), counts):
+                    cumulative += n
+                    lines.append(f'{PREFIX}_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_{name}_sum{{{labels}}} {stats[key]["sum_ms"]}')
+                lines.append(f'{PREFIX}_{name}_count{{{labels}}} {stats[key]["count"]}')
+
+        lines.append(f"# HELP {PREFIX}_tokens_total Tokens processed, by model, status and type")
+        lines.append(f"# TYPE {PREFIX}_tokens_total counter")
+        for (model, status), stats, _ in items:
+            for token_type in TOKEN_TYPES:
+                lines.append(
+                    f'{PREFIX}_tokens_total{{{_labels(model, status)},type="{token_type}"}} '
+                    f'{stats["tokens"][token_type]}'
+                )
+
+        lines.append(f"# HELP {PREFIX}_cost_dollars_total Estimated API cost in dollars")
+        lines.append(f"# TYPE {PREFIX}_cost_dollars_total counter")
+        for (model, status), stats, _ in items:
+            lines.append(f'{PREFIX}_cost_dollars_total{{{_labels(model, status)}}} {stats["cost"]}')
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(model: str, status: int) -> str:
+    model = model.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'model="{model}",status="{status}"'
@@ -0,0 +1,298 @@
+"""
+Pre-flight input token estimation for the Delobotomize proxy.
+
+A conversation that has outgrown the model's context window is rejected by
+the API with a 400 "prompt is too long", but only after the proxy has sent
+it several megabytes of body and waited for the answer, and a client that
+retries pays that round trip again each time. The proxy instead estimates a
+request's input tokens locally and answers an estimate clearly over the
+model's limit with the same 400 itself.
+
+The estimate counts the characters of what the model reads (system prompt,
+message text, tool calls and results, tool definitions) at CHARS_PER_TOKEN,
+plus fixed costs per image, content block and message. Thinking blocks from
+earlier turns (the API drops most of them) and base64 documents are not
+counted, so the estimate errs low rather than high.
+
+Claude Code resends the whole conversation every turn, so estimates are
+cached. The system prompt and tools are cached by the digest of their bytes.
+Messages are cached per conversation as a prefix: for the previous request
+of a conversation (its X-Session-ID plus the opening bytes of its messages)
+the proxy keeps each message's end offset, digest and running total. A new
+request re-hashes its messages in order against that list and only decodes
+the messages after the first one that differs.
+
+Each successful response reports the real input tokens. The ratio of real to
+estimated tokens is averaged per model into a calibration factor applied to
+later estimates, and the estimate is written to proxy.log (estimated_tokens)
+so the estimator can be tuned offline against usage.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from jsonscan import ScanLimit, array_items, top_level_spans
+
+CHARS_PER_TOKEN = 3.5
+IMAGE_TOKENS = 1600       # images are scaled to about 1.15 megapixels, ~1600 tokens
+BLOCK_TOKENS = 3
+MESSAGE_TOKENS = 4
+TOOLS_TOKENS = 350        # tool-use instructions the API adds when tools are present
+
+# Context windows by model-name prefix; the longest matching prefix wins
+MODEL_LIMITS = {
+    'claude-instant': 100000,
+    'claude-2.0': 100000,
+    'claude-2.1': 200000,
+    'claude-3': 200000,
+    'claude-haiku-4': 200000,
+    'claude-sonnet-4': 200000,
+    'claude-opus-4': 200000
+}
+
+# Weight of the newest real/estimated ratio in a model's calibration factor
+CALIBRATION_ALPHA = 0.2
+CALIBRATION_RANGE = (0.5, 2.0)
+# Fixed overheads dominate small prompts; only larger ones calibrate
+MIN_CALIBRATION_TOKENS = 1024
+# Below this many samples a model's estimates need a wider margin to reject
+MIN_SAMPLES = 5
+UNCALIBRATED_MARGIN = 0.25
+
+MAX_CONVERSATIONS = 1024
+# Opening bytes of the messages array that identify a conversation
+PREFIX_KEY_BYTES = 1024
+MAX_CACHED_PARTS = 256
+
+
+class Estimate:
+    """Estimated input tokens of one request"""
+
+    __slots__ = ('raw', 'tokens', 'limit', 'over')
+
+    def __init__(self, raw: float, tokens: int, limit: int, over: bool):
+        self.raw = raw          # before calibration
+        self.tokens = tokens
+        self.limit = limit
+        self.over = over        # clearly over the limit; reject
+
+
+class MessagePrefix:
+    """Per-message offsets, digests and running totals of a conversation's last request"""
+
+    __slots__ = ('ends', 'digests', 'totals')
+
+    def __init__(self):
+        self.ends = []      # end of each message, relative to the array's opening bracket
+        self.digests = []   # digest of the bytes since the previous end
+        self.totals = []    # tokens up to and including the message
+
+
+def parse_limits(text: str) -> dict:
+    """Parse "prefix=tokens,prefix=tokens" context-limit overrides"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        prefix, _, tokens = item.partition('=')
+        limits[prefix.strip()] = int(tokens)
+    return limits
+
+
+def content_tokens(content) -> float:
+    """Estimated tokens of a message's content (a string or a list of blocks)"""
+    if isinstance(content, str):
+        return len(content) / CHARS_PER_TOKEN
+    if not isinstance(content, list):
+        return 0.0
+
+    tokens = 0.0
+    for block in content:
+        if not isinstance(block, dict):
+            continue
+        kind = block.get('type')
+        if kind == 'text':
+            chars = len(block.get('text') or '')
+        elif kind == 'tool_result':
+            tokens += content_tokens(block.get('content')) + BLOCK_TOKENS
+            continue
+        elif kind == 'tool_use':
+            arguments = json.dumps(block.get('input'), separators=(',', ':'), ensure_ascii=False)
+            chars = len(block.get('name') or '') + len(arguments)
+        elif kind == 'image':
+            tokens += IMAGE_TOKENS
+            continue
+        elif kind == 'document':
+            source = block.get('source') or {}
+            if source.get('type') == 'text':
+                chars = len(source.get('data') or '')
+            elif source.get('type') == 'content':
+                tokens += content_tokens(source.get('content')) + BLOCK_TOKENS
+                continue
+            else:
+                chars = 0  # base64 PDF: its token count depends on the rendered pages
+        elif kind in ('thinking', 'redacted_thinking'):
+            continue
+        else:
+            chars = len(json.dumps(block, separators=(',', ':'), ensure_ascii=False))
+        tokens += chars / CHARS_PER_TOKEN + BLOCK_TOKENS
+    return tokens
+
+
+def message_tokens(raw: bytes) -> float:
+    message = json.loads(raw)
+    content = message.get('content') if isinstance(message, dict) else None
+    return content_tokens(content) + MESSAGE_TOKENS
+
+
+class PreflightEstimator:
+    """Thread-safe input token estimates with per-model calibration"""
+
+    def __init__(self, default_limit: int = 200000, limits: dict = None, margin: float = 0.1,
+                 scale: float = 1.0, max_conversations: int = MAX_CONVERSATIONS):
+        self.limits = {**MODEL_LIMITS, **(limits or {})}
+        self.default_limit = default_limit
+        self.margin = margin
+        self.scale = scale
+        self.max_conversations = max_conversations
+        self.estimated = 0
+        self.rejected = 0
+        self.failed = 0
+        self.messages_reused = 0
+        self.messages_decoded = 0
+        self.samples = 0
+        self.mean_error = 0.0       # moving average of (estimated - real) / real
+        self.mean_abs_error = 0.0
+
+        self._lock = threading.Lock()
+        self._prefixes = OrderedDict()  # conversation key -> MessagePrefix, least recently used first
+        self._parts = OrderedDict()     # digest of a system prompt or tool list -> tokens
+        self._models = {}               # model -> (calibration factor, samples)
+
+    def limit_for(self, model: str) -> int:
+        matches = [prefix for prefix in self.limits if model.startswith(prefix)]
+        return self.limits[max(matches, key=len)] if matches else self.default_limit
+
+    def estimate(self, body: bytes, model: str, session_id: str = None):
+        """Estimate a request body's input tokens; None when it cannot be scanned"""
+        try:
+            spans = top_level_spans(body, ('system', 'tools', 'messages'))
+            raw = self._part_tokens(body, spans.get('system'), self._system_tokens)
+            raw += self._part_tokens(body, spans.get('tools'), self._tools_tokens)
+            if 'messages' in spans:
+                raw += self._messages_tokens(body, spans['messages'][0], session_id)
+        except (ScanLimit, ValueError, TypeError, AttributeError, IndexError):
+            self.failed += 1
+            return None
+
+        with self._lock:
+            factor, samples = self._models.get(model, (self.scale, 0))
+        tokens = int(raw * factor)
+        limit = self.limit_for(model)
+        margin = self.margin if samples >= MIN_SAMPLES else max(self.margin, UNCALIBRATED_MARGIN)
+        over = tokens > limit * (1 + margin)
+        self.estimated += 1
+        if over:
+            self.rejected += 1
+        return Estimate(raw, tokens, limit, over)
+
+    def observe(self, model: str, estimate: Estimate, actual: int):
+        """Calibrate the model's factor against the real input tokens of a response"""
+        if actual < MIN_CALIBRATION_TOKENS or estimate.raw <= 0:
+            return
+        low, high = CALIBRATION_RANGE
+        error = (estimate.tokens - actual) / actual
+        with self._lock:
+            factor, samples = self._models.get(model, (self.scale, 0))
+            ratio = min(high, max(low, actual / estimate.raw))
+            # Plain average until the moving average has enough history
+            alpha = max(CALIBRATION_ALPHA, 1 / (samples + 1))
+            self._models[model] = (factor + alpha * (ratio - factor), samples + 1)
+            alpha = max(CALIBRATION_ALPHA, 1 / (self.samples + 1))
+            self.mean_error += alpha * (error - self.mean_error)
+            self.mean_abs_error += alpha * (abs(error) - self.mean_abs_error)
+            self.samples += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = {model: {'factor': round(factor, 4), 'samples': samples}
+                      for model, (factor, samples) in self._models.items()}
+        return {
+            'estimated': self.estimated,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'messages_reused': self.messages_reused,
+            'messages_decoded': self.messages_decoded,
+            'samples': self.samples,
+            'mean_error_pct': round(self.mean_error * 100, 2),
+            'mean_abs_error_pct': round(self.mean_abs_error * 100, 2),
+            'models': models
+        }
+
+    @staticmethod
+    def _system_tokens(raw: bytes) -> float:
+        return content_tokens(json.loads(raw))
+
+    @staticmethod
+    def _tools_tokens(raw: bytes) -> float:
+        # Tool definitions are read as the JSON schema text they are
+        return len(raw) / CHARS_PER_TOKEN + TOOLS_TOKENS if raw.strip() != b'[]' else 0.0
+
+    def _part_tokens(self, body: bytes, span, estimate) -> float:
+        """Tokens of the system prompt or tool list, cached by digest"""
+        if span is None:
+            return 0.0
+        raw = body[span[0]:span[1]]
+        digest = hashlib.sha256(raw).digest()
+        with self._lock:
+            tokens = self._parts.get(digest)
+            if tokens is not None:
+                self._parts.move_to_end(digest)
+                return tokens
+        tokens = estimate(raw)
+        with self._lock:
+            self._parts[digest] = tokens
+            if len(self._parts) > MAX_CACHED_PARTS:
+                self._parts.popitem(last=False)
+        return tokens
+
+    def _messages_tokens(self, body: bytes, start: int, session_id: str) -> float:
+        """Tokens of the messages array opening at start, reusing an earlier
+        request of the same conversation for its unchanged leading messages"""
+        view = memoryview(body)
+        # A conversation is its session plus its opening bytes, which tells
+        # apart subagents sharing a session
+        key = hashlib.sha256()
+        key.update((session_id or '').encode('utf-8'))
+        key.update(view[start:start + PREFIX_KEY_BYTES])
+        key = key.digest()
+        with self._lock:
+            previous = self._prefixes.get(key)
+
+        prefix = MessagePrefix()
+        total = 0.0
+        last = 1  # just past the opening bracket
+        if previous is not None:
+            for end, digest, tokens in zip(previous.ends, previous.digests, previous.totals):
+                if start + end > len(body) or hashlib.sha256(view[start + last:start + end]).digest() != digest:
+                    break
+                prefix.ends.append(end)
+                prefix.digests.append(digest)
+                prefix.totals.append(tokens)
+                last, total = end, tokens
+            self.messages_reused += len(prefix.ends)
+
+        for item_start, item_end in array_items(body, start + last):
+            total += message_tokens(body[item_start:item_end])
+            prefix.ends.append(item_end - start)
+            prefix.digests.append(hashlib.sha256(view[start + last:item_end]).digest())
+            prefix.totals.append(total)
+            last = item_end - start
+            self.messages_decoded += 1
+
+        with self._lock:
+            self._prefixes[key] = prefix
+            self._prefixes.move_to_end(key)
+            if len(self._prefixes) > self.max_conversations:
+                self._prefixes.popitem(last=False)
+        return total
@@ -0,0 +1,111 @@
+"""
+Prompt-cache breakpoint injection for the Delobotomize proxy.
+
+Claude Code resends the same system prompt, tool definitions and growing
+message history on every turn. When the client has not placed any
+cache_control breakpoints itself, this module adds ephemeral breakpoints to
+the stable prefix of a request so the API can serve it from the prompt cache:
+
+    1. the last tool definition       (caches all tools)
+    2. the last system block          (caches tools + system)
+    3. the previous user turn         (reads the history cached last turn)
+    4. the last block of the request  (writes the history for the next turn)
+
+The API allows at most four breakpoints, and prefixes shorter than its
+minimum cacheable length are simply not cached, so short requests are left
+untouched. Thinking blocks cannot carry cache_control and are skipped.
+"""
+
+import json
+
+MAX_BREAKPOINTS = 4
+# Smallest prompt (estimated tokens) worth marking; the API minimum is 1024-2048
+MIN_PROMPT_TOKENS = 1024
+# Rough bytes-per-token ratio of a JSON request body
+BYTES_PER_TOKEN = 4
+
+_EPHEMERAL = {'type': 'ephemeral'}
+_UNCACHEABLE_BLOCKS = ('thinking', 'redacted_thinking')
+
+
+def has_breakpoints(value) -> bool:
+    """Whether any cache_control is already present in a request fragment"""
+    if isinstance(value, dict):
+        return 'cache_control' in value or any(has_breakpoints(v) for v in value.values())
+    if isinstance(value, list):
+        return any(has_breakpoints(v) for v in value)
+    return False
+
+
+def _as_blocks(content) -> list:
+    """Content as a list of blocks (string shorthand becomes one text block)"""
+    if isinstance(content, str):
+        return [{'type': 'text', 'text': content}] if content else []
+    return content if isinstance(content, list) else []
+
+
+def _mark_last_block(blocks: list) -> bool:
+    """Put a breakpoint on the last block that can carry one"""
+    for block in reversed(blocks):
+        if not isinstance(block, dict) or block.get('type') in _UNCACHEABLE_BLOCKS:
+            continue
+        if block.get('type') == 'text' and not block.get('text'):
+            continue
+        block['cache_control'] = dict(_EPHEMERAL)
+        return True
+    return False
+
+
+def _mark_message(message: dict) -> bool:
+    blocks = _as_blocks(message.get('content'))
+    if _mark_last_block(blocks):
+        message['content'] = blocks
+        return True
+    return False
+
+
+def inject_breakpoints(request_data: dict, body_size: int) -> int:
+    """Add cache_control breakpoints to a request in place.
+
+    Returns the number of breakpoints added; 0 when the client already
+    manages caching or the prompt is too small to benefit.
+    """
+    if body_size // BYTES_PER_TOKEN < MIN_PROMPT_TOKENS:
+        return 0
+    if has_breakpoints(request_data.get('tools')) or has_breakpoints(request_data.get('system')) \
+            or has_breakpoints(request_data.get('messages')):
+        return 0
+
+    added = 0
+
+    tools = request_data.get('tools')
+    if isinstance(tools, list) and tools and isinstance(tools[-1], dict):
+        tools[-1]['cache_control'] = dict(_EPHEMERAL)
+        added += 1
+
+    system = request_data.get('system')
+    if system:
+        blocks = _as_blocks(system)
+        if _mark_last_block(blocks):
+            request_data['system'] = blocks
+            added += 1
+
+    messages = request_data.get('messages')
+    if isinstance(messages, list) and messages:
+        # Previous user turn first, so the final breakpoint is never dropped
+        # for lack of room
+        user_turns = [
+            i for i, message in enumerate(messages[:-1])
+            if isinstance(message, dict) and message.get('role') == 'user'
+        ]
+        if user_turns and added < MAX_BREAKPOINTS - 1 and _mark_message(messages[user_turns[-1]]):
+            added += 1
+        if added < MAX_BREAKPOINTS and isinstance(messages[-1], dict) and _mark_message(messages[-1]):
+            added += 1
+
+    return added
+
+
+def encode(request_data: dict) -> bytes:
+    """Re-encode a modified request body compactly"""
+    return json.dumps(request_data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
@@ -0,0 +1,242 @@
+"""
+Client-side rate limiting for the Delobotomize proxy.
+
+Several Claude Code sessions sharing one API key can exceed its rate limit
+together; when each of them then retries on its own schedule the 429s keep
+coming. The proxy instead paces requests through token buckets kept per
+(API key, model): one for requests per minute and one for estimated input
+tokens per minute.
+
+Limits can be configured, but are mostly learned: every upstream response's
+anthropic-ratelimit-* headers update the bucket size and remaining balance,
+and a 429/529 with Retry-After blocks the bucket until that time. A request
+that would exceed a bucket waits for it to refill, up to max_wait seconds and
+max_queued waiting requests; beyond that it is rejected locally.
+
+Waits are reservations: the bucket balance is debited before sleeping and
+may go negative, so waiting requests are released in arrival order instead
+of racing each other when the bucket refills.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+# Upstream statuses that mean "slow down"
+THROTTLE_STATUSES = (429, 529)
+# Back-off used when a throttling response carries no Retry-After
+DEFAULT_BACKOFF_S = 5.0
+# Rough bytes-per-token ratio of a JSON request body
+BYTES_PER_TOKEN = 4
+
+
+class RateLimited(Exception):
+    """Raised when a request cannot be admitted within the wait budget"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited locally, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Cheap estimate of a request's input tokens from its body size"""
+    return len(body) // BYTES_PER_TOKEN
+
+
+class TokenBucket:
+    """Bucket refilled continuously up to a per-minute capacity
+
+    A capacity of 0 means unlimited until a limit is configured or learned.
+    """
+
+    def __init__(self, per_minute: int = 0):
+        self.configured = per_minute
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def learn(self, per_minute: int):
+        """Adopt the upstream limit, never exceeding a configured one"""
+        capacity = min(per_minute, self.configured) if self.configured else per_minute
+        if capacity != self.capacity:
+            self.level = min(self.level, capacity) if self.capacity else float(capacity)
+            self.capacity = capacity
+
+    def sync(self, remaining: int, now: float):
+        """Align the balance with what upstream reports as remaining"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the bucket is let through once it is full
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit * 60 / self.capacity)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+
+class _Limits:
+    __slots__ = ('requests', 'tokens', 'blocked_until')
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """Per (API key, model) request and token buckets with bounded queueing"""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 max_wait: float = 30, max_queued: int = 64):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.upstream_throttled = 0
+        self.wait_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._limits = {}  # (key fingerprint, model) -> _Limits
+        self._queued = 0
+
+    def acquire(self, api_key: str, model: str, tokens: int) -> float:
+        """Admit a request, sleeping while its buckets refill.
+
+        Returns the seconds waited; raises RateLimited if the wait would
+        exceed max_wait or too many requests are already waiting.
+        """
+        with self._lock:
+            limits = self._get(api_key, model)
+            now = time.monotonic()
+            wait = max(
+                limits.blocked_until - now,
+                limits.requests.wait_time(1, now),
+                limits.tokens.wait_time(tokens, now)
+            )
+            if wait > self.max_wait or (wait > 0 and self._queued >= self.max_queued):
+                self.rejected += 1
+                raise RateLimited(wait)
+
+            limits.requests.take(1)
+            limits.tokens.take(tokens)
+            self.admitted += 1
+            if wait <= 0:
+                return 0.0
+            self._queued += 1
+            self.delayed += 1
+            self.wait_seconds += wait
+
+        try:
+            time.sleep(wait)
+        finally:
+            with self._lock:
+                self._queued -= 1
+        return wait
+
+    def update(self, api_key: str, model: str, status: int, headers):
+        """Adapt the buckets to an upstream response's rate-limit headers"""
+        now = time.monotonic()
+        with self._lock:
+            limits = self._get(api_key, model)
+
+            if status in THROTTLE_STATUSES:
+                self.upstream_throttled += 1
+                retry_after = _parse_retry_after(headers.get('retry-after'))
+                delay = retry_after if retry_after is not None else DEFAULT_BACKOFF_S
+                limits.blocked_until = max(limits.blocked_until, now + delay)
+
+            # Input-token limits are what the estimate measures; fall back to
+            # the combined token limit for accounts that only report that.
+            token_kind = 'input-tokens' if headers.get('anthropic-ratelimit-input-tokens-limit') else 'tokens'
+            for kind, bucket in (('requests', limits.requests), (token_kind, limits.tokens)):
+                limit = _parse_int(headers.get(f'anthropic-ratelimit-{kind}-limit'))
+                remaining = _parse_int(headers.get(f'anthropic-ratelimit-{kind}-remaining'))
+                if limit:
+                    bucket.learn(limit)
+                if remaining is not None:
+                    bucket.sync(remaining, now)
+                    if remaining == 0:
+                        reset = _seconds_until(headers.get(f'anthropic-ratelimit-{kind}-reset'))
+                        if reset:
+                            limits.blocked_until = max(limits.blocked_until, now + reset)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'admitted': self.admitted,
+                'delayed': self.delayed,
+                'rejected': self.rejected,
+                'upstream_throttled': self.upstream_throttled,
+                'wait_seconds': round(self.wait_seconds, 3),
+                'queued': self._queued,
+                'buckets': [
+                    {
+                        'key': key,
+                        'model': model,
+                        'requests_per_minute': limits.requests.capacity,
+                        'tokens_per_minute': limits.tokens.capacity,
+                        'blocked_for_s': round(max(0.0, limits.blocked_until - now), 3)
+                    }
+                    for (key, model), limits in self._limits.items()
+                ]
+            }
+
+    def _get(self, api_key: str, model: str) -> _Limits:
+        # Keys are held as short fingerprints so they never appear in stats
+        fingerprint = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+        limits = self._limits.get((fingerprint, model))
+        if limits is None:
+            limits = self._limits[(fingerprint, model)] = _Limits(
+                self.requests_per_minute, self.tokens_per_minute
+            )
+        return limits
+
+
+def _parse_int(value):
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_retry_after(value):
+    """Retry-After as seconds; accepts delta-seconds or an HTTP date"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _seconds_until(value):
+    """Seconds until an RFC 3339 reset timestamp, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() - time.time())
+    except ValueError:
+        return None
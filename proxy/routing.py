@@ -0,0 +1,320 @@
+"""
+Latency-aware routing across several upstreams for the Delobotomize proxy.
+
+With a single ANTHROPIC_BASE_URL, a slow or degraded endpoint sets every
+session's latency. The proxy can instead be given a list of upstreams (the
+API and regional gateways in front of it) and sends each request to the one
+that currently looks best.
+
+Each upstream keeps moving averages of its latency (time until response
+headers) and error rate (5xx responses and connection errors), plus a count
+of requests in flight. A request goes to the upstream with the lowest cost:
+
+    latency * (1 + ERROR_WEIGHT * error_rate) * (in_flight + 1)
+
+An upstream that has not been sampled yet is assumed to be as fast as the
+fastest one, so it gets tried. An upstream that has gone EXPLORE_INTERVAL_S
+without a request is sent the next one, so a slow upstream that recovered is
+noticed at the cost of one request now and then rather than a share of
+traffic.
+
+Health is checked passively and actively:
+
+    passive  eject_after consecutive failed requests eject an upstream for
+             eject_s, doubling on each repeated ejection (up to MAX_EJECT_S)
+    active   a background thread probes GET health_path on every upstream
+             each health_interval seconds; PROBE_FAILURES failed probes in a
+             row eject it too, and an ejected upstream is only re-admitted
+             once its ejection has run out and a probe succeeds
+
+A re-admitted upstream is ramped up instead of taking its full share at
+once: its cost is divided by the fraction of readmit_s elapsed since
+re-admission. If every upstream is ejected, the one due back first is used
+anyway rather than failing the request.
+
+A connection refused or reset before any response is retried once on the
+next best upstream; timeouts and error responses are passed back as they
+are.
+"""
+
+import http.client
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from upstream import PoolTimeout, UpstreamPool
+
+logger = logging.getLogger(__name__)
+
+LATENCY_ALPHA = 0.2
+ERROR_ALPHA = 0.1
+ERROR_WEIGHT = 10.0
+EXPLORE_INTERVAL_S = 5.0
+PROBE_FAILURES = 2
+PROBE_TIMEOUT_S = 5.0
+MAX_EJECT_S = 600.0
+# Smallest share of its cost a re-admitted upstream starts with
+MIN_RAMP = 0.05
+
+# Errors that mean the request never reached the upstream
+FAILOVER_ERRORS = (ConnectionRefusedError, ConnectionResetError, ConnectionAbortedError,
+                   http.client.RemoteDisconnected)
+
+
+def parse_upstreams(text: str) -> list:
+    """Parse "[name=]url,[name=]url" into (name, url) pairs; names default to host:port"""
+    upstreams = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, sep, url = item.partition('=')
+        if not sep or '://' in name:
+            name, url = '', item
+        upstreams.append((name.strip() or urlparse(url.strip()).netloc, url.strip()))
+    return upstreams
+
+
+class Upstream:
+    """One upstream base URL, its connection pool and health"""
+
+    def __init__(self, name: str, pool: UpstreamPool, readmit_s: float):
+        self.name = name
+        self.pool = pool
+        self.readmit_s = readmit_s
+        self.latency = None         # moving average, ms
+        self.error_rate = 0.0       # moving average of failed requests
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_sampled = 0.0
+        self.ejected_until = 0.0    # monotonic; 0 when admitted
+        self.ejections = 0          # in a row, for the back-off
+        self.total_ejections = 0
+        self.readmitted_at = 0.0
+        self.probe_ok = True
+        self.probe_failures = 0
+
+    def state(self, now: float) -> str:
+        if self.ejected_until:
+            return 'ejected'
+        return 'ramping' if self.readmitted_at and self.ramp(now) < 1 else 'healthy'
+
+    def ramp(self, now: float) -> float:
+        """Share of its traffic a re-admitted upstream is back up to"""
+        if not self.readmitted_at or self.readmit_s <= 0:
+            return 1.0
+        return min(1.0, max(MIN_RAMP, (now - self.readmitted_at) / self.readmit_s))
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            'name': self.name,
+            'url': self.pool.base_url,
+            'state': self.state(now),
+            'latency_ms': round(self.latency, 1) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 4),
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejections': self.total_ejections,
+            'ejected_for_s': round(max(0.0, self.ejected_until - now), 1) if self.ejected_until else None,
+            'ramp': round(self.ramp(now), 2)
+        }
+
+
+class UpstreamRouter:
+    """Routes requests across upstreams by latency and error rate"""
+
+    def __init__(self, upstreams: list, pool_size: int = 16, timeout: float = 120,
+                 health_path: str = '/v1/models', health_interval: float = 10.0, health_headers: dict = None,
+                 eject_after: int = 3, eject_s: float = 30.0, readmit_s: float = 60.0):
+        self.upstreams = [Upstream(name, UpstreamPool(url, size=pool_size, timeout=timeout), readmit_s)
+                          for name, url in upstreams]
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.health_headers = health_headers or {}
+        self.eject_after = eject_after
+        self.eject_s = eject_s
+        self.readmit_s = readmit_s
+        self.failovers = 0
+        self.probes_failed = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def choose(self, exclude=()) -> Upstream:
+        """Pick the upstream for the next request and count it in flight"""
+        now = time.monotonic()
+        with self._lock:
+            self._readmit_due(now)
+            candidates = [u for u in self.upstreams if u not in exclude and not u.ejected_until]
+            if not candidates:
+                # Everything is ejected: use whichever is due back first
+                candidates = [min((u for u in self.upstreams if u not in exclude),
+                                  key=lambda u: u.ejected_until, default=None)]
+                if candidates[0] is None:
+                    raise RuntimeError('No upstream left to try')
+
+            stale = min(candidates, key=lambda u: u.last_sampled)
+            if len(candidates) > 1 and now - stale.last_sampled > EXPLORE_INTERVAL_S and not stale.in_flight:
+                chosen = stale
+                # Only the one request explores until it is back
+                chosen.last_sampled = now
+            else:
+                known = [u.latency for u in self.upstreams if u.latency is not None]
+                fastest = min(known) if known else 1.0
+                chosen = min(candidates, key=lambda u: (
+                    (u.latency if u.latency is not None else fastest)
+                    * (1 + ERROR_WEIGHT * u.error_rate) * (u.in_flight + 1) / u.ramp(now)
+                ))
+            chosen.in_flight += 1
+            chosen.requests += 1
+        return chosen
+
+    def request(self, method: str, path: str, body: bytes, headers: dict):
+        """Send a request to the best upstream; the response's `upstream`
+        names where it went"""
+        tried = []
+        while True:
+            upstream = self.choose(exclude=tried)
+            started = time.monotonic()
+            try:
+                response = upstream.pool.request(method, path, body, headers)
+            except FAILOVER_ERRORS as e:
+                self._finish(upstream, None, failed=True)
+                tried.append(upstream)
+                if len(tried) >= min(2, len(self.upstreams)):
+                    raise
+                with self._lock:
+                    self.failovers += 1
+                logger.warning(f"Upstream {upstream.name} failed ({e.__class__.__name__}); retrying elsewhere")
+                continue
+            except PoolTimeout:
+                # Our own connection limit, not the upstream's fault
+                self._release(upstream)
+                raise
+            except BaseException:
+                self._finish(upstream, None, failed=True)
+                raise
+
+            latency_ms = (time.monotonic() - started) * 1000
+            # 4xx are the client's or the key's problem, not the upstream's,
+            # and return too early to say anything about its latency
+            failed = response.status >= 500
+            self._finish(upstream, latency_ms if response.status < 400 else None, failed, hold=True)
+            response.upstream = upstream.name
+            response.on_close = lambda: self._release(upstream)
+            return response
+
+    def _finish(self, upstream: Upstream, latency_ms, failed: bool, hold: bool = False):
+        """Record a request's outcome; hold keeps it in flight until its
+        response is closed"""
+        now = time.monotonic()
+        with self._lock:
+            if not hold:
+                upstream.in_flight -= 1
+            upstream.last_sampled = now
+            if latency_ms is not None:
+                upstream.latency = latency_ms if upstream.latency is None else (
+                    upstream.latency + LATENCY_ALPHA * (latency_ms - upstream.latency))
+            upstream.error_rate += ERROR_ALPHA * (float(failed) - upstream.error_rate)
+            if not failed:
+                upstream.consecutive_failures = 0
+                if not upstream.ejected_until and upstream.ramp(now) >= 1:
+                    upstream.ejections = 0
+                return
+            upstream.failures += 1
+            upstream.consecutive_failures += 1
+            if upstream.consecutive_failures >= self.eject_after and not upstream.ejected_until:
+                self._eject(upstream, now, f"{upstream.consecutive_failures} failed requests in a row")
+
+    def _release(self, upstream: Upstream):
+        with self._lock:
+            upstream.in_flight -= 1
+
+    def _eject(self, upstream: Upstream, now: float, reason: str):
+        """Take an upstream out of rotation; call with the lock held"""
+        if len(self.upstreams) == 1:
+            return  # nowhere else to send requests
+        duration = min(MAX_EJECT_S, self.eject_s * 2 ** upstream.ejections)
+        upstream.ejected_until = now + duration
+        upstream.ejections += 1
+        upstream.total_ejections += 1
+        upstream.readmitted_at = 0.0
+        logger.warning(f"⚠ Upstream {upstream.name} ejected for {duration:.0f}s: {reason}")
+
+    def _readmit_due(self, now: float):
+        """Re-admit upstreams whose ejection ran out; call with the lock held"""
+        for upstream in self.upstreams:
+            if upstream.ejected_until and now >= upstream.ejected_until and upstream.probe_ok:
+                upstream.ejected_until = 0.0
+                upstream.readmitted_at = now
+                upstream.consecutive_failures = 0
+                # Start from a clean slate rather than the errors that ejected it
+                upstream.error_rate = 0.0
+                logger.info(f"Upstream {upstream.name} re-admitted, ramping up over {self.readmit_s:.0f}s")
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            upstreams = [upstream.to_dict(now) for upstream in self.upstreams]
+        return {'upstreams': upstreams, 'stats': self.stats()}
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        states = [upstream.state(now) for upstream in self.upstreams]
+        return {
+            'upstreams': len(self.upstreams),
+            'healthy': states.count('healthy'),
+            'ramping': states.count('ramping'),
+            'ejected': states.count('ejected'),
+            'ejections': sum(upstream.total_ejections for upstream in self.upstreams),
+            'failovers': self.failovers,
+            'probes_failed': self.probes_failed
+        }
+
+    def start(self):
+        """Start active health checks (only useful with more than one upstream)"""
+        if self._thread is None and self.health_interval > 0 and len(self.upstreams) > 1:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='proxy-health', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop health checks and close idle upstream connections"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(PROBE_TIMEOUT_S + 1)
+            self._thread = None
+        for upstream in self.upstreams:
+            upstream.pool.close()
+
+    def _run(self):
+        while not self._stop.wait(self.health_interval):
+            for upstream in self.upstreams:
+                ok = self._probe(upstream)
+                now = time.monotonic()
+                with self._lock:
+                    upstream.probe_ok = ok
+                    if ok:
+                        upstream.probe_failures = 0
+                        continue
+                    self.probes_failed += 1
+                    upstream.probe_failures += 1
+                    if upstream.probe_failures >= PROBE_FAILURES and not upstream.ejected_until:
+                        self._eject(upstream, now, f"{upstream.probe_failures} failed health checks")
+
+    def _probe(self, upstream: Upstream) -> bool:
+        """GET health_path on a fresh connection; any non-5xx answer is healthy"""
+        pool = upstream.pool
+        connection_class = http.client.HTTPSConnection if pool.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(pool.host, pool.port, timeout=PROBE_TIMEOUT_S)
+        try:
+            connection.request('GET', pool.base_path + self.health_path, headers=self.health_headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status < 500
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            connection.close()
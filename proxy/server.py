@@ -16,6 +16,54 @@ Environment Variables:
     PROXY_PORT           - Port to listen on (default: 8082)
     PROXY_LOG_PATH       - Path to log file (default: .delobotomize/proxy.log)
     ANTHROPIC_BASE_URL   - Anthropic API base URL (default: https://api.anthropic.com)
+    PROXY_WORKERS        - Max concurrently served client connections (default: 32)
+    PROXY_UPSTREAM_POOL_SIZE - Max persistent upstream connections (default: 16)
+    PROXY_UPSTREAM_TIMEOUT   - Upstream socket timeout in seconds (default: 120)
+    PROXY_KEEPALIVE_TIMEOUT  - Idle client keep-alive timeout in seconds (default: 30)
+    PROXY_LOG_FLUSH_MS       - Max time a log line waits before being written (default: 200)
+    PROXY_LOG_BATCH_SIZE     - Max log lines written per batch (default: 256)
+    PROXY_LOG_DURABILITY     - none | flush | fsync after each batch (default: flush)
+    PROXY_LOG_MAX_BYTES      - Rotate proxy.log after this many bytes, 0 = never (default: 64 MiB)
+    PROXY_LOG_MAX_AGE_S      - Rotate proxy.log after this many seconds, 0 = never (default: 0)
+    PROXY_LOG_COMPRESS       - Gzip rotated segments when set to 1 (default: 0)
+    PROXY_CACHE              - Cache temperature-0 responses when set to 1 (default: 0)
+    PROXY_CACHE_DIR          - On-disk cache directory (default: <log dir>/cache)
+    PROXY_CACHE_TTL_S        - Cache entry lifetime in seconds (default: 86400)
+    PROXY_CACHE_MAX_ENTRIES  - Max responses held in memory (default: 512)
+    PROXY_CACHE_MAX_BYTES    - Max on-disk cache size in bytes (default: 512 MiB)
+    PROXY_METRICS_MAX_SESSIONS - Sessions kept in /metrics.json (default: 1000)
+    PROXY_RATE_LIMIT         - Pace requests to upstream rate limits when set to 1 (default: 1)
+    PROXY_RATE_LIMIT_RPM     - Requests per minute per key and model, 0 = learn from upstream (default: 0)
+    PROXY_RATE_LIMIT_TPM     - Input tokens per minute per key and model, 0 = learn from upstream (default: 0)
+    PROXY_RATE_LIMIT_MAX_WAIT_S  - Longest a request is held before a local 429 (default: 30)
+    PROXY_RATE_LIMIT_MAX_QUEUED  - Max requests waiting for a rate limit at once (default: 64)
+    PROXY_RATE_LIMIT_RETRIES     - Times an upstream 429 is retried after Retry-After (default: 1)
+    PROXY_COALESCE           - Share one upstream call between identical concurrent requests (default: 1)
+    PROXY_PROCESSES          - Worker processes sharing the port; > 1 enables pre-fork mode (default: 1)
+    PROXY_PROMPT_CACHE       - Add prompt-cache breakpoints to requests without any when set to 1 (default: 0)
+    PROXY_SESSIONS           - Track context pressure per session at /sessions (default: 1)
+    PROXY_SESSION_IDLE_S     - Forget sessions idle for this many seconds (default: 1800)
+    PROXY_SESSION_MAX        - Max sessions tracked at once (default: 10000)
+    PROXY_CONTEXT_WINDOW     - Context window in tokens for saturation signals (default: 200000)
+    PROXY_REASONING_BUDGET   - Reasoning token budget for overflow signals (default: 10000)
+    PROXY_STALL_GAP_S        - Silence within a session reported as a stall (default: 300)
+    PROXY_SESSION_PUSH_URL   - Monitoring server that session signals are pushed to, empty = off (default: empty)
+    PROXY_PROJECT_ID         - Project id on pushed events (default: name of the working directory)
+    PROXY_ARCHIVE            - Archive deduplicated request/response bodies when set to 1 (default: 0)
+    PROXY_ARCHIVE_DIR        - Archive directory (default: <log dir>/archive)
+    PROXY_ARCHIVE_CODEC      - zlib | lzma | bz2 compression for archived chunks (default: zlib)
+    PROXY_ARCHIVE_MAX_QUEUED - Max requests waiting to be archived before new ones are skipped (default: 64)
+    PROXY_PREFLIGHT          - Estimate input tokens and reject requests over the context limit locally (default: 1)
+    PROXY_PREFLIGHT_MARGIN   - How far over the limit an estimate must be to reject, as a fraction (default: 0.1)
+    PROXY_PREFLIGHT_SCALE    - Initial calibration factor for token estimates (default: 1.0)
+    PROXY_CONTEXT_LIMITS     - Per-model context limits as prefix=tokens,... (default: built-in table,
+                               PROXY_CONTEXT_WINDOW for unknown models)
+    PROXY_UPSTREAMS          - Upstreams to route between as [name=]url,... (default: ANTHROPIC_BASE_URL)
+    PROXY_HEALTH_INTERVAL_S  - Seconds between active health checks of each upstream, 0 = off (default: 10)
+    PROXY_HEALTH_PATH        - Path probed with GET by health checks (default: /v1/models)
+    PROXY_EJECT_AFTER        - Consecutive failed requests that eject an upstream (default: 3)
+    PROXY_EJECT_S            - First ejection in seconds, doubling when repeated (default: 30)
+    PROXY_READMIT_S          - Seconds a re-admitted upstream takes to ramp back to full traffic (default: 60)
 """
 
 import os
@@ -23,18 +71,85 @@ import sys
 import time
 import json
 import logging
-from datetime import datetime
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
 import uuid
 
+from archive import BodyArchive
+from cache import ResponseCache, cache_key, is_cacheable
+from coalesce import SingleFlight, coalesce_key
+from jsonscan import response_usage, scan_fields
+from logstore import LogWriter, worker_log_path
+from metrics import ProxyMetrics
+from preflight import PreflightEstimator, parse_limits
+from promptcache import inject_breakpoints, encode as encode_request
+from ratelimit import RateLimiter, RateLimited, estimate_tokens
+from routing import UpstreamRouter, parse_upstreams
+from sessions import SessionTracker
+from supervisor import Supervisor, reuse_port_supported
+from upstream import PoolTimeout
+
 # Configuration
 PORT = int(os.getenv('PROXY_PORT', '8082'))
 LOG_PATH = os.getenv('PROXY_LOG_PATH', '.delobotomize/proxy.log')
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY', '')
 ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL', 'https://api.anthropic.com')
+WORKERS = int(os.getenv('PROXY_WORKERS', '32'))
+UPSTREAM_POOL_SIZE = int(os.getenv('PROXY_UPSTREAM_POOL_SIZE', '16'))
+UPSTREAM_TIMEOUT = float(os.getenv('PROXY_UPSTREAM_TIMEOUT', '120'))
+KEEPALIVE_TIMEOUT = float(os.getenv('PROXY_KEEPALIVE_TIMEOUT', '30'))
+LOG_FLUSH_MS = int(os.getenv('PROXY_LOG_FLUSH_MS', '200'))
+LOG_BATCH_SIZE = int(os.getenv('PROXY_LOG_BATCH_SIZE', '256'))
+LOG_DURABILITY = os.getenv('PROXY_LOG_DURABILITY', 'flush')
+LOG_MAX_BYTES = int(os.getenv('PROXY_LOG_MAX_BYTES', str(64 * 1024 * 1024)))
+LOG_MAX_AGE_S = float(os.getenv('PROXY_LOG_MAX_AGE_S', '0'))
+LOG_COMPRESS = os.getenv('PROXY_LOG_COMPRESS', '0') == '1'
+CACHE_ENABLED = os.getenv('PROXY_CACHE', '0') == '1'
+CACHE_DIR = os.getenv('PROXY_CACHE_DIR', os.path.join(os.path.dirname(LOG_PATH) or '.', 'cache'))
+CACHE_TTL_S = float(os.getenv('PROXY_CACHE_TTL_S', '86400'))
+CACHE_MAX_ENTRIES = int(os.getenv('PROXY_CACHE_MAX_ENTRIES', '512'))
+CACHE_MAX_BYTES = int(os.getenv('PROXY_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+METRICS_MAX_SESSIONS = int(os.getenv('PROXY_METRICS_MAX_SESSIONS', '1000'))
+RATE_LIMIT_ENABLED = os.getenv('PROXY_RATE_LIMIT', '1') == '1'
+RATE_LIMIT_RPM = int(os.getenv('PROXY_RATE_LIMIT_RPM', '0'))
+RATE_LIMIT_TPM = int(os.getenv('PROXY_RATE_LIMIT_TPM', '0'))
+RATE_LIMIT_MAX_WAIT_S = float(os.getenv('PROXY_RATE_LIMIT_MAX_WAIT_S', '30'))
+RATE_LIMIT_MAX_QUEUED = int(os.getenv('PROXY_RATE_LIMIT_MAX_QUEUED', '64'))
+RATE_LIMIT_RETRIES = int(os.getenv('PROXY_RATE_LIMIT_RETRIES', '1'))
+COALESCE_ENABLED = os.getenv('PROXY_COALESCE', '1') == '1'
+PROCESSES = int(os.getenv('PROXY_PROCESSES', '1'))
+PROMPT_CACHE_ENABLED = os.getenv('PROXY_PROMPT_CACHE', '0') == '1'
+SESSIONS_ENABLED = os.getenv('PROXY_SESSIONS', '1') == '1'
+SESSION_IDLE_S = float(os.getenv('PROXY_SESSION_IDLE_S', '1800'))
+SESSION_MAX = int(os.getenv('PROXY_SESSION_MAX', '10000'))
+CONTEXT_WINDOW = int(os.getenv('PROXY_CONTEXT_WINDOW', '200000'))
+REASONING_BUDGET = int(os.getenv('PROXY_REASONING_BUDGET', '10000'))
+STALL_GAP_S = float(os.getenv('PROXY_STALL_GAP_S', '300'))
+SESSION_PUSH_URL = os.getenv('PROXY_SESSION_PUSH_URL', '')
+PROJECT_ID = os.getenv('PROXY_PROJECT_ID', os.path.basename(os.getcwd()))
+ARCHIVE_ENABLED = os.getenv('PROXY_ARCHIVE', '0') == '1'
+ARCHIVE_DIR = os.getenv('PROXY_ARCHIVE_DIR', os.path.join(os.path.dirname(LOG_PATH) or '.', 'archive'))
+ARCHIVE_CODEC = os.getenv('PROXY_ARCHIVE_CODEC', 'zlib')
+ARCHIVE_MAX_QUEUED = int(os.getenv('PROXY_ARCHIVE_MAX_QUEUED', '64'))
+PREFLIGHT_ENABLED = os.getenv('PROXY_PREFLIGHT', '1') == '1'
+PREFLIGHT_MARGIN = float(os.getenv('PROXY_PREFLIGHT_MARGIN', '0.1'))
+PREFLIGHT_SCALE = float(os.getenv('PROXY_PREFLIGHT_SCALE', '1.0'))
+CONTEXT_LIMITS = parse_limits(os.getenv('PROXY_CONTEXT_LIMITS', ''))
+UPSTREAMS = parse_upstreams(os.getenv('PROXY_UPSTREAMS', '') or ANTHROPIC_BASE_URL)
+HEALTH_INTERVAL_S = float(os.getenv('PROXY_HEALTH_INTERVAL_S', '10'))
+HEALTH_PATH = os.getenv('PROXY_HEALTH_PATH', '/v1/models')
+EJECT_AFTER = int(os.getenv('PROXY_EJECT_AFTER', '3'))
+EJECT_S = float(os.getenv('PROXY_EJECT_S', '30'))
+READMIT_S = float(os.getenv('PROXY_READMIT_S', '60'))
+
+# Prompt-cache pricing relative to the base input price
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
 
 # Ensure log directory exists
 os.makedirs(os.path.dirname(LOG_PATH) if os.path.dirname(LOG_PATH) else '.', exist_ok=True)
@@ -46,10 +161,129 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Top-level request fields the proxy reads; the rest of the body is passed
+# upstream as raw bytes without being decoded
+REQUEST_FIELDS = ('model', 'stream', 'temperature')
+
+# Pools of persistent connections to each upstream, and the routing between
+# them (health checks started in serve)
+upstream_router = UpstreamRouter(
+    UPSTREAMS,
+    pool_size=UPSTREAM_POOL_SIZE,
+    timeout=UPSTREAM_TIMEOUT,
+    health_path=HEALTH_PATH,
+    health_interval=HEALTH_INTERVAL_S,
+    health_headers={'x-api-key': ANTHROPIC_API_KEY, 'anthropic-version': '2023-06-01'},
+    eject_after=EJECT_AFTER,
+    eject_s=EJECT_S,
+    readmit_s=READMIT_S
+)
+
+# Single background writer for proxy.log (started in main)
+log_writer = LogWriter(
+    LOG_PATH,
+    flush_interval=LOG_FLUSH_MS / 1000,
+    batch_size=LOG_BATCH_SIZE,
+    durability=LOG_DURABILITY,
+    max_bytes=LOG_MAX_BYTES,
+    max_age=LOG_MAX_AGE_S,
+    compress=LOG_COMPRESS
+)
+
+# Opt-in cache for deterministic (temperature 0) responses
+response_cache = ResponseCache(
+    CACHE_DIR,
+    ttl=CACHE_TTL_S,
+    max_entries=CACHE_MAX_ENTRIES,
+    max_bytes=CACHE_MAX_BYTES
+) if CACHE_ENABLED else None
+
+# Client-side pacing against upstream rate limits
+rate_limiter = RateLimiter(
+    requests_per_minute=RATE_LIMIT_RPM,
+    tokens_per_minute=RATE_LIMIT_TPM,
+    max_wait=RATE_LIMIT_MAX_WAIT_S,
+    max_queued=RATE_LIMIT_MAX_QUEUED
+) if RATE_LIMIT_ENABLED else None
+
+# Single-flight registry for identical concurrent requests
+coalescer = SingleFlight() if COALESCE_ENABLED else None
+
+# In-memory request aggregates served at /metrics
+metrics = ProxyMetrics(max_sessions=METRICS_MAX_SESSIONS)
+
+# Live per-session context pressure served at /sessions (started in serve)
+session_tracker = SessionTracker(
+    context_window=CONTEXT_WINDOW,
+    reasoning_budget=REASONING_BUDGET,
+    stall_gap=STALL_GAP_S,
+    idle_ttl=SESSION_IDLE_S,
+    max_sessions=SESSION_MAX,
+    push_url=SESSION_PUSH_URL,
+    project_id=PROJECT_ID
+) if SESSIONS_ENABLED else None
+
+# Opt-in archive of request/response bodies, linked to proxy.log by request_id
+body_archive = BodyArchive(
+    ARCHIVE_DIR,
+    codec=ARCHIVE_CODEC,
+    max_queue=ARCHIVE_MAX_QUEUED
+) if ARCHIVE_ENABLED else None
+
+# Local input token estimates, to reject over-context requests without a round trip
+preflight = PreflightEstimator(
+    default_limit=CONTEXT_WINDOW,
+    limits=CONTEXT_LIMITS,
+    margin=PREFLIGHT_MARGIN,
+    scale=PREFLIGHT_SCALE
+) if PREFLIGHT_ENABLED else None
+
+# Index of this pre-fork worker process (None when running single-process)
+worker_index = None
+
+
+class ProxyServer(ThreadingMixIn, HTTPServer):
+    """HTTP server that handles each client connection on a bounded worker pool"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers: int = WORKERS, reuse_port: bool = False):
+        # Pre-fork workers each bind the same port; the kernel balances between them
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='proxy-worker')
+
+    def server_bind(self):
+        # Set directly: socketserver only honours allow_reuse_port from Python 3.11
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 
 class ProxyHandler(BaseHTTPRequestHandler):
     """HTTP request handler that proxies to Anthropic API"""
 
+    # HTTP/1.1 keeps client connections alive between requests; idle
+    # connections are dropped after KEEPALIVE_TIMEOUT to free their worker.
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
+    # Raw body of the request being served, kept for the body archive
+    request_body = None
+    # Pre-flight token estimate of the request being served
+    estimate = None
+    # Name of the upstream the request being served was routed to
+    upstream = None
+
     # Suppress default logging
     def log_message(self, format, *args):
         pass
@@ -60,10 +294,82 @@ class ProxyHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, anthropic-version')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+    def do_GET(self):
+        """Handle GET requests for proxy status endpoints"""
+        url = urlsplit(self.path)
+        if url.path == '/cache/stats':
+            stats = response_cache.stats() if response_cache else {'enabled': False}
+            self.send_json(200, json.dumps(stats).encode('utf-8'))
+        elif url.path == '/metrics.json' or (
+                url.path == '/metrics' and parse_qs(url.query).get('format') == ['json']):
+            snapshot = metrics.snapshot({
+                'worker': worker_index,
+                'cache': response_cache.stats() if response_cache else None,
+                'rate_limit': rate_limiter.stats() if rate_limiter else None,
+                'coalesce': coalescer.stats() if coalescer else None,
+                'sessions': session_tracker.stats() if session_tracker else None,
+                'archive': body_archive.stats() if body_archive else None,
+                'preflight': preflight.stats() if preflight else None,
+                'upstreams': upstream_router.stats(),
+                'log_writer': {'written': log_writer.written, 'dropped': log_writer.dropped}
+            })
+            self.send_json(200, json.dumps(snapshot).encode('utf-8'))
+        elif url.path == '/metrics':
+            self.send_metrics()
+        elif url.path == '/upstreams':
+            snapshot = dict(upstream_router.snapshot(), worker=worker_index)
+            self.send_json(200, json.dumps(snapshot).encode('utf-8'))
+        elif url.path == '/sessions':
+            if session_tracker:
+                session_id = parse_qs(url.query).get('session_id', [None])[0]
+                snapshot = dict(session_tracker.snapshot(session_id), worker=worker_index)
+            else:
+                snapshot = {'enabled': False}
+            self.send_json(200, json.dumps(snapshot).encode('utf-8'))
+        else:
+            self.send_error(404, 'Not Found')
+
+    def send_metrics(self):
+        """Serve aggregates in Prometheus text format"""
+        gauges = {
+            'log_lines_written_total': log_writer.written,
+            'log_lines_dropped_total': log_writer.dropped
+        }
+        if response_cache:
+            for name, value in response_cache.stats().items():
+                gauges[f"cache_{name}"] = value
+        if rate_limiter:
+            for name, value in rate_limiter.stats().items():
+                if name != 'buckets':
+                    gauges[f"rate_limit_{name}"] = value
+        if coalescer:
+            for name, value in coalescer.stats().items():
+                gauges[f"coalesce_{name}"] = value
+        if session_tracker:
+            for name, value in session_tracker.stats().items():
+                gauges[f"sessions_{name}"] = value
+        if body_archive:
+            for name, value in body_archive.stats().items():
+                gauges[f"archive_{name}"] = value
+        if preflight:
+            for name, value in preflight.stats().items():
+                if name != 'models':
+                    gauges[f"preflight_{name}"] = value
+        for name, value in upstream_router.stats().items():
+            gauges[f"upstreams_{name}"] = value
+
+        body = metrics.render_prometheus(gauges).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_POST(self):
-        """Handle POST requests to /v1/messages"""
+        """Handle POST requests to /v1/messages and its sub-paths"""
         if self.path.startswith('/v1/messages'):
             self.proxy_request()
         else:
@@ -73,115 +379,497 @@ class ProxyHandler(BaseHTTPRequestHandler):
         """Proxy the request to Anthropic API and log it"""
         session_id = self.headers.get('X-Session-ID', str(uuid.uuid4()))
         start_time = time.time()
+        flight = None
 
         try:
-            # Read request body
+            # Read request body; it is forwarded upstream as-is, so only the
+            # few fields we need are scanned out instead of decoding it all
             content_length = int(self.headers.get('Content-Length', 0))
             body = self.rfile.read(content_length)
-            request_data = json.loads(body) if body else {}
+            request_data = scan_fields(body, REQUEST_FIELDS)
+            # Archived as the client sent it, before any breakpoints are added
+            self.request_body = body
+            self.estimate = None
+            self.upstream = None
+            # Cache, pre-flight, coalescing and rate limiting are for message
+            # creation only; other paths such as /v1/messages/count_tokens are
+            # forwarded unchanged
+            messages = urlsplit(self.path).path == '/v1/messages'
+
+            # Serve deterministic requests from the cache when possible. Only
+            # these need the full body decoded, to build the cache key.
+            key = None
+            if messages and response_cache and is_cacheable(request_data):
+                key = cache_key(self.path, json.loads(body))
+            if key:
+                cached = response_cache.get(key)
+                if cached is not None:
+                    self.serve_cached(cached, request_data, session_id, start_time)
+                    return
+
+            # Answer a request that clearly cannot fit the model's context
+            # before sending it anywhere
+            if messages and preflight:
+                self.estimate = preflight.estimate(
+                    body, request_data.get('model', 'unknown'), self.headers.get('X-Session-ID')
+                )
+                if self.estimate and self.estimate.over:
+                    self.reject_too_long(self.estimate, request_data, session_id, start_time)
+                    return
 
             # Build upstream request
-            upstream_url = f"{ANTHROPIC_BASE_URL}{self.path}"
             headers = {
                 'Content-Type': 'application/json',
                 'anthropic-version': self.headers.get('anthropic-version', '2023-06-01'),
                 'x-api-key': ANTHROPIC_API_KEY
             }
 
-            # Make upstream request
-            req = Request(
-                upstream_url,
-                data=body,
-                headers=headers,
-                method='POST'
-            )
+            # Identical non-streaming requests already in flight share its upstream call
+            if messages and coalescer and not request_data.get('stream'):
+                flight, leader = coalescer.join(coalesce_key(self.path, body, headers['anthropic-version']))
+                if not leader:
+                    self.serve_coalesced(flight, request_data, session_id, start_time)
+                    return
 
-            try:
-                with urlopen(req, timeout=120) as response:
-                    response_data = response.read()
-                    response_json = json.loads(response_data)
+            # Mark the stable prefix (tools, system, history) for prompt caching.
+            # This is the one opt-in path that decodes and re-encodes the body.
+            if messages and PROMPT_CACHE_ENABLED:
+                full_request = json.loads(body)
+                if inject_breakpoints(full_request, len(body)):
+                    body = encode_request(full_request)
+
+            limit_key = (ANTHROPIC_API_KEY, request_data.get('model', 'unknown'))
+            tokens = self.estimate.tokens if self.estimate else estimate_tokens(body)
+            retries = 0
+            while True:
+                # Wait for the key/model rate-limit buckets before going upstream
+                if messages and rate_limiter:
+                    try:
+                        rate_limiter.acquire(*limit_key, tokens)
+                    except RateLimited as e:
+                        self.reject_rate_limited(e, request_data, session_id, start_time, flight)
+                        return
+
+                # Make upstream request over a pooled keep-alive connection
+                # to whichever upstream currently looks best
+                with upstream_router.request('POST', self.path, body, headers) as response:
                     status_code = response.status
+                    self.upstream = response.upstream
+                    if messages and rate_limiter:
+                        rate_limiter.update(*limit_key, status_code, response.headers)
+                        if status_code == 429 and retries < RATE_LIMIT_RETRIES:
+                            # Requeue behind the Retry-After the limiter just learned
+                            response.read()
+                            retries += 1
+                            continue
+                    if request_data.get('stream') and status_code < 400:
+                        self.relay_stream(response, request_data, session_id, start_time)
+                        return
+                    ttfb_ms = int((time.time() - start_time) * 1000)
+                    response_data = response.read()
+                    retry_after = response.headers.get('retry-after')
+                break
+
+            if status_code < 400:
+                (prompt_tokens, completion_tokens, reasoning_tokens,
+                 cache_creation_tokens, cache_read_tokens) = self.extract_usage(response_data)
 
-                    # Extract token counts
-                    usage = response_json.get('usage', {})
-                    prompt_tokens = usage.get('input_tokens', 0)
-                    completion_tokens = usage.get('output_tokens', 0)
-
-                    # Handle reasoning tokens (if available in extended thinking)
-                    reasoning_tokens = 0
-                    for content_block in response_json.get('content', []):
-                        if content_block.get('type') == 'thinking':
-                            # Estimate reasoning tokens (rough approximation)
-                            thinking_text = content_block.get('thinking', '')
-                            reasoning_tokens += len(thinking_text.split()) * 1.3
-
-                    reasoning_tokens = int(reasoning_tokens)
-
-                    # Calculate cost (example pricing - adjust as needed)
-                    model = request_data.get('model', 'claude-3-5-sonnet-20241022')
-                    cost = self.calculate_cost(
-                        model,
-                        prompt_tokens,
-                        completion_tokens,
-                        reasoning_tokens
-                    )
-
-                    # Calculate latency
-                    latency_ms = int((time.time() - start_time) * 1000)
-
-                    # Log to TSV file
-                    self.log_to_file(
-                        session_id=session_id,
-                        method=f"{self.command} {self.path}",
-                        status=status_code,
-                        prompt_tokens=prompt_tokens,
-                        completion_tokens=completion_tokens,
-                        reasoning_tokens=reasoning_tokens,
-                        latency_ms=latency_ms,
-                        model=model,
-                        cost=cost
-                    )
-
-                    # Send response to client
-                    self.send_response(status_code)
-                    self.send_header('Content-Type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(response_data)
-
-                    logger.info(f"✓ {status_code} {self.path} - {latency_ms}ms - ${cost:.4f}")
-
-            except HTTPError as e:
-                # Handle API errors
-                error_body = e.read()
-                self.send_response(e.code)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(error_body)
+                # Calculate cost (example pricing - adjust as needed)
+                model = request_data.get('model', 'claude-3-5-sonnet-20241022')
+                cost = self.calculate_cost(
+                    model,
+                    prompt_tokens,
+                    completion_tokens,
+                    reasoning_tokens,
+                    cache_creation_tokens,
+                    cache_read_tokens
+                )
+
+                # Calculate latency
+                latency_ms = int((time.time() - start_time) * 1000)
+
+                # Log to TSV file
+                self.log_to_file(
+                    session_id=session_id,
+                    method=f"{self.command} {self.path}",
+                    status=status_code,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    reasoning_tokens=reasoning_tokens,
+                    latency_ms=latency_ms,
+                    model=model,
+                    cost=cost,
+                    ttfb_ms=ttfb_ms,
+                    cache_creation_tokens=cache_creation_tokens,
+                    cache_read_tokens=cache_read_tokens,
+                    response_body=response_data
+                )
+
+                # Hand the response to followers and the cache before writing
+                # it out, so a client that went away does not cost them it
+                if flight:
+                    flight.resolve(status_code, response_data)
+
+                if key and status_code == 200:
+                    try:
+                        response_cache.put(key, response_data)
+                    except OSError as e:
+                        logger.error(f"Failed to cache response: {e}")
+
+                # Send response to client
+                self.send_json(status_code, response_data)
+
+                logger.info(f"✓ {status_code} {self.path}{self.via()} - {latency_ms}ms - ${cost:.4f}")
+
+            else:
+                # Handle API errors, passing Retry-After on so clients back off
+                error_headers = {'Retry-After': retry_after} if retry_after else None
+                if flight:
+                    flight.resolve(status_code, response_data, error_headers)
+                self.send_json(status_code, response_data, error_headers)
 
                 # Log error
                 latency_ms = int((time.time() - start_time) * 1000)
                 self.log_to_file(
                     session_id=session_id,
                     method=f"{self.command} {self.path}",
-                    status=e.code,
+                    status=status_code,
                     prompt_tokens=0,
                     completion_tokens=0,
                     reasoning_tokens=0,
                     latency_ms=latency_ms,
                     model=request_data.get('model', 'unknown'),
-                    cost=0.0
+                    cost=0.0,
+                    ttfb_ms=ttfb_ms,
+                    response_body=response_data
                 )
 
-                logger.error(f"✗ {e.code} {self.path} - {latency_ms}ms")
+                logger.error(f"✗ {status_code} {self.path}{self.via()} - {latency_ms}ms")
 
+        except PoolTimeout as e:
+            logger.error(f"Proxy error: {e}")
+            if flight:
+                flight.fail(503, str(e))
+            self.send_error_quietly(503, str(e))
         except Exception as e:
             logger.error(f"Proxy error: {e}")
-            self.send_error(500, str(e))
+            if flight:
+                flight.fail(500, str(e))
+            self.send_error_quietly(500, str(e))
+        finally:
+            # Release any followers waiting on this request
+            if flight:
+                coalescer.finish(flight)
+
+    def serve_coalesced(self, flight, request_data: dict, session_id: str, start_time: float):
+        """Wait for an identical in-flight request and answer with its outcome.
+
+        The follower gets its own log line, marked COALESCED at zero cost since
+        only the leader's upstream call is billed.
+        """
+        # Bound the wait by the longest the leader can legitimately take
+        attempts = RATE_LIMIT_RETRIES + 1
+        if not flight.wait(attempts * (UPSTREAM_TIMEOUT + RATE_LIMIT_MAX_WAIT_S)):
+            self.send_error_quietly(504, 'Timed out waiting for coalesced request')
+            latency_ms = int((time.time() - start_time) * 1000)
+            self.log_to_file(
+                session_id=session_id,
+                method=f"COALESCED {self.command} {self.path}",
+                status=504,
+                prompt_tokens=0,
+                completion_tokens=0,
+                reasoning_tokens=0,
+                latency_ms=latency_ms,
+                model=request_data.get('model', 'unknown'),
+                cost=0.0,
+                ttfb_ms=latency_ms
+            )
+            logger.error(f"✗ 504 {self.path} (coalesced, timed out) - {latency_ms}ms")
+            return
+
+        if flight.error is not None:
+            self.send_error(flight.status, flight.error)
+        else:
+            self.send_json(flight.status, flight.body, flight.headers)
+
+        if flight.error is None and flight.status < 400:
+            (prompt_tokens, completion_tokens, reasoning_tokens,
+             cache_creation_tokens, cache_read_tokens) = self.extract_usage(flight.body)
+        else:
+            prompt_tokens = completion_tokens = reasoning_tokens = 0
+            cache_creation_tokens = cache_read_tokens = 0
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        self.log_to_file(
+            session_id=session_id,
+            method=f"COALESCED {self.command} {self.path}",
+            status=flight.status,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            reasoning_tokens=reasoning_tokens,
+            latency_ms=latency_ms,
+            model=request_data.get('model', 'unknown'),
+            cost=0.0,
+            ttfb_ms=latency_ms,
+            cache_creation_tokens=cache_creation_tokens,
+            cache_read_tokens=cache_read_tokens,
+            response_body=flight.body if flight.error is None else None
+        )
+
+        logger.info(f"✓ {flight.status} {self.path} (coalesced) - {latency_ms}ms")
+
+    def serve_cached(self, response_data: bytes, request_data: dict, session_id: str, start_time: float):
+        """Answer from the response cache and log the hit at zero cost"""
+        self.send_json(200, response_data)
+
+        (prompt_tokens, completion_tokens, reasoning_tokens,
+         cache_creation_tokens, cache_read_tokens) = self.extract_usage(response_data)
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        # The CACHE method prefix marks lines that never reached upstream
+        self.log_to_file(
+            session_id=session_id,
+            method=f"CACHE {self.command} {self.path}",
+            status=200,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            reasoning_tokens=reasoning_tokens,
+            latency_ms=latency_ms,
+            model=request_data.get('model', 'claude-3-5-sonnet-20241022'),
+            cost=0.0,
+            ttfb_ms=latency_ms,
+            cache_creation_tokens=cache_creation_tokens,
+            cache_read_tokens=cache_read_tokens,
+            response_body=response_data
+        )
+
+        logger.info(f"✓ 200 {self.path} (cache hit) - {latency_ms}ms")
+
+    def reject_rate_limited(self, error: RateLimited, request_data: dict, session_id: str,
+                            start_time: float, flight=None):
+        """Answer with an Anthropic-style 429 without contacting upstream"""
+        retry_after = max(1, int(error.retry_after + 0.999))
+        body = json.dumps({
+            'type': 'error',
+            'error': {
+                'type': 'rate_limit_error',
+                'message': f"Proxy rate limit reached; retry after {retry_after}s"
+            }
+        }).encode('utf-8')
+        self.send_json(429, body, {'Retry-After': str(retry_after)})
+        if flight:
+            flight.resolve(429, body, {'Retry-After': str(retry_after)})
+
+        # The RATELIMIT method prefix marks lines that never reached upstream
+        latency_ms = int((time.time() - start_time) * 1000)
+        self.log_to_file(
+            session_id=session_id,
+            method=f"RATELIMIT {self.command} {self.path}",
+            status=429,
+            prompt_tokens=0,
+            completion_tokens=0,
+            reasoning_tokens=0,
+            latency_ms=latency_ms,
+            model=request_data.get('model', 'unknown'),
+            cost=0.0,
+            ttfb_ms=latency_ms,
+            response_body=body
+        )
+
+        logger.warning(f"✗ 429 {self.path} (local rate limit) - retry after {retry_after}s")
+
+    def reject_too_long(self, estimate, request_data: dict, session_id: str, start_time: float):
+        """Answer with the API's own 400 for a prompt over the context limit"""
+        body = json.dumps({
+            'type': 'error',
+            'error': {
+                'type': 'invalid_request_error',
+                'message': f"prompt is too long: {estimate.tokens} tokens > {estimate.limit} maximum "
+                           f"(estimated by proxy)"
+            }
+        }).encode('utf-8')
+        self.send_json(400, body)
+
+        # The PREFLIGHT method prefix marks lines that never reached upstream
+        latency_ms = int((time.time() - start_time) * 1000)
+        self.log_to_file(
+            session_id=session_id,
+            method=f"PREFLIGHT {self.command} {self.path}",
+            status=400,
+            prompt_tokens=0,
+            completion_tokens=0,
+            reasoning_tokens=0,
+            latency_ms=latency_ms,
+            model=request_data.get('model', 'unknown'),
+            cost=0.0,
+            ttfb_ms=latency_ms,
+            response_body=body
+        )
+
+        logger.warning(f"✗ 400 {self.path} (prompt too long: ~{estimate.tokens} > {estimate.limit} tokens)")
+
+    @staticmethod
+    def extract_usage(response_data: bytes):
+        """Return (prompt, completion, reasoning, cache_creation, cache_read)
+        token counts from a response body"""
+        # Only the usage block and thinking text are read from the body
+        usage, thinking_words = response_usage(response_data)
+
+        # Extract token counts
+        prompt_tokens, cache_creation_tokens, cache_read_tokens = ProxyHandler.prompt_usage(usage)
+        completion_tokens = usage.get('output_tokens', 0)
+
+        # Estimate reasoning tokens from extended thinking (rough approximation)
+        reasoning_tokens = thinking_words * 1.3
+
+        return prompt_tokens, completion_tokens, int(reasoning_tokens), cache_creation_tokens, cache_read_tokens
+
+    @staticmethod
+    def prompt_usage(usage: dict):
+        """Return (prompt, cache_creation, cache_read) input tokens from a usage block.
+
+        input_tokens only counts the uncached part of the prompt, so prompt
+        tokens include cache writes and reads to reflect the full context size.
+        """
+        cache_creation_tokens = usage.get('cache_creation_input_tokens') or 0
+        cache_read_tokens = usage.get('cache_read_input_tokens') or 0
+        prompt_tokens = (usage.get('input_tokens') or 0) + cache_creation_tokens + cache_read_tokens
+        return prompt_tokens, cache_creation_tokens, cache_read_tokens
+
+    def relay_stream(self, response, request_data: dict, session_id: str, start_time: float):
+        """Forward a server-sent-event stream to the client as it arrives.
+
+        Each SSE event is written as its own chunk, so the client sees tokens
+        as soon as upstream produces them. Token usage is picked out of the
+        message_start/message_delta events in flight and logged once the
+        stream ends.
+        """
+        self.send_response(response.status)
+        self.send_header('Content-Type', response.headers.get('Content-Type', 'text/event-stream'))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        usage = {}
+        reasoning_tokens = 0.0
+        ttfb_ms = None
+        event = []
+        # Relayed events, kept only when the body archive needs them
+        captured = [] if body_archive else None
 
-    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int, reasoning_tokens: int) -> float:
-        """Calculate cost based on token usage"""
+        while True:
+            line = response.readline()
+            if line:
+                event.append(line)
+                if line not in (b'\n', b'\r\n'):
+                    continue
+            if event:
+                chunk = b''.join(event)
+                event = []
+                if ttfb_ms is None:
+                    ttfb_ms = int((time.time() - start_time) * 1000)
+                try:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                    self.wfile.flush()
+                except OSError:
+                    # Client went away; stop relaying but still log what we saw
+                    self.close_connection = True
+                    break
+                reasoning_tokens += self.scan_stream_event(chunk, usage)
+                if captured is not None:
+                    captured.append(chunk)
+            if not line:
+                try:
+                    self.wfile.write(b'0\r\n\r\n')
+                except OSError:
+                    self.close_connection = True
+                break
+
+        prompt_tokens, cache_creation_tokens, cache_read_tokens = self.prompt_usage(usage)
+        completion_tokens = usage.get('output_tokens', 0)
+        reasoning_tokens = int(reasoning_tokens)
+        model = request_data.get('model', 'claude-3-5-sonnet-20241022')
+        cost = self.calculate_cost(model, prompt_tokens, completion_tokens, reasoning_tokens,
+                                   cache_creation_tokens, cache_read_tokens)
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        self.log_to_file(
+            session_id=session_id,
+            method=f"{self.command} {self.path}",
+            status=response.status,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            reasoning_tokens=reasoning_tokens,
+            latency_ms=latency_ms,
+            model=model,
+            cost=cost,
+            ttfb_ms=ttfb_ms if ttfb_ms is not None else latency_ms,
+            cache_creation_tokens=cache_creation_tokens,
+            cache_read_tokens=cache_read_tokens,
+            response_body=b''.join(captured) if captured is not None else None
+        )
+
+        logger.info(f"✓ {response.status} {self.path} (stream){self.via()} - ttfb {ttfb_ms}ms - {latency_ms}ms - ${cost:.4f}")
+
+    @staticmethod
+    def scan_stream_event(chunk: bytes, usage: dict) -> float:
+        """Update usage from a single SSE event; return estimated reasoning tokens.
+
+        Only the few event types that carry usage or thinking text are decoded,
+        so ordinary text deltas pass through without a JSON parse.
+        """
+        if b'"message_start"' in chunk:
+            kind = 'message_start'
+        elif b'"message_delta"' in chunk:
+            kind = 'message_delta'
+        elif b'"thinking_delta"' in chunk:
+            kind = 'thinking_delta'
+        else:
+            return 0.0
+
+        for line in chunk.splitlines():
+            if not line.startswith(b'data:'):
+                continue
+            try:
+                data = json.loads(line[5:])
+            except ValueError:
+                continue
+
+            if kind == 'message_start':
+                usage.update(data.get('message', {}).get('usage', {}))
+            elif kind == 'message_delta':
+                usage.update(data.get('usage') or {})
+            else:
+                # Estimate reasoning tokens (rough approximation)
+                return len(data.get('delta', {}).get('thinking', '').split()) * 1.3
+        return 0.0
+
+    def send_json(self, status: int, data: bytes, extra_headers: dict = None):
+        """Send a JSON body with an explicit length so the connection stays reusable"""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_quietly(self, code: int, message: str):
+        """send_error for a client that may already have disconnected"""
+        try:
+            self.send_error(code, message)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int, reasoning_tokens: int,
+                       cache_creation_tokens: int = 0, cache_read_tokens: int = 0) -> float:
+        """Calculate cost based on token usage
+
+        prompt_tokens includes any cache tokens; cache writes are billed at
+        1.25x and cache reads at 0.1x the base input price.
+        """
         # Example pricing (adjust to actual Anthropic pricing)
         pricing = {
             'claude-3-5-sonnet-20241022': {'input': 3.00, 'output': 15.00},
@@ -194,20 +882,74 @@ class ProxyHandler(BaseHTTPRequestHandler):
         prices = pricing.get(model, {'input': 3.00, 'output': 15.00})
 
         # Calculate cost per million tokens
-        input_cost = (prompt_tokens + reasoning_tokens) * prices['input'] / 1_000_000
+        uncached_tokens = prompt_tokens - cache_creation_tokens - cache_read_tokens
+        input_cost = (
+            (uncached_tokens + reasoning_tokens)
+            + cache_creation_tokens * CACHE_WRITE_MULTIPLIER
+            + cache_read_tokens * CACHE_READ_MULTIPLIER
+        ) * prices['input'] / 1_000_000
         output_cost = completion_tokens * prices['output'] / 1_000_000
 
         return input_cost + output_cost
 
+    def via(self) -> str:
+        """Console log suffix naming the upstream, when routing between several"""
+        return f" via {self.upstream}" if self.upstream and len(UPSTREAMS) > 1 else ''
+
     def log_to_file(self, session_id: str, method: str, status: int,
                    prompt_tokens: int, completion_tokens: int, reasoning_tokens: int,
-                   latency_ms: int, model: str, cost: float):
-        """Write log entry in TSV format"""
-        timestamp = datetime.utcnow().isoformat() + 'Z'
+                   latency_ms: int, model: str, cost: float, ttfb_ms: int = None,
+                   cache_creation_tokens: int = None, cache_read_tokens: int = None,
+                   response_body: bytes = None):
+        """Queue a log entry in TSV format for the background writer
+
+        The same values feed the in-memory aggregates served at /metrics and
+        the per-session context pressure served at /sessions. With the body
+        archive enabled, the request and response bodies are queued for it
+        under a request_id that is also written to the log line. The
+        pre-flight estimate is logged next to the real prompt tokens, which
+        also calibrate later estimates, and the upstream the request was
+        routed to after them.
+        """
+        metrics.record(
+            session_id, model, status, latency_ms,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            reasoning_tokens=reasoning_tokens,
+            cost=cost,
+            ttfb_ms=ttfb_ms,
+            cache_creation_tokens=cache_creation_tokens or 0,
+            cache_read_tokens=cache_read_tokens or 0
+        )
+        # Untagged requests get a fresh id each; tracking them would only
+        # crowd real sessions out
+        if session_tracker and self.headers.get('X-Session-ID'):
+            session_tracker.observe(session_id, status, prompt_tokens, reasoning_tokens)
+        estimate = self.estimate
+        # Followers share the leader's response, which calibrates only once
+        if estimate is not None and status < 400 and prompt_tokens and not method.startswith('COALESCED'):
+            preflight.observe(model, estimate, prompt_tokens)
+
+        now = datetime.now(timezone.utc)
+        timestamp = now.strftime('%Y-%m-%dT%H:%M:%S.') + f"{now.microsecond // 1000:03d}Z"
+
+        request_id = None
+        if body_archive:
+            request_id = uuid.uuid4().hex
+            body_archive.put({
+                'request_id': request_id,
+                'timestamp': timestamp,
+                'session_id': session_id,
+                'method': method,
+                'status': status,
+                'model': model
+            }, self.request_body, response_body)
 
         # TSV format: timestamp | session_id | method | status | prompt_tokens |
         #             completion_tokens | reasoning_tokens | latency_ms | model | cost
-        log_line = '\t'.join([
+        # followed by optional extended fields: ttfb_ms | cache_creation_tokens |
+        #             cache_read_tokens | request_id | estimated_tokens | upstream
+        fields = [
             timestamp,
             session_id,
             method,
@@ -218,13 +960,15 @@ class ProxyHandler(BaseHTTPRequestHandler):
             str(latency_ms),
             model,
             f"{cost:.4f}"
-        ])
-
-        try:
-            with open(LOG_PATH, 'a') as f:
-                f.write(log_line + '\n')
-        except Exception as e:
-            logger.error(f"Failed to write log: {e}")
+        ]
+        # Extended fields are positional: trailing unknowns are omitted and
+        # unknowns before a known field are left empty
+        extended = [ttfb_ms, cache_creation_tokens, cache_read_tokens, request_id,
+                    estimate.tokens if estimate is not None else None, self.upstream]
+        while extended and extended[-1] is None:
+            extended.pop()
+        fields.extend('' if value is None else str(value) for value in extended)
+        log_writer.write('\t'.join(fields))
 
 
 def main():
@@ -239,22 +983,81 @@ def main():
     logger.info("=" * 60)
     logger.info(f"Port: {PORT}")
     logger.info(f"Log file: {LOG_PATH}")
-    logger.info(f"Upstream: {ANTHROPIC_BASE_URL}")
+    if len(UPSTREAMS) > 1:
+        logger.info(f"Upstreams: {', '.join(f'{name}={url}' for name, url in UPSTREAMS)}"
+                    f" (health checks: {f'every {HEALTH_INTERVAL_S:g}s' if HEALTH_INTERVAL_S > 0 else 'off'})")
+    else:
+        logger.info(f"Upstream: {UPSTREAMS[0][1]}")
+    logger.info(f"Processes: {PROCESSES}")
+    logger.info(f"Workers: {WORKERS} (upstream pool: {UPSTREAM_POOL_SIZE})")
+    logger.info(f"Response cache: {CACHE_DIR if response_cache else 'disabled'}")
+    logger.info(f"Rate limiting: {'enabled' if rate_limiter else 'disabled'}")
+    logger.info(f"Body archive: {ARCHIVE_DIR if body_archive else 'disabled'}")
+    logger.info(f"Pre-flight token check: {'enabled' if preflight else 'disabled'}")
+    logger.info(f"Session tracking: {'enabled' if session_tracker else 'disabled'}"
+                + (f" (pushing to {SESSION_PUSH_URL})" if session_tracker and SESSION_PUSH_URL else ''))
     logger.info("=" * 60)
     logger.info("\nTo use with Claude Code:")
     logger.info(f"  export ANTHROPIC_API_BASE_URL=http://localhost:{PORT}")
     logger.info("")
 
+    if PROCESSES > 1:
+        if not reuse_port_supported():
+            logger.error("ERROR: PROXY_PROCESSES > 1 requires fork() and SO_REUSEPORT on this platform")
+            sys.exit(1)
+        logger.info(f"🚀 Proxy supervisor starting {PROCESSES} workers on http://127.0.0.1:{PORT}\n")
+        Supervisor(PROCESSES, serve).run()
+    else:
+        serve()
+
+
+def serve(worker: int = None):
+    """Run one proxy server until interrupted.
+
+    Pre-fork workers (worker is not None) bind with SO_REUSEPORT and write
+    their own log, proxy.w<N>.log, next to PROXY_LOG_PATH.
+    """
+    global worker_index
+    worker_index = worker
+
+    # Treat SIGTERM like Ctrl+C so queued log lines are flushed on shutdown
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    if worker is not None:
+        log_writer.path = worker_log_path(LOG_PATH, worker)
+        if body_archive:
+            body_archive.manifest_suffix = f".w{worker}"
+
+    server = None
+    log_writer.start()
+    if session_tracker:
+        session_tracker.start()
+    if body_archive:
+        body_archive.start()
+    upstream_router.start()
     try:
-        server = HTTPServer(('127.0.0.1', PORT), ProxyHandler)
-        logger.info(f"🚀 Proxy server running at http://127.0.0.1:{PORT}\n")
+        server = ProxyServer(('127.0.0.1', PORT), ProxyHandler, reuse_port=worker is not None)
+        if worker is None:
+            logger.info(f"🚀 Proxy server running at http://127.0.0.1:{PORT}\n")
         server.serve_forever()
     except KeyboardInterrupt:
-        logger.info("\n\n👋 Shutting down proxy server...")
-        server.shutdown()
+        # Ignore further signals so the log writer can drain
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        if worker is None:
+            logger.info("\n\n👋 Shutting down proxy server...")
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         sys.exit(1)
+    finally:
+        if server:
+            server.server_close()
+        upstream_router.close()
+        if session_tracker:
+            session_tracker.close()
+        if body_archive:
+            body_archive.close()
+        log_writer.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,341 @@
+"""
+Live per-session context pressure for the Delobotomize proxy.
+
+The audit and the bridge find context saturation, reasoning overflow and
+stalls by re-reading proxy.log after the fact. The proxy already sees every
+request as it finishes, so it keeps a small state per session (keyed on
+X-Session-ID) and raises a signal the moment a session crosses a threshold:
+
+    context_saturation  (prompt + reasoning tokens) / context window rises
+                        above the saturation ratio (0.85); re-armed once it
+                        drops back below, e.g. after the client compacts
+    reasoning_overflow  reasoning tokens rise above 80% of the budget;
+                        re-armed by a request back under it
+    stall_detected      a request arrives after more than stall_gap seconds
+                        of silence from its session
+
+Updating a session is a dict lookup and a few arithmetic operations under
+one lock. Sessions live in an LRU ordered by last activity, so a background
+thread evicts idle ones by popping from the front; max_sessions caps the
+total regardless.
+
+Current state and recent signals are served at GET /sessions. With a push
+URL configured, signals are also sent to the monitoring server as events
+from the same background thread, never from the request path.
+"""
+
+import http.client
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+SATURATION_RATIO = 0.85
+# Share of the reasoning budget above which a request overflows
+REASONING_OVERFLOW_RATIO = 0.8
+# Weight of the newest prompt-growth sample in the moving average
+GROWTH_ALPHA = 0.3
+RECENT_SIGNALS = 200
+SWEEP_INTERVAL_S = 5.0
+PUSH_BATCH_SIZE = 100
+PUSH_TIMEOUT_S = 5.0
+MAX_QUEUED_SIGNALS = 10000
+
+
+def iso_timestamp(seconds: float) -> str:
+    now = datetime.fromtimestamp(seconds, timezone.utc)
+    return now.strftime('%Y-%m-%dT%H:%M:%S.') + f"{now.microsecond // 1000:03d}Z"
+
+
+class SessionState:
+    """What the proxy knows about one session"""
+
+    __slots__ = (
+        'session_id', 'first_seen', 'last_seen', 'requests',
+        'prompt_tokens', 'prompt_peak', 'growth', 'reasoning_tokens', 'reasoning_total',
+        'reasoning_overflows', 'last_gap', 'max_gap', 'stalls', 'saturated', 'overflowing'
+    )
+
+    def __init__(self, session_id: str, now: float):
+        self.session_id = session_id
+        self.first_seen = now
+        self.last_seen = now
+        self.requests = 0
+        self.prompt_tokens = 0      # context of the latest request
+        self.prompt_peak = 0        # high-water mark
+        self.growth = 0.0           # moving average of prompt tokens added per request
+        self.reasoning_tokens = 0
+        self.reasoning_total = 0
+        self.reasoning_overflows = 0
+        self.last_gap = 0.0
+        self.max_gap = 0.0
+        self.stalls = 0
+        self.saturated = False
+        self.overflowing = False
+
+    def to_dict(self, now: float, context_window: int) -> dict:
+        usage = (self.prompt_tokens + self.reasoning_tokens) / context_window
+        headroom = SATURATION_RATIO * context_window - self.prompt_tokens - self.reasoning_tokens
+        return {
+            'session_id': self.session_id,
+            'first_seen': iso_timestamp(self.first_seen),
+            'last_seen': iso_timestamp(self.last_seen),
+            'idle_s': round(now - self.last_seen, 1),
+            'requests': self.requests,
+            'prompt_tokens': self.prompt_tokens,
+            'prompt_peak': self.prompt_peak,
+            'context_usage': round(usage, 4),
+            'growth_per_request': round(self.growth, 1),
+            # Requests left at the current growth rate before saturating
+            'requests_to_saturation': (
+                max(0, int(headroom / self.growth)) if self.growth > 0 and not self.saturated else None
+            ),
+            'reasoning_tokens': self.reasoning_tokens,
+            'reasoning_total': self.reasoning_total,
+            'reasoning_overflows': self.reasoning_overflows,
+            'last_gap_s': round(self.last_gap, 1),
+            'max_gap_s': round(self.max_gap, 1),
+            'stalls': self.stalls,
+            'saturated': self.saturated
+        }
+
+
+class SessionTracker:
+    """Thread-safe per-session state with threshold signals"""
+
+    def __init__(self, context_window: int = 200000, reasoning_budget: int = 10000,
+                 stall_gap: float = 300.0, idle_ttl: float = 1800.0, max_sessions: int = 10000,
+                 push_url: str = '', project_id: str = 'proxy'):
+        self.context_window = context_window
+        self.reasoning_limit = reasoning_budget * REASONING_OVERFLOW_RATIO
+        self.stall_gap = stall_gap
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.project_id = project_id
+        self.evicted = 0
+        self.signals_total = 0
+        self.pushed = 0
+        self.push_dropped = 0
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session_id -> SessionState, least recently active first
+        self._recent = deque(maxlen=RECENT_SIGNALS)
+        self._push = urlsplit(push_url) if push_url else None
+        self._outbox = queue.Queue(maxsize=MAX_QUEUED_SIGNALS)
+        self._stop = threading.Event()
+        self._thread = None
+        self._connection = None
+
+    def observe(self, session_id: str, status: int, prompt_tokens: int, reasoning_tokens: int,
+                now: float = None) -> list:
+        """Account for one finished request; returns the signals it raised.
+
+        A failed request carries no usage but still counts as activity, so
+        a session getting errors is not reported as stalled.
+        """
+        now = time.time() if now is None else now
+        signals = []
+
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = SessionState(session_id, now)
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+                gap = now - state.last_seen
+                state.last_gap = gap
+                state.max_gap = max(state.max_gap, gap)
+                if gap > self.stall_gap:
+                    state.stalls += 1
+                    signals.append(self._signal('stall_detected', state, now, {
+                        'duration': round(gap, 1),
+                        'started_at': iso_timestamp(state.last_seen),
+                        'ended_at': iso_timestamp(now)
+                    }))
+
+            state.last_seen = now
+            if status < 400:  # failed requests carry no usage
+                if state.requests:
+                    delta = prompt_tokens - state.prompt_tokens
+                    state.growth += GROWTH_ALPHA * (delta - state.growth)
+                state.requests += 1
+                state.prompt_tokens = prompt_tokens
+                state.prompt_peak = max(state.prompt_peak, prompt_tokens)
+                state.reasoning_tokens = reasoning_tokens
+                state.reasoning_total += reasoning_tokens
+
+                usage = (prompt_tokens + reasoning_tokens) / self.context_window
+                if usage > SATURATION_RATIO:
+                    if not state.saturated:
+                        state.saturated = True
+                        signals.append(self._signal('context_saturation', state, now, {
+                            'context_usage': round(usage, 4),
+                            'context_window': self.context_window,
+                            'tokens': prompt_tokens + reasoning_tokens,
+                            'growth_per_request': round(state.growth, 1)
+                        }))
+                else:
+                    state.saturated = False
+
+                if reasoning_tokens > self.reasoning_limit:
+                    state.reasoning_overflows += 1
+                    if not state.overflowing:
+                        state.overflowing = True
+                        signals.append(self._signal('reasoning_overflow', state, now, {
+                            'tokens': reasoning_tokens,
+                            'reasoning_budget': self.reasoning_limit / REASONING_OVERFLOW_RATIO
+                        }))
+                else:
+                    state.overflowing = False
+
+            self._recent.extend(signals)
+            self.signals_total += len(signals)
+
+        for signal in signals:
+            logger.warning(f"⚠ {signal['type']} in session {session_id}")
+            self._queue_push(signal)
+        return signals
+
+    def _signal(self, kind: str, state: SessionState, now: float, context: dict) -> dict:
+        return {
+            'type': kind,
+            'session_id': state.session_id,
+            'timestamp': iso_timestamp(now),
+            'context': dict(context, requests=state.requests, source='proxy')
+        }
+
+    def sweep(self, now: float = None) -> int:
+        """Evict sessions idle for longer than idle_ttl; returns how many"""
+        now = time.time() if now is None else now
+        evicted = 0
+        with self._lock:
+            while self._sessions:
+                state = next(iter(self._sessions.values()))
+                if now - state.last_seen <= self.idle_ttl:
+                    break
+                self._sessions.popitem(last=False)
+                evicted += 1
+            self.evicted += evicted
+        return evicted
+
+    def snapshot(self, session_id: str = None) -> dict:
+        """JSON-serializable view, most recently active session first"""
+        now = time.time()
+        with self._lock:
+            states = [self._sessions[session_id]] if session_id in self._sessions else []
+            if session_id is None:
+                states = list(reversed(self._sessions.values()))
+            sessions = [state.to_dict(now, self.context_window) for state in states]
+            recent = [signal for signal in self._recent
+                      if session_id is None or signal['session_id'] == session_id]
+
+        return {
+            'context_window': self.context_window,
+            'thresholds': {
+                'saturation_ratio': SATURATION_RATIO,
+                'reasoning_tokens': self.reasoning_limit,
+                'stall_gap_s': self.stall_gap,
+                'idle_ttl_s': self.idle_ttl
+            },
+            'sessions': sessions,
+            'recent_signals': list(reversed(recent)),
+            'stats': self.stats()
+        }
+
+    def stats(self) -> dict:
+        return {
+            'tracked': len(self._sessions),
+            'evicted': self.evicted,
+            'signals': self.signals_total,
+            'pushed': self.pushed,
+            'push_dropped': self.push_dropped
+        }
+
+    def start(self):
+        """Start the thread that evicts idle sessions and pushes signals"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='proxy-sessions', daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Push queued signals and stop the background thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _queue_push(self, signal: dict):
+        if self._push is None:
+            return
+        try:
+            self._outbox.put_nowait(signal)
+        except queue.Full:
+            self.push_dropped += 1
+
+    def _run(self):
+        next_sweep = time.monotonic() + SWEEP_INTERVAL_S
+        while True:
+            batch = []
+            try:
+                batch.append(self._outbox.get(timeout=max(0.0, next_sweep - time.monotonic())))
+                while len(batch) < PUSH_BATCH_SIZE:
+                    batch.append(self._outbox.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._send(batch)
+
+            if time.monotonic() >= next_sweep:
+                self.sweep()
+                next_sweep = time.monotonic() + SWEEP_INTERVAL_S
+            if self._stop.is_set() and self._outbox.empty():
+                return
+
+    def _send(self, signals: list):
+        """POST signals to the monitoring server's batch endpoint as events"""
+        body = '\n'.join(json.dumps({
+            'id': str(uuid.uuid4()),
+            'type': signal['type'],
+            'timestamp': signal['timestamp'],
+            'session_id': signal['session_id'],
+            'project_id': self.project_id,
+            'context': signal['context']
+        }) for signal in signals).encode('utf-8')
+
+        try:
+            if self._connection is None:
+                connection_class = (
+                    http.client.HTTPSConnection if self._push.scheme == 'https' else http.client.HTTPConnection
+                )
+                self._connection = connection_class(self._push.netloc, timeout=PUSH_TIMEOUT_S)
+            self._connection.request(
+                'POST', self._push.path.rstrip('/') + '/api/events/batch', body=body,
+                headers={'Content-Type': 'application/x-ndjson'}
+            )
+            response = self._connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                raise http.client.HTTPException(f"monitoring server returned {response.status}")
+            self.pushed += len(signals)
+        except (OSError, http.client.HTTPException) as e:
+            # Signals stay visible at /sessions; pushing is best effort
+            self.push_dropped += len(signals)
+            logger.error(f"Failed to push {len(signals)} session signals: {e}")
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Fake Anthropic upstream for benchmarking the Delobotomize proxy.
+
+Serves POST /v1/messages with canned Messages API responses so the proxy can
+be measured without network variance or API cost. Point the proxy at it
+with ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+    python proxy/stub_upstream.py --port 18999 --latency-ms 200 --response-bytes 4096
+
+Requests with "stream": true get a server-sent-event stream whose text is
+split across --stream-events deltas. A fraction of requests (--error-rate)
+is answered with a 429 rate_limit_error carrying Retry-After, and another
+(--fail-rate) with a 500 api_error. During an --outage window, given in
+seconds since the stub started, every request including GET /v1/models
+health checks gets a 503 overloaded_error. Run several stubs with different
+settings to exercise the proxy's routing between upstreams.
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubConfig:
+    """Response shape and timing shared by all handler threads"""
+
+    def __init__(self, latency_ms: float = 0, response_bytes: int = 1024, stream_events: int = 20,
+                 stream_interval_ms: float = 0, error_rate: float = 0, retry_after: int = 1,
+                 thinking_words: int = 0, fail_rate: float = 0, outages: list = None):
+        self.latency_ms = latency_ms
+        self.response_bytes = response_bytes
+        self.stream_events = max(1, stream_events)
+        self.stream_interval_ms = stream_interval_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.thinking_words = thinking_words
+        self.fail_rate = fail_rate
+        self.outages = outages or []    # (start, end) seconds since started
+        self.started = time.monotonic()
+
+    def in_outage(self) -> bool:
+        elapsed = time.monotonic() - self.started
+        return any(start <= elapsed < end for start, end in self.outages)
+
+
+def _text(size: int) -> str:
+    words = 'the quick brown fox jumps over the lazy dog '
+    return (words * (size // len(words) + 1))[:size]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers /v1/messages like the Anthropic API, from a StubConfig"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.config.in_outage():
+            self.send_error_json(503, 'overloaded_error', 'Stub upstream outage')
+        elif self.path.split('?')[0] == '/v1/models':
+            data = json.dumps({'data': [{'type': 'model', 'id': 'claude-sonnet-4-5'}], 'has_more': False})
+            self.send_json(200, data.encode('utf-8'))
+        else:
+            self.send_error_json(404, 'not_found_error', 'Not found')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError:
+            request = {}
+
+        config = self.config
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000)
+
+        if config.in_outage():
+            self.send_error_json(503, 'overloaded_error', 'Stub upstream outage')
+        elif config.fail_rate and random.random() < config.fail_rate:
+            self.send_error_json(500, 'api_error', 'Stub upstream failure')
+        elif config.error_rate and random.random() < config.error_rate:
+            self.send_rate_limited()
+        elif request.get('stream'):
+            self.send_stream(request, len(body))
+        else:
+            self.send_message(request, len(body))
+
+    def send_rate_limited(self):
+        data = json.dumps({
+            'type': 'error',
+            'error': {'type': 'rate_limit_error', 'message': 'Stub upstream rate limit'}
+        }).encode('utf-8')
+        self.send_response(429)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Retry-After', str(self.config.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status: int, kind: str, message: str):
+        data = json.dumps({'type': 'error', 'error': {'type': kind, 'message': message}})
+        self.send_json(status, data.encode('utf-8'))
+
+    def send_json(self, status: int, data: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def usage(self, body_size: int) -> dict:
+        return {
+            'input_tokens': max(1, body_size // 4),
+            'output_tokens': max(1, self.config.response_bytes // 4),
+            'cache_creation_input_tokens': 0,
+            'cache_read_input_tokens': 0
+        }
+
+    def send_message(self, request: dict, body_size: int):
+        content = []
+        if self.config.thinking_words:
+            content.append({'type': 'thinking', 'thinking': _text(self.config.thinking_words * 6), 'signature': 'stub'})
+        content.append({'type': 'text', 'text': _text(self.config.response_bytes)})
+
+        data = json.dumps({
+            'id': 'msg_stub',
+            'type': 'message',
+            'role': 'assistant',
+            'model': request.get('model', 'claude-3-5-sonnet-20241022'),
+            'content': content,
+            'stop_reason': 'end_turn',
+            'usage': self.usage(body_size)
+        }).encode('utf-8')
+        self.send_json(200, data)
+
+    def send_stream(self, request: dict, body_size: int):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        usage = self.usage(body_size)
+        text = _text(self.config.response_bytes)
+        step = max(1, len(text) // self.config.stream_events)
+
+        events = [('message_start', {
+            'type': 'message_start',
+            'message': {
+                'id': 'msg_stub', 'type': 'message', 'role': 'assistant',
+                'model': request.get('model', 'claude-3-5-sonnet-20241022'), 'content': [],
+                'usage': {**usage, 'output_tokens': 1}
+            }
+        }), ('content_block_start', {
+            'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}
+        })]
+        for start in range(0, len(text), step):
+            events.append(('content_block_delta', {
+                'type': 'content_block_delta', 'index': 0,
+                'delta': {'type': 'text_delta', 'text': text[start:start + step]}
+            }))
+        events += [
+            ('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+            ('message_delta', {
+                'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                'usage': {'output_tokens': usage['output_tokens']}
+            }),
+            ('message_stop', {'type': 'message_stop'})
+        ]
+
+        for name, payload in events:
+            chunk = f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+            if self.config.stream_interval_ms:
+                time.sleep(self.config.stream_interval_ms / 1000)
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Anthropic /v1/messages upstream')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18999)
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay before each response')
+    parser.add_argument('--response-bytes', type=int, default=1024, help='size of the response text')
+    parser.add_argument('--stream-events', type=int, default=20, help='text deltas per streamed response')
+    parser.add_argument('--stream-interval-ms', type=float, default=0, help='delay between streamed events')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on injected 429s')
+    parser.add_argument('--thinking-words', type=int, default=0, help='words of thinking in JSON responses')
+    parser.add_argument('--fail-rate', type=float, default=0, help='fraction of requests answered with 500')
+    parser.add_argument('--outage', action='append', default=[], metavar='START:END',
+                        help='seconds since start during which everything gets 503 (repeatable)')
+    args = parser.parse_args()
+
+    StubHandler.config = StubConfig(
+        latency_ms=args.latency_ms,
+        response_bytes=args.response_bytes,
+        stream_events=args.stream_events,
+        stream_interval_ms=args.stream_interval_ms,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        thinking_words=args.thinking_words,
+        fail_rate=args.fail_rate,
+        outages=[tuple(float(part) for part in outage.split(':')) for outage in args.outage]
+    )
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Pre-fork supervisor for the Delobotomize proxy.
+
+A single CPython process is GIL-bound for request parsing and is a single
+point of failure for every session on the host. With PROXY_PROCESSES > 1 the
+proxy's main process becomes a supervisor: it forks that many workers, each
+running a complete proxy server bound to the same port with SO_REUSEPORT so
+the kernel spreads incoming connections across them, and it restarts any
+worker that exits unexpectedly.
+
+Workers share nothing at runtime. Each writes its own log (proxy.w0.log,
+proxy.w1.log, ...) so they never contend for a file; readers merge the
+worker logs by timestamp.
+"""
+
+import logging
+import os
+import signal
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, 'SO_REUSEPORT') and hasattr(os, 'fork')
+
+
+class Supervisor:
+    """Fork and babysit worker processes
+
+    target(index) runs a worker until it is interrupted. A worker that dies
+    within min_uptime seconds of starting is restarted with exponential
+    back-off so a crash loop does not spin the CPU.
+    """
+
+    def __init__(self, processes: int, target, min_uptime: float = 5.0,
+                 restart_delay: float = 0.5, max_restart_delay: float = 30.0):
+        self.processes = processes
+        self.target = target
+        self.min_uptime = min_uptime
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.restarts = 0
+
+        self._children = {}  # pid -> (index, started_at)
+        self._delays = {}    # index -> current back-off
+        self._stopping = False
+
+    def run(self):
+        """Start all workers and supervise them until SIGINT/SIGTERM"""
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for index in range(self.processes):
+            self._spawn(index)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, started_at = self._children.pop(pid, (None, 0))
+            if index is None or self._stopping:
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            uptime = time.monotonic() - started_at
+            if uptime < self.min_uptime:
+                delay = self._delays.get(index, self.restart_delay)
+                self._delays[index] = min(delay * 2, self.max_restart_delay)
+            else:
+                delay = 0
+                self._delays.pop(index, None)
+
+            logger.error(f"Worker {index} (pid {pid}) exited with {code} after {uptime:.1f}s; restarting")
+            if delay:
+                time.sleep(delay)
+            if not self._stopping:
+                self.restarts += 1
+                self._spawn(index)
+
+        logger.info("All proxy workers stopped")
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.default_int_handler)
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                self.target(index)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception(f"Worker {index} crashed")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        self._children[pid] = (index, time.monotonic())
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def _stop(self, signum, frame):
+        """Forward shutdown to the workers; run() returns once they exit"""
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info("Stopping proxy workers...")
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,135 @@
+"""
+Upstream connection pooling for the Delobotomize proxy.
+
+Keeps a bounded set of persistent HTTP/1.1 connections to the Anthropic API
+so that concurrent requests reuse TCP/TLS sessions instead of paying the
+handshake on every call.
+"""
+
+import http.client
+import queue
+import ssl
+import threading
+from urllib.parse import urlparse
+
+
+class PoolTimeout(Exception):
+    """Raised when no upstream connection becomes available in time"""
+
+
+# Errors that mean a reused keep-alive connection was closed by the upstream
+# before it saw our request; these are safe to retry once on a fresh socket.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class PooledResponse:
+    """Upstream response that returns its connection to the pool when closed"""
+
+    def __init__(self, pool, conn, response):
+        self._pool = pool
+        self._conn = conn
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+        self.upstream = None    # name of the upstream, when routed
+        self.on_close = None
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def read1(self, amt=-1):
+        return self._response.read1(amt)
+
+    def readline(self, limit=-1):
+        return self._response.readline(limit)
+
+    def close(self):
+        """Release the connection, keeping it alive only if fully consumed"""
+        if self._conn is None:
+            return
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            self._response.close()
+        self._pool.release(self._conn, reusable)
+        self._conn = None
+        if self.on_close is not None:
+            self.on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UpstreamPool:
+    """Bounded pool of persistent connections to a single upstream base URL"""
+
+    def __init__(self, base_url: str, size: int = 16, timeout: float = 120):
+        parsed = urlparse(base_url)
+        self.base_url = base_url
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parsed.path.rstrip('/')
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout, context=self._ssl_context
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No upstream connection available after {self.timeout}s")
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def release(self, conn, reusable: bool):
+        """Return a connection to the pool (or close it) and free its slot"""
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def request(self, method: str, path: str, body: bytes, headers: dict) -> PooledResponse:
+        """Send a request and return a response bound to a pooled connection"""
+        conn, reused = self._acquire()
+        while True:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                return PooledResponse(self, conn, conn.getresponse())
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    self._slots.release()
+                    raise
+                # The idle connection went stale; retry once on a fresh one
+                conn, reused = self._connect(), False
+            except BaseException:
+                conn.close()
+                self._slots.release()
+                raise
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
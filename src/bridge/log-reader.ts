@@ -2,21 +2,85 @@ import fs from 'fs';
 import { watch } from 'chokidar';
 import { EventEmitter } from 'events';
 import path from 'path';
+import {
+  isLogSource,
+  listLogSegments,
+  listLogSources,
+  locateSegment,
+  mergeByTimestamp,
+  readSegmentLines,
+  type LogSegment,
+  type SegmentLine
+} from './segments.js';
 
 /**
  * Log Reader
  *
- * Watches .delobotomize/proxy.log for new lines using file system notifications.
- * Emits 'line' events for each new TSV line.
+ * Watches .delobotomize/proxy.log for new lines using file system notifications
+ * and hands them to a batch handler (see onBatch). 'line' events are still
+ * emitted for each line when anything listens for them.
+ *
+ * A multi-process proxy writes one log per worker (proxy.w0.log, ...); those
+ * are followed too, and lines that arrive together are merged by timestamp
+ * so listeners see a single time-ordered stream.
+ *
+ * A single reader loop consumes every source. Change notifications only
+ * mark the logs dirty, so a burst of them costs one extra pass at most.
+ * Each source is read through an open handle, at most chunkSize bytes per
+ * pass, and only whole lines are consumed. When the proxy rotates a log
+ * (the path now names a different inode), the old handle is read to its
+ * end, then any segments the proxy closed after it (rotations that
+ * happened while the reader was behind), and only then is the new file
+ * opened. A log that shrinks in place was truncated and is re-read from
+ * the start. The loop waits for the batch handler before reading further,
+ * so a slow consumer throttles the reader instead of lines piling up in
+ * memory.
  */
+
+export interface LogReaderOptions {
+  batchSize?: number; // lines per onBatch call
+  chunkSize?: number; // bytes read from a source per pass
+}
+
+export type BatchHandler = (lines: string[]) => void | Promise<void>;
+
+interface SourceState {
+  handle: fs.promises.FileHandle | null;
+  ino: number;
+  position: number;
+  lastClosed: number; // highest closed segment read or queued, besides the handle's
+  backlog: LogSegment[]; // closed segments still to read before reopening
+  backlogLines: AsyncGenerator<SegmentLine> | null;
+}
+
+interface ChunkResult {
+  lines: string[];
+  more: boolean; // unread bytes remain
+}
+
 export class LogReader extends EventEmitter {
   private watcher: any;
-  private lastPosition: number = 0;
+  private sources = new Map<string, SourceState>();
+  private reading: Promise<void> | null = null;
+  private dirty: boolean = false;
+  private batchHandler: BatchHandler | null = null;
   private logPath: string;
+  private batchSize: number = 500;
+  private chunkSize: number = 1024 * 1024;
 
-  constructor(logPath: string) {
+  constructor(logPath: string, options: LogReaderOptions = {}) {
     super();
     this.logPath = logPath;
+    if (options.batchSize) this.batchSize = options.batchSize;
+    if (options.chunkSize) this.chunkSize = options.chunkSize;
+  }
+
+  /**
+   * Receive new lines in time-ordered batches. The reader waits for a
+   * returned promise before delivering more.
+   */
+  onBatch(handler: BatchHandler): void {
+    this.batchHandler = handler;
   }
 
   async start(): Promise<void> {
@@ -26,70 +90,259 @@ export class LogReader extends EventEmitter {
       await fs.promises.writeFile(this.logPath, '');
     }
 
-    // Get current file size
-    const stats = await fs.promises.stat(this.logPath);
-    this.lastPosition = stats.size;
+    // Start every existing source at its current end
+    for (const source of await listLogSources(this.logPath)) {
+      const state = this.newState();
+      try {
+        await this.open(source, state, null);
+        state.position = (await state.handle!.stat()).size;
+      } catch {
+        // Source has only rotated segments; pick it up when it reappears
+      }
+      this.sources.set(source, state);
+    }
 
-    // Watch for file changes
-    this.watcher = watch(this.logPath, {
+    // Watch the log directory so worker logs created later are followed too
+    this.watcher = watch(path.dirname(this.logPath), {
       persistent: true,
-      ignoreInitial: false
+      ignoreInitial: true,
+      depth: 0
     });
 
-    this.watcher.on('change', async () => {
-      await this.readNewLines();
-    });
+    const onChange = (filePath: string) => {
+      if (!isLogSource(filePath, this.logPath)) return;
+      if (!this.sources.has(filePath)) this.sources.set(filePath, this.newState());
+      void this.readNewLines();
+    };
+    this.watcher.on('add', onChange);
+    this.watcher.on('change', onChange);
+    this.watcher.on('unlink', onChange);
 
     this.emit('started');
   }
 
-  async readNewLines(): Promise<void> {
-    try {
-      const stats = await fs.promises.stat(this.logPath);
-      const currentSize = stats.size;
-
-      if (currentSize > this.lastPosition) {
-        // Read from last position to end
-        const stream = fs.createReadStream(this.logPath, {
-          start: this.lastPosition,
-          end: currentSize,
-          encoding: 'utf-8'
-        });
-
-        let buffer = '';
-
-        stream.on('data', (chunk: string) => {
-          buffer += chunk;
-          const lines = buffer.split('\n');
-
-          // Keep the last incomplete line in buffer
-          buffer = lines.pop() || '';
-
-          // Emit complete lines
-          for (const line of lines) {
-            if (line.trim()) {
-              this.emit('line', line);
-            }
-          }
-        });
+  /**
+   * Read everything appended since the last read. Calls made while a read
+   * is running are folded into one more pass.
+   */
+  readNewLines(): Promise<void> {
+    this.dirty = true;
+    if (!this.reading) {
+      this.reading = this.drain().finally(() => {
+        this.reading = null;
+        // Marked dirty after the loop's last check
+        if (this.dirty) void this.readNewLines();
+      });
+    }
+    return this.reading;
+  }
 
-        stream.on('end', () => {
-          this.lastPosition = currentSize;
-        });
+  private async drain(): Promise<void> {
+    try {
+      while (this.dirty) {
+        this.dirty = false;
 
-        stream.on('error', (error) => {
-          this.emit('error', error);
-        });
+        let more = true;
+        while (more) {
+          more = false;
+          const perSource: string[][] = [];
+          for (const [source, state] of this.sources) {
+            const chunk = await this.readSource(source, state);
+            perSource.push(chunk.lines);
+            more ||= chunk.more;
+          }
+          await this.deliver(mergeByTimestamp(perSource));
+        }
       }
     } catch (error) {
       this.emit('error', error);
     }
   }
 
+  private async deliver(lines: string[]): Promise<void> {
+    if (lines.length === 0) return;
+
+    if (this.listenerCount('line') > 0) {
+      for (const line of lines) this.emit('line', line);
+    }
+    if (!this.batchHandler) return;
+
+    for (let i = 0; i < lines.length; i += this.batchSize) {
+      await this.batchHandler(lines.slice(i, i + this.batchSize));
+    }
+  }
+
+  /**
+   * Next chunk of complete lines from one source, following rotation and
+   * truncation
+   */
+  private async readSource(source: string, state: SourceState): Promise<ChunkResult> {
+    let current: fs.Stats | null = null;
+    try {
+      current = await fs.promises.stat(source);
+    } catch {
+      // Rotated away and not yet recreated
+    }
+
+    // Segments older than the open handle come first
+    if (state.backlog.length > 0) return this.readBacklog(state);
+
+    if (state.handle && (!current || current.ino !== state.ino)) {
+      // Rotated: finish the file we were following, then switch
+      const rest = await this.readChunk(state, true);
+      if (rest.more || rest.lines.length > 0) return { lines: rest.lines, more: true };
+      await state.handle.close();
+      state.handle = null;
+      state.backlog = await this.missedSegments(source, state);
+      if (state.backlog.length > 0) return this.readBacklog(state);
+    }
+
+    if (!state.handle) {
+      if (!current) return { lines: [], more: false };
+      try {
+        // A source seen for the first time has no segments to catch up on
+        await this.open(source, state, state.ino ? state.lastClosed : null);
+      } catch {
+        return { lines: [], more: false };
+      }
+      state.position = 0;
+      if (state.backlog.length > 0) return this.readBacklog(state);
+    } else if (current!.size < state.position) {
+      // Truncated in place
+      state.position = 0;
+      this.emit('truncated', source);
+    }
+
+    return this.readChunk(state, false);
+  }
+
+  /**
+   * Read up to chunkSize bytes of whole lines from the current position. A
+   * trailing partial line is left for the next read, unless `final` (the
+   * file has been rotated and won't grow).
+   */
+  private async readChunk(state: SourceState, final: boolean): Promise<ChunkResult> {
+    const handle = state.handle!;
+    const size = (await handle.stat()).size;
+    if (size <= state.position) return { lines: [], more: false };
+
+    let length = Math.min(size - state.position, this.chunkSize);
+    let buffer: Buffer;
+    let bytesRead: number;
+    let end: number;
+    while (true) {
+      buffer = Buffer.alloc(length);
+      ({ bytesRead } = await handle.read(buffer, 0, length, state.position));
+      end = buffer.lastIndexOf(0x0a, bytesRead - 1);
+      if (end !== -1 || length >= size - state.position) break;
+      // A single line longer than a chunk
+      length = Math.min(size - state.position, length * 2);
+    }
+
+    let consumed = end + 1;
+    if (end === -1) {
+      if (!final || bytesRead === 0) return { lines: [], more: false };
+      consumed = bytesRead;
+    }
+
+    state.position += consumed;
+    const lines = buffer
+      .toString('utf-8', 0, consumed)
+      .split('\n')
+      .filter(line => line.trim());
+    return { lines, more: state.position < size };
+  }
+
+  /**
+   * Segments closed after the one we were following, oldest first
+   */
+  private async missedSegments(source: string, state: SourceState): Promise<LogSegment[]> {
+    const closed = (await listLogSegments(source)).filter(segment => segment.number !== null);
+
+    // Ours is the segment with our inode, unless it was compressed already;
+    // then it is the one after the last segment we knew of
+    let ours = state.lastClosed + 1;
+    for (const segment of closed) {
+      if (segment.compressed || (segment.number as number) <= state.lastClosed) continue;
+      if ((await inodeOf(segment.path)) === state.ino) ours = segment.number as number;
+    }
+
+    const missed = closed.filter(segment => (segment.number as number) > ours);
+    state.lastClosed = missed.length > 0 ? (missed[missed.length - 1].number as number) : ours;
+    return missed;
+  }
+
+  /**
+   * Next chunk of lines from the oldest backlog segment
+   */
+  private async readBacklog(state: SourceState): Promise<ChunkResult> {
+    if (!state.backlogLines) {
+      const segment = await locateSegment(state.backlog[0]);
+      if (!segment) {
+        state.backlog.shift(); // removed by retention
+        return { lines: [], more: true };
+      }
+      state.backlogLines = readSegmentLines(segment);
+    }
+
+    const lines: string[] = [];
+    let bytes = 0;
+    while (bytes < this.chunkSize) {
+      const next = await state.backlogLines.next();
+      if (next.done) {
+        state.backlogLines = null;
+        state.backlog.shift();
+        break;
+      }
+      if (next.value.line.trim()) lines.push(next.value.line);
+      bytes += next.value.line.length + 1;
+    }
+    return { lines, more: true };
+  }
+
+  /**
+   * Open the active log. Segments numbered above `readThrough` were rotated
+   * after we last looked, and are queued to be read first.
+   */
+  private async open(source: string, state: SourceState, readThrough: number | null): Promise<void> {
+    const handle = await fs.promises.open(source, 'r');
+    state.handle = handle;
+    state.ino = (await handle.stat()).ino;
+
+    const closed = (await listLogSegments(source)).filter(segment => segment.number !== null);
+    const newest = closed[closed.length - 1];
+    if (newest && !newest.compressed && (await inodeOf(newest.path)) === state.ino) {
+      closed.pop(); // the file we just opened, already rotated
+    }
+
+    state.lastClosed = closed.reduce((max, segment) => Math.max(max, segment.number as number), 0);
+    if (readThrough !== null) {
+      state.backlog = closed.filter(segment => (segment.number as number) > readThrough);
+    }
+  }
+
+  private newState(): SourceState {
+    return { handle: null, ino: 0, position: 0, lastClosed: 0, backlog: [], backlogLines: null };
+  }
+
   stop(): void {
     if (this.watcher) {
       this.watcher.close();
       this.emit('stopped');
     }
+    for (const state of this.sources.values()) {
+      void state.handle?.close();
+      void state.backlogLines?.return(undefined);
+      state.handle = null;
+      state.backlogLines = null;
+    }
+  }
+}
+
+async function inodeOf(filePath: string): Promise<number | null> {
+  try {
+    return (await fs.promises.stat(filePath)).ino;
+  } catch {
+    return null; // being compressed or removed
   }
 }
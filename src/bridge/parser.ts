@@ -5,6 +5,7 @@ import { z } from 'zod';
  *
  * Validates TSV format against defined schema.
  * Format: timestamp | session_id | method | status | prompt_tokens | completion_tokens | reasoning_tokens | latency_ms | model | cost
+ * Optional extended fields (appended by newer proxies): ttfb_ms | cache_creation_tokens | cache_read_tokens | request_id | estimated_tokens | upstream
  */
 
 const ProxyLogSchema = z.object({
@@ -17,7 +18,13 @@ const ProxyLogSchema = z.object({
   reasoning_tokens: z.number().int().min(0),
   latency_ms: z.number().int().min(0),
   model: z.string(),
-  cost: z.number().min(0)
+  cost: z.number().min(0),
+  ttfb_ms: z.number().int().min(0).optional(),
+  cache_creation_tokens: z.number().int().min(0).optional(),
+  cache_read_tokens: z.number().int().min(0).optional(),
+  request_id: z.string().optional(),
+  estimated_tokens: z.number().int().min(0).optional(),
+  upstream: z.string().optional()
 });
 
 export type ProxyLogEntry = z.infer<typeof ProxyLogSchema>;
@@ -29,8 +36,8 @@ export class Parser {
   parse(line: string): ProxyLogEntry {
     const parts = line.split('\t').map(p => p.trim());
 
-    if (parts.length !== 10) {
-      throw new Error(`Invalid TSV format: expected 10 fields, got ${parts.length}`);
+    if (parts.length < 10) {
+      throw new Error(`Invalid TSV format: expected at least 10 fields, got ${parts.length}`);
     }
 
     const entry = {
@@ -43,7 +50,13 @@ export class Parser {
       reasoning_tokens: parseInt(parts[6], 10),
       latency_ms: parseInt(parts[7], 10),
       model: parts[8],
-      cost: parseFloat(parts[9])
+      cost: parseFloat(parts[9]),
+      ttfb_ms: optionalInt(parts[10]),
+      cache_creation_tokens: optionalInt(parts[11]),
+      cache_read_tokens: optionalInt(parts[12]),
+      request_id: parts[13] || undefined,
+      estimated_tokens: optionalInt(parts[14]),
+      upstream: parts[15] || undefined
     };
 
     // Validate against schema
@@ -62,3 +75,7 @@ export class Parser {
     }
   }
 }
+
+function optionalInt(value: string | undefined): number | undefined {
+  return value === undefined || value === '' ? undefined : parseInt(value, 10);
+}
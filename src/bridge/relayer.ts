@@ -5,15 +5,91 @@ import type { MonitoringEvent } from './transformer.js';
  *
  * POSTs transformed events to monitoring server.
  * Implements retry logic with exponential backoff.
+ *
+ * Queued events are sent to /api/events/batch, which stores a whole batch
+ * in one transaction. A batch is flushed once it reaches maxBatchSize
+ * events or flushInterval ms after its first event, whichever comes first;
+ * batches are sent one at a time so events arrive in order.
+ *
+ * Producers that can pause (the log reader) call waitForCapacity() after
+ * enqueueing; once maxPending events are queued or in flight it resolves
+ * only after they have been delivered.
  */
 
+export interface RelayerOptions {
+  maxBatchSize?: number;
+  flushInterval?: number; // ms
+  maxPending?: number;
+}
+
 export class Relayer {
   private serverUrl: string;
   private maxRetries: number = 3;
   private baseDelay: number = 100; // ms
+  private maxBatchSize: number = 200;
+  private flushInterval: number = 250; // ms
+  private maxPending: number = 5000;
 
-  constructor(serverUrl: string = 'http://localhost:4000') {
+  private queue: MonitoringEvent[] = [];
+  private flushTimer: ReturnType<typeof setTimeout> | null = null;
+  private sending: Promise<void> = Promise.resolve();
+  private pending: number = 0; // queued or in flight
+  private batchSupported: boolean = true;
+
+  constructor(serverUrl: string = 'http://localhost:4000', options: RelayerOptions = {}) {
     this.serverUrl = serverUrl;
+    if (options.maxBatchSize) this.maxBatchSize = options.maxBatchSize;
+    if (options.flushInterval) this.flushInterval = options.flushInterval;
+    if (options.maxPending) this.maxPending = options.maxPending;
+  }
+
+  /**
+   * Queue event for the next batch
+   */
+  enqueue(event: MonitoringEvent): void {
+    this.queue.push(event);
+    this.pending++;
+
+    if (this.queue.length >= this.maxBatchSize) {
+      void this.flush();
+    } else if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => void this.flush(), this.flushInterval);
+    }
+  }
+
+  /**
+   * Send everything queued so far; resolves once it has been delivered
+   */
+  flush(): Promise<void> {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+
+    if (this.queue.length > 0) {
+      const events = this.queue.splice(0, this.queue.length);
+      this.sending = this.sending
+        .then(() => this.sendBatch(events))
+        .finally(() => {
+          this.pending -= events.length;
+        });
+    }
+    return this.sending;
+  }
+
+  /**
+   * Resolves once the relayer can take more events: immediately while fewer
+   * than maxPending are outstanding, otherwise after they are delivered
+   */
+  async waitForCapacity(): Promise<void> {
+    if (this.pending >= this.maxPending) await this.flush();
+  }
+
+  /**
+   * Flush queued events before shutdown
+   */
+  async close(): Promise<void> {
+    await this.flush();
   }
 
   /**
@@ -59,6 +135,61 @@ export class Relayer {
    * Send multiple events in batch
    */
   async sendBatch(events: MonitoringEvent[]): Promise<void> {
+    if (events.length === 0) return;
+    if (!this.batchSupported) return this.sendEach(events);
+
+    const body = events.map(event => JSON.stringify(event)).join('\n');
+    let lastError: Error | null = null;
+
+    for (let attempt = 0; attempt <= this.maxRetries; attempt++) {
+      try {
+        const response = await fetch(`${this.serverUrl}/api/events/batch`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/x-ndjson'
+          },
+          body
+        });
+
+        if (response.status === 404) {
+          // Server predates the batch endpoint
+          this.batchSupported = false;
+          return this.sendEach(events);
+        }
+
+        if (response.status >= 500) {
+          throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+
+        const result: any = await response.json().catch(() => ({}));
+        if (!response.ok) {
+          // Rejected as a whole; retrying the same body won't help
+          console.error(`Monitoring server rejected batch of ${events.length} events:`, result.error);
+        } else if (result.rejected) {
+          console.error(`Monitoring server rejected ${result.rejected} of ${events.length} events`);
+        }
+        return;
+
+      } catch (error) {
+        lastError = error as Error;
+
+        // If not last attempt, wait and retry
+        if (attempt < this.maxRetries) {
+          const delay = this.baseDelay * Math.pow(2, attempt);
+          await this.sleep(delay);
+        }
+      }
+    }
+
+    // All retries failed
+    console.error(`Failed to send batch of ${events.length} events after retries:`, lastError);
+    // Don't throw - continue processing (never block)
+  }
+
+  /**
+   * Fallback for servers without /api/events/batch: one POST per event
+   */
+  private async sendEach(events: MonitoringEvent[]): Promise<void> {
     // Send events concurrently (up to 10 at a time to avoid overwhelming server)
     const batchSize = 10;
     for (let i = 0; i < events.length; i += batchSize) {
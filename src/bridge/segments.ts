@@ -0,0 +1,337 @@
+import fs from 'fs/promises';
+import { createReadStream } from 'fs';
+import path from 'path';
+import zlib from 'zlib';
+import { promisify } from 'util';
+
+const gunzip = promisify(zlib.gunzip);
+
+/**
+ * Log Segments
+ *
+ * The proxy rotates proxy.log into numbered segments:
+ *   proxy.log                   active segment
+ *   proxy.log.000001[.gz]       closed segment (optionally gzipped)
+ *   proxy.log.000001.idx.json   sidecar index for the closed segment
+ *
+ * Indexes let readers skip whole segments outside a time window or session.
+ *
+ * A multi-process proxy (PROXY_PROCESSES > 1) writes one log per worker
+ * instead: proxy.w0.log, proxy.w1.log, ... each rotated the same way. Every
+ * log is time-ordered on its own, so readers merge them by timestamp.
+ */
+
+export interface SegmentIndex {
+  version: number;
+  segment: string;
+  compressed: boolean;
+  lines: number;
+  bytes: number;
+  first_timestamp: string | null;
+  last_timestamp: string | null;
+  sessions: Record<string, { first_offset: number; last_offset: number; lines: number }>;
+  checkpoints: [string, number][];
+}
+
+export interface LogSegment {
+  path: string;
+  number: number | null; // null for the active segment
+  compressed: boolean;
+  index: SegmentIndex | null;
+}
+
+export interface SegmentFilter {
+  from?: Date;
+  to?: Date;
+  sessionId?: string;
+}
+
+/**
+ * List closed segments (oldest first) followed by the active log, if present
+ */
+export async function listLogSegments(logPath: string): Promise<LogSegment[]> {
+  const dir = path.dirname(logPath);
+  const base = path.basename(logPath);
+  const pattern = new RegExp(`^${escapeRegExp(base)}\\.(\\d{6})(\\.gz)?$`);
+
+  let names: string[];
+  try {
+    names = await fs.readdir(dir);
+  } catch {
+    return [];
+  }
+
+  // While a segment is being compressed both copies exist; prefer the .gz
+  const found = new Map<number, string>();
+  for (const name of names) {
+    const match = name.match(pattern);
+    if (match && (!found.has(parseInt(match[1], 10)) || match[2])) {
+      found.set(parseInt(match[1], 10), name);
+    }
+  }
+
+  const segments: LogSegment[] = [];
+  for (const number of [...found.keys()].sort((a, b) => a - b)) {
+    const name = found.get(number)!;
+    segments.push({
+      path: path.join(dir, name),
+      number,
+      compressed: name.endsWith('.gz'),
+      index: await readIndex(path.join(dir, `${base}.${String(number).padStart(6, '0')}.idx.json`))
+    });
+  }
+
+  try {
+    await fs.access(logPath);
+    segments.push({ path: logPath, number: null, compressed: false, index: null });
+  } catch {
+    // No active segment yet
+  }
+
+  return segments;
+}
+
+/**
+ * Active log paths of every source: proxy.log followed by any worker logs
+ * (proxy.w<N>.log) next to it, in worker order. Paths are returned whether
+ * or not the files exist yet, so rotated-only sources are not missed.
+ */
+export async function listLogSources(logPath: string): Promise<string[]> {
+  const dir = path.dirname(logPath);
+  let names: string[] = [];
+  try {
+    names = await fs.readdir(dir);
+  } catch {
+    return [logPath];
+  }
+
+  const pattern = workerLogPattern(logPath);
+  const workers = new Set<number>();
+  for (const name of names) {
+    const match = name.match(pattern);
+    if (match) workers.add(parseInt(match[1], 10));
+  }
+
+  const ext = path.extname(logPath);
+  const stem = path.basename(logPath, ext);
+  return [
+    logPath,
+    ...[...workers].sort((a, b) => a - b).map(n => path.join(dir, `${stem}.w${n}${ext}`))
+  ];
+}
+
+/**
+ * Whether a file path is the active log of any source for logPath
+ */
+export function isLogSource(filePath: string, logPath: string): boolean {
+  if (path.dirname(filePath) !== path.dirname(logPath)) return false;
+  const name = path.basename(filePath);
+  if (name === path.basename(logPath)) return true;
+  const match = name.match(workerLogPattern(logPath));
+  return match !== null && match[2] === undefined;
+}
+
+/**
+ * Merge per-source line lists (each already time-ordered) into one
+ * time-ordered list. Lines are ordered by their leading ISO timestamp;
+ * ties keep source order.
+ */
+export function mergeByTimestamp(sources: string[][]): string[] {
+  const nonEmpty = sources.filter(lines => lines.length > 0);
+  if (nonEmpty.length <= 1) return nonEmpty[0] ?? [];
+
+  const merged: string[] = [];
+  const cursors = nonEmpty.map(() => 0);
+  const heads = nonEmpty.map(lines => timestampOf(lines[0]));
+
+  while (true) {
+    let next = -1;
+    for (let i = 0; i < nonEmpty.length; i++) {
+      if (cursors[i] < nonEmpty[i].length && (next === -1 || heads[i] < heads[next])) {
+        next = i;
+      }
+    }
+    if (next === -1) return merged;
+
+    merged.push(nonEmpty[next][cursors[next]]);
+    cursors[next]++;
+    if (cursors[next] < nonEmpty[next].length) {
+      heads[next] = timestampOf(nonEmpty[next][cursors[next]]);
+    }
+  }
+}
+
+/**
+ * Drop segments whose index proves they hold nothing matching the filter.
+ * Segments without an index (including the active one) are always kept.
+ */
+export function filterSegments(segments: LogSegment[], filter: SegmentFilter): LogSegment[] {
+  return segments.filter(segment => {
+    const index = segment.index;
+    if (!index) return true;
+
+    if (filter.sessionId && !(filter.sessionId in index.sessions)) return false;
+    if (filter.from && index.last_timestamp && new Date(index.last_timestamp) < filter.from) return false;
+    if (filter.to && index.first_timestamp && new Date(index.first_timestamp) > filter.to) return false;
+
+    return true;
+  });
+}
+
+/**
+ * Read a segment's full (uncompressed) contents
+ */
+export async function readSegment(segment: LogSegment): Promise<string> {
+  const data = await fs.readFile(segment.path);
+  return segment.compressed ? (await gunzip(data)).toString('utf-8') : data.toString('utf-8');
+}
+
+/**
+ * A closed segment as it is on disk now: the proxy may have compressed it
+ * since it was listed. Null if it no longer exists.
+ */
+export async function locateSegment(segment: LogSegment): Promise<LogSegment | null> {
+  if (await exists(segment.path)) return segment;
+  if (segment.number === null || segment.compressed) return null;
+
+  const compressed = { ...segment, path: `${segment.path}.gz`, compressed: true };
+  return (await exists(compressed.path)) ? compressed : null;
+}
+
+async function exists(filePath: string): Promise<boolean> {
+  try {
+    await fs.access(filePath);
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+export interface SegmentLine {
+  line: string;
+  end: number; // offset just past this line in the uncompressed segment
+}
+
+/**
+ * Stream a segment's complete lines, starting at a byte offset into its
+ * uncompressed contents. A trailing partial line of the active segment (one
+ * the proxy is still writing) is not yielded.
+ */
+export async function* readSegmentLines(segment: LogSegment, offset: number = 0): AsyncGenerator<SegmentLine> {
+  const file = createReadStream(segment.path, { start: segment.compressed ? 0 : offset });
+  const stream = segment.compressed ? file.pipe(zlib.createGunzip()) : file;
+
+  let base = segment.compressed ? 0 : offset; // segment offset of buffer[0]
+  let buffer = Buffer.alloc(0);
+
+  try {
+    for await (const chunk of stream as AsyncIterable<Buffer>) {
+      buffer = buffer.length ? Buffer.concat([buffer, chunk]) : chunk;
+
+      // Compressed segments can't be seeked; discard up to the offset
+      if (base < offset) {
+        const skip = Math.min(offset - base, buffer.length);
+        buffer = buffer.subarray(skip);
+        base += skip;
+      }
+
+      let start = 0;
+      let newline: number;
+      while ((newline = buffer.indexOf(0x0a, start)) !== -1) {
+        const line = buffer.toString('utf-8', start, newline);
+        start = newline + 1;
+        yield { line, end: base + start };
+      }
+      buffer = buffer.subarray(start);
+      base += start;
+    }
+  } finally {
+    file.destroy();
+  }
+
+  // A closed segment is complete even without a final newline
+  if (segment.number !== null && buffer.length > 0) {
+    yield { line: buffer.toString('utf-8'), end: base + buffer.length };
+  }
+}
+
+/**
+ * First `length` bytes of a segment's uncompressed contents (fewer if it
+ * is shorter)
+ */
+export async function readSegmentHead(segment: LogSegment, length: number): Promise<Buffer> {
+  if (length <= 0) return Buffer.alloc(0);
+
+  if (!segment.compressed) {
+    const handle = await fs.open(segment.path, 'r');
+    try {
+      const buffer = Buffer.alloc(length);
+      const { bytesRead } = await handle.read(buffer, 0, length, 0);
+      return buffer.subarray(0, bytesRead);
+    } finally {
+      await handle.close();
+    }
+  }
+
+  const chunks: Buffer[] = [];
+  let total = 0;
+  const file = createReadStream(segment.path);
+  try {
+    for await (const chunk of file.pipe(zlib.createGunzip()) as AsyncIterable<Buffer>) {
+      chunks.push(chunk);
+      total += chunk.length;
+      if (total >= length) break;
+    }
+  } finally {
+    file.destroy();
+  }
+  return Buffer.concat(chunks).subarray(0, length);
+}
+
+/**
+ * Streaming counterpart of mergeByTimestamp: merge time-ordered line
+ * streams into one, holding only the head of each stream in memory
+ */
+export async function* mergeStreamsByTimestamp<T extends { line: string }>(
+  streams: AsyncIterable<T>[]
+): AsyncGenerator<T> {
+  const iterators = streams.map(stream => stream[Symbol.asyncIterator]());
+  const heads = await Promise.all(iterators.map(iterator => iterator.next()));
+  const keys = heads.map(head => (head.done ? '' : timestampOf(head.value.line)));
+
+  while (true) {
+    let next = -1;
+    for (let i = 0; i < heads.length; i++) {
+      if (!heads[i].done && (next === -1 || keys[i] < keys[next])) next = i;
+    }
+    if (next === -1) return;
+
+    yield heads[next].value;
+    heads[next] = await iterators[next].next();
+    if (!heads[next].done) keys[next] = timestampOf(heads[next].value.line);
+  }
+}
+
+function timestampOf(line: string): string {
+  const tab = line.indexOf('\t');
+  return tab === -1 ? line : line.slice(0, tab);
+}
+
+// Worker logs and their rotated segments: proxy.w3.log, proxy.w3.log.000001.gz
+function workerLogPattern(logPath: string): RegExp {
+  const ext = path.extname(logPath);
+  const stem = escapeRegExp(path.basename(logPath, ext));
+  return new RegExp(`^${stem}\\.w(\\d+)${escapeRegExp(ext)}(\\.\\d{6}(?:\\.gz)?)?$`);
+}
+
+async function readIndex(indexPath: string): Promise<SegmentIndex | null> {
+  try {
+    return JSON.parse(await fs.readFile(indexPath, 'utf-8')) as SegmentIndex;
+  } catch {
+    return null;
+  }
+}
+
+function escapeRegExp(value: string): string {
+  return value.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+}
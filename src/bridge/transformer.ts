@@ -67,6 +67,11 @@ export class Transformer {
       return 'rate_limit';
     }
 
+    // Rejected by the proxy's pre-flight check as over the context window
+    if (entry.status === 400 && entry.method.startsWith('PREFLIGHT ')) {
+      return 'context_saturation';
+    }
+
     // Model refusal: 400
     if (entry.status === 400) {
       return 'model_refusal';
@@ -107,12 +112,24 @@ export class Transformer {
 
     // Add event-specific context
     switch (eventType) {
-      case 'context_saturation':
-        return {
+      case 'context_saturation': {
+        // A request rejected before reaching the API only has an estimate
+        const rejected = entry.method.startsWith('PREFLIGHT ');
+        const contextTokens = rejected
+          ? entry.estimated_tokens ?? 0
+          : entry.prompt_tokens + entry.reasoning_tokens;
+        const context = {
           ...baseContext,
-          context_usage: (entry.prompt_tokens + entry.reasoning_tokens) / this.contextWindow,
+          context_usage: contextTokens / this.contextWindow,
           context_window: this.contextWindow
         };
+        if (!rejected) return context;
+        return {
+          ...context,
+          estimated_tokens: entry.estimated_tokens,
+          message: 'Prompt too long (rejected by proxy)'
+        };
+      }
 
       case 'reasoning_overflow':
         return {
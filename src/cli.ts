@@ -52,10 +52,11 @@ program
   .command('audit')
   .alias('-audit')
   .description('Execute audit phase only')
-  .action(async () => {
+  .option('--full', 'Re-analyze all proxy logs instead of resuming from the last checkpoint')
+  .action(async (options) => {
     try {
       await checkIntegrity();
-      await runAudit();
+      await runAudit({ full: options.full });
     } catch (error) {
       console.error(chalk.red('✗ Audit failed:'), error);
       process.exit(1);
@@ -150,17 +151,21 @@ stack
       }
 
       // Set up event processing pipeline
-      reader.on('line', async (line) => {
-        try {
-          const entry = parser.parse(line);
-          const event = transformer.transform(entry);
-          await relayer.send(event);
-        } catch (error: any) {
-          // Silently skip malformed lines
-          if (error.message && !error.message.includes('Invalid TSV format')) {
-            console.error(chalk.red('Bridge error:'), error.message);
+      reader.onBatch(async (lines) => {
+        for (const line of lines) {
+          try {
+            const entry = parser.parse(line);
+            const event = transformer.transform(entry);
+            relayer.enqueue(event);
+          } catch (error: any) {
+            // Silently skip malformed lines
+            if (error.message && !error.message.includes('Invalid TSV format')) {
+              console.error(chalk.red('Bridge error:'), error.message);
+            }
           }
         }
+        // Hold the reader while the monitoring server catches up
+        await relayer.waitForCapacity();
       });
 
       await reader.start();
@@ -170,6 +175,13 @@ stack
 
       console.log(chalk.gray('\nPress Ctrl+C to stop'));
 
+      // Deliver events still waiting for their batch before exiting
+      process.on('SIGINT', async () => {
+        reader.stop();
+        await relayer.close();
+        process.exit(0);
+      });
+
       // Keep process alive
       process.stdin.resume();
 
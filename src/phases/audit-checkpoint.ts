@@ -0,0 +1,146 @@
+import fs from 'fs/promises';
+import crypto from 'crypto';
+import { locateSegment, readSegmentHead, type LogSegment } from '../bridge/segments.js';
+
+/**
+ * Audit Checkpoint
+ *
+ * Remembers how far the audit has read each proxy log source, together with
+ * the aggregates computed so far, so a later audit only parses lines the
+ * proxy has appended since.
+ *
+ * A source's position is the highest closed segment already read plus a
+ * byte offset into its active log. The active log is identified by a hash
+ * of its first bytes: when the proxy rotates it, the next closed segment
+ * carries the same head and reading resumes there at the saved offset. An
+ * active log that is shorter than the offset, or whose head no longer
+ * matches, was truncated or replaced and is read from the start.
+ *
+ * Closed segments are skipped by number, which only holds while the proxy
+ * keeps numbering them. The head of the last closed segment read is hashed
+ * too: if the highest segment number falls below it, or that segment's head
+ * has changed, the log directory was wiped or replaced and the numbers
+ * started again at 1. The checkpoint then no longer describes the logs and
+ * the audit starts over (sourceReset).
+ */
+
+export const CHECKPOINT_FILE = 'audit-checkpoint.json';
+export const CHECKPOINT_VERSION = 1;
+
+// Bytes hashed to recognise the active log after rotation
+const HEAD_BYTES = 512;
+
+export interface SourcePosition {
+  closed: number; // highest closed segment number fully read, 0 if none
+  offset: number; // bytes of the active log read (whole lines only)
+  headLength: number;
+  headHash: string;
+  closedHash?: string; // head of segment `closed`; absent in older checkpoints
+}
+
+export interface AuditCheckpoint<T = any> {
+  version: number;
+  updated_at: string;
+  sources: Record<string, SourcePosition>;
+  aggregates: T;
+}
+
+export interface SegmentPlan {
+  segment: LogSegment;
+  offset: number;
+}
+
+export async function loadCheckpoint<T>(checkpointPath: string): Promise<AuditCheckpoint<T> | null> {
+  try {
+    const checkpoint = JSON.parse(await fs.readFile(checkpointPath, 'utf-8'));
+    return checkpoint.version === CHECKPOINT_VERSION ? checkpoint : null;
+  } catch {
+    return null;
+  }
+}
+
+export async function saveCheckpoint<T>(checkpointPath: string, checkpoint: AuditCheckpoint<T>): Promise<void> {
+  // Write then rename, so an interrupted audit leaves the old checkpoint intact
+  const tmp = `${checkpointPath}.tmp`;
+  await fs.writeFile(tmp, JSON.stringify(checkpoint));
+  await fs.rename(tmp, checkpointPath);
+}
+
+/**
+ * Segments of one source still to read, and where to start in each
+ */
+export async function planSource(segments: LogSegment[], position?: SourcePosition): Promise<SegmentPlan[]> {
+  if (!position) return segments.map(segment => ({ segment, offset: 0 }));
+
+  const plan: SegmentPlan[] = [];
+  let located = position.offset === 0;
+
+  for (const segment of segments) {
+    if (segment.number !== null && segment.number <= position.closed) continue;
+
+    let offset = 0;
+    if (!located) {
+      // The first unread segment is normally the log we were following,
+      // either rotated (closed) or still active
+      located = true;
+      if (await sameHead(segment, position)) {
+        offset = segment.number === null && (await sizeOf(segment)) < position.offset ? 0 : position.offset;
+      }
+    }
+    plan.push({ segment, offset });
+  }
+
+  return plan;
+}
+
+/**
+ * Whether a source's closed segments were renumbered since `position` was
+ * saved, so that skipping segments by number would skip unread ones
+ */
+export async function sourceReset(segments: LogSegment[], position?: SourcePosition): Promise<boolean> {
+  if (!position || position.closed === 0) return false;
+
+  const highest = segments.reduce((max, segment) => Math.max(max, segment.number ?? 0), 0);
+  if (highest < position.closed) return true;
+  if (!position.closedHash) return false;
+
+  // Pruned segments can't be checked; anything still there must match
+  const listed = segments.find(segment => segment.number === position.closed);
+  const last = listed && (await locateSegment(listed));
+  if (!last) return false;
+  return hash(await readSegmentHead(last, HEAD_BYTES)) !== position.closedHash;
+}
+
+/**
+ * Position after reading a source through `offset` bytes of its active log
+ */
+export async function positionAfter(segments: LogSegment[], offset: number): Promise<SourcePosition> {
+  const closed = segments.reduce((max, segment) => Math.max(max, segment.number ?? 0), 0);
+  const active = segments.find(segment => segment.number === null);
+
+  const listed = segments.find(segment => segment.number === closed);
+  const last = listed && (await locateSegment(listed));
+  const closedHash = last ? hash(await readSegmentHead(last, HEAD_BYTES)) : undefined;
+
+  if (!active || offset === 0) return { closed, offset: 0, headLength: 0, headHash: '', closedHash };
+
+  const head = await readSegmentHead(active, Math.min(offset, HEAD_BYTES));
+  return { closed, offset, headLength: head.length, headHash: hash(head), closedHash };
+}
+
+async function sameHead(segment: LogSegment, position: SourcePosition): Promise<boolean> {
+  const head = await readSegmentHead(segment, position.headLength);
+  return head.length === position.headLength && hash(head) === position.headHash;
+}
+
+async function sizeOf(segment: LogSegment): Promise<number> {
+  try {
+    return (await fs.stat(segment.path)).size;
+  } catch {
+    return 0;
+  }
+}
+
+function hash(data: Buffer): string {
+  return crypto.createHash('sha256').update(data).digest('hex');
+}
@@ -2,8 +2,33 @@ import chalk from 'chalk';
 import ora from 'ora';
 import fs from 'fs/promises';
 import path from 'path';
-import { execSync } from 'child_process';
-import { Parser } from '../bridge/parser.js';
+import { Parser, type ProxyLogEntry } from '../bridge/parser.js';
+import {
+  listLogSegments,
+  listLogSources,
+  filterSegments,
+  locateSegment,
+  readSegmentLines,
+  mergeStreamsByTimestamp,
+  type LogSegment,
+  type SegmentFilter
+} from '../bridge/segments.js';
+import {
+  CHECKPOINT_FILE,
+  CHECKPOINT_VERSION,
+  loadCheckpoint,
+  saveCheckpoint,
+  planSource,
+  positionAfter,
+  sourceReset,
+  type SegmentPlan,
+  type SourcePosition
+} from './audit-checkpoint.js';
+import { INVENTORY_CACHE_FILE, scanProjectStructure } from './inventory.js';
+
+export interface AuditOptions {
+  full?: boolean; // ignore the log checkpoint and re-read every segment
+}
 
 /**
  * Audit Phase
@@ -14,8 +39,13 @@ import { Parser } from '../bridge/parser.js';
  * Input: .delobotomize/proxy.log (via bridge), project file system
  * Output: audit-report.md, file-inventory.json, session-incidents.json
  * Duration: <10 minutes for 10K files
+ *
+ * Proxy logs are analyzed incrementally: .delobotomize/audit-checkpoint.json
+ * records how far each log has been read and the results so far, so a
+ * repeat audit only parses new lines. The project inventory is likewise
+ * cached per directory (see inventory.ts). Pass `full` to rebuild both.
  */
-export async function runAudit(): Promise<void> {
+export async function runAudit(options: AuditOptions = {}): Promise<void> {
   const spinner = ora('Running audit phase...').start();
 
   try {
@@ -29,7 +59,10 @@ export async function runAudit(): Promise<void> {
 
     // Step 1: Scan project structure
     spinner.text = 'Scanning project structure...';
-    const fileInventory = await scanProjectStructure(projectRoot);
+    const fileInventory = await scanProjectStructure(projectRoot, {
+      cachePath: path.join(delobotomizeDir, INVENTORY_CACHE_FILE),
+      full: options.full
+    });
     await fs.writeFile(
       path.join(auditDir, 'file-inventory.json'),
       JSON.stringify(fileInventory, null, 2)
@@ -37,7 +70,7 @@ export async function runAudit(): Promise<void> {
 
     // Step 2: Parse proxy logs
     spinner.text = 'Parsing proxy logs...';
-    const sessionIncidents = await parseProxyLogs(delobotomizeDir);
+    const sessionIncidents = await parseProxyLogs(delobotomizeDir, {}, options.full);
     await fs.writeFile(
       path.join(auditDir, 'session-incidents.json'),
       JSON.stringify(sessionIncidents, null, 2)
@@ -54,6 +87,14 @@ export async function runAudit(): Promise<void> {
     spinner.succeed(chalk.green('✓ Audit phase completed'));
     console.log(chalk.gray(`  Run ID: ${runId}`));
     console.log(chalk.gray(`  Output: ${auditDir}`));
+    const { scan } = fileInventory;
+    console.log(chalk.gray(
+      `  Inventory: ${fileInventory.totalFiles} files in ${scan.wallMs}ms ` +
+      `(${scan.filesScanned} scanned, ${scan.filesReused} reused from cache)`
+    ));
+    if (sessionIncidents.scan) {
+      console.log(chalk.gray(`  Proxy log: ${sessionIncidents.scan.linesRead} new lines (${sessionIncidents.scan.mode} scan)`));
+    }
 
   } catch (error) {
     spinner.fail('Audit phase failed');
@@ -65,218 +106,244 @@ function generateRunId(): string {
   return `run-${Date.now()}`;
 }
 
-async function scanProjectStructure(projectRoot: string): Promise<any> {
-  const inventory: any = {
-    totalFiles: 0,
-    totalDirectories: 0,
-    gitTracked: false,
-    hasTests: false,
-    hasDocs: false,
-    languages: new Set(),
-    filesByExtension: {},
-    largeFiles: [],
-    recentlyModified: []
-  };
-
-  // Check if git repository
-  try {
-    execSync('git rev-parse --git-dir', { cwd: projectRoot, stdio: 'ignore' });
-    inventory.gitTracked = true;
-  } catch {
-    inventory.gitTracked = false;
-  }
-
-  // Recursively scan directory
-  async function scanDir(dir: string): Promise<void> {
-    const entries = await fs.readdir(dir, { withFileTypes: true });
-
-    for (const entry of entries) {
-      const fullPath = path.join(dir, entry.name);
-      const relativePath = path.relative(projectRoot, fullPath);
-
-      // Skip node_modules, .git, dist, etc.
-      if (shouldSkip(entry.name)) continue;
-
-      if (entry.isDirectory()) {
-        inventory.totalDirectories++;
-        await scanDir(fullPath);
-      } else if (entry.isFile()) {
-        inventory.totalFiles++;
-
-        const ext = path.extname(entry.name);
-        if (ext) {
-          inventory.filesByExtension[ext] = (inventory.filesByExtension[ext] || 0) + 1;
-          inventory.languages.add(ext);
-        }
-
-        // Check for test files
-        if (entry.name.includes('test') || entry.name.includes('spec')) {
-          inventory.hasTests = true;
-        }
-
-        // Check for documentation
-        if (entry.name.match(/readme|docs|documentation/i)) {
-          inventory.hasDocs = true;
-        }
-
-        // Check file size
-        const stats = await fs.stat(fullPath);
-        if (stats.size > 1000000) { // Files > 1MB
-          inventory.largeFiles.push({
-            path: relativePath,
-            size: stats.size,
-            modified: stats.mtime
-          });
-        }
-
-        // Track recently modified (last 24 hours)
-        const dayAgo = Date.now() - 24 * 60 * 60 * 1000;
-        if (stats.mtime.getTime() > dayAgo) {
-          inventory.recentlyModified.push({
-            path: relativePath,
-            modified: stats.mtime
-          });
-        }
-      }
-    }
-  }
-
-  function shouldSkip(name: string): boolean {
-    const skipList = [
-      'node_modules',
-      '.git',
-      '.delobotomize',
-      'dist',
-      'build',
-      'coverage',
-      '.next',
-      '.nuxt',
-      'vendor',
-      '__pycache__'
-    ];
-    return skipList.includes(name) || name.startsWith('.');
-  }
-
-  await scanDir(projectRoot);
-
-  inventory.languages = Array.from(inventory.languages);
-  inventory.largeFiles.sort((a, b) => b.size - a.size).slice(0, 10);
-  inventory.recentlyModified.sort((a, b) => b.modified - a.modified).slice(0, 20);
-
-  return inventory;
+interface LogAggregates {
+  totalRequests: number;
+  successCount: number;
+  totalTokens: number;
+  totalCost: number;
+  totalLatency: number;
+  lastSuccessAt: string | null; // for stall detection across runs
+  rateLimits: any[];
+  errors: any[];
+  stalls: any[];
+  contextSaturations: any[];
+  reasoningOverflows: any[];
+  authFailures: any[];
 }
 
-async function parseProxyLogs(delobotomizeDir: string): Promise<any> {
-  const proxyLogPath = path.join(delobotomizeDir, 'proxy.log');
-  const parser = new Parser();
-
-  const incidents: any = {
+function emptyAggregates(): LogAggregates {
+  return {
     totalRequests: 0,
+    successCount: 0,
+    totalTokens: 0,
+    totalCost: 0,
+    totalLatency: 0,
+    lastSuccessAt: null,
     rateLimits: [],
     errors: [],
     stalls: [],
     contextSaturations: [],
     reasoningOverflows: [],
-    authFailures: [],
-    successfulRequests: [],
-    averageLatency: 0,
-    totalTokens: 0,
-    totalCost: 0
+    authFailures: []
   };
+}
 
-  try {
-    await fs.access(proxyLogPath);
-  } catch {
-    incidents.note = 'No proxy.log found';
-    return incidents;
+/**
+ * Stream every proxy log source into running aggregates.
+ *
+ * Unless `full` is set, aggregates and read positions are restored from
+ * .delobotomize/audit-checkpoint.json, so only lines appended since the
+ * last audit are parsed, and the checkpoint is updated afterwards. A
+ * filtered audit covers a slice of the log and reads it in full without
+ * touching the checkpoint.
+ */
+async function parseProxyLogs(
+  delobotomizeDir: string,
+  filter: SegmentFilter = {},
+  full: boolean = false
+): Promise<any> {
+  const proxyLogPath = path.join(delobotomizeDir, 'proxy.log');
+  const checkpointPath = path.join(delobotomizeDir, CHECKPOINT_FILE);
+  const parser = new Parser();
+
+  const filtered = Boolean(filter.from || filter.to || filter.sessionId);
+  let checkpoint = full || filtered ? null : await loadCheckpoint<LogAggregates>(checkpointPath);
+
+  // Every log source (proxy.log, plus proxy.w<N>.log per worker of a
+  // multi-process proxy), each as rotated segments followed by its active log
+  const sources = await Promise.all((await listLogSources(proxyLogPath)).map(async source => ({
+    key: path.basename(source),
+    segments: await listLogSegments(source)
+  })));
+
+  // Logs wiped or replaced since the checkpoint restart their segment
+  // numbers; its positions and aggregates no longer apply
+  let reset = false;
+  if (checkpoint) {
+    for (const { key, segments } of sources) {
+      if (await sourceReset(segments, checkpoint.sources[key])) {
+        reset = true;
+        break;
+      }
+    }
+    if (reset) checkpoint = null;
+  }
+
+  const aggregates = checkpoint?.aggregates ?? emptyAggregates();
+  const reads: { key: string; segments: LogSegment[]; activeOffset: number }[] = [];
+  const streams: AsyncIterable<{ line: string }>[] = [];
+  let foundLog = false;
+
+  for (const { key, segments } of sources) {
+    if (segments.length > 0) foundLog = true;
+
+    // Skip segments the index rules out, and those the checkpoint covers
+    const plan = await planSource(filterSegments(segments, filter), checkpoint?.sources[key]);
+    const read = {
+      key,
+      segments,
+      activeOffset: plan.find(step => step.segment.number === null)?.offset ?? 0
+    };
+    reads.push(read);
+    streams.push(readPlan(plan, read));
   }
 
-  // Read and parse log file
-  const content = await fs.readFile(proxyLogPath, 'utf-8');
-  const lines = content.split('\n').filter(line => line.trim());
+  if (!foundLog) {
+    return { ...summarize(emptyAggregates()), note: 'No proxy.log found' };
+  }
 
-  let totalLatency = 0;
+  // Present all sources as one time-ordered log
+  let linesRead = 0;
+  for await (const { line } of mergeStreamsByTimestamp(streams)) {
+    if (!line.trim()) continue;
+    linesRead++;
 
-  for (const line of lines) {
     try {
       const entry = parser.parse(line);
-      incidents.totalRequests++;
-
-      // Track tokens and cost
-      incidents.totalTokens += entry.prompt_tokens + entry.completion_tokens + entry.reasoning_tokens;
-      incidents.totalCost += entry.cost;
-      totalLatency += entry.latency_ms;
-
-      // Categorize incidents by status
-      if (entry.status === 429) {
-        incidents.rateLimits.push({
-          timestamp: entry.timestamp,
-          session_id: entry.session_id,
-          model: entry.model
-        });
-      } else if (entry.status === 403) {
-        incidents.authFailures.push({
-          timestamp: entry.timestamp,
-          session_id: entry.session_id
-        });
-      } else if (entry.status >= 400) {
-        incidents.errors.push({
-          timestamp: entry.timestamp,
-          status: entry.status,
-          session_id: entry.session_id,
-          model: entry.model
-        });
-      } else if (entry.status === 200) {
-        incidents.successfulRequests.push({
-          timestamp: entry.timestamp,
-          tokens: entry.prompt_tokens + entry.completion_tokens + entry.reasoning_tokens,
-          cost: entry.cost
-        });
-      }
-
-      // Check for context saturation (>85% of 200k context window)
-      const contextUsage = (entry.prompt_tokens + entry.reasoning_tokens) / 200000;
-      if (contextUsage > 0.85) {
-        incidents.contextSaturations.push({
-          timestamp: entry.timestamp,
-          usage: contextUsage,
-          tokens: entry.prompt_tokens + entry.reasoning_tokens
-        });
-      }
-
-      // Check for reasoning overflow (>80% of 10k budget)
-      if (entry.reasoning_tokens > 8000) {
-        incidents.reasoningOverflows.push({
-          timestamp: entry.timestamp,
-          tokens: entry.reasoning_tokens
-        });
-      }
-
+      if (!matchesFilter(entry.timestamp, entry.session_id, filter)) continue;
+      addEntry(aggregates, entry);
     } catch (error) {
       // Skip malformed lines
       continue;
     }
   }
 
-  // Calculate average latency
-  if (incidents.totalRequests > 0) {
-    incidents.averageLatency = Math.round(totalLatency / incidents.totalRequests);
+  if (!filtered) {
+    const positions: Record<string, SourcePosition> = {};
+    for (const read of reads) {
+      positions[read.key] = await positionAfter(read.segments, read.activeOffset);
+    }
+    await saveCheckpoint(checkpointPath, {
+      version: CHECKPOINT_VERSION,
+      updated_at: new Date().toISOString(),
+      sources: positions,
+      aggregates
+    });
   }
 
-  // Detect stalls (gaps > 5 minutes between requests)
-  const timestamps = incidents.successfulRequests.map((r: any) => new Date(r.timestamp).getTime());
-  for (let i = 1; i < timestamps.length; i++) {
-    const gap = (timestamps[i] - timestamps[i - 1]) / 1000; // seconds
-    if (gap > 300) { // 5 minutes
-      incidents.stalls.push({
-        startTime: new Date(timestamps[i - 1]).toISOString(),
-        endTime: new Date(timestamps[i]).toISOString(),
-        duration: gap
-      });
+  return {
+    ...summarize(aggregates),
+    scan: { mode: checkpoint ? 'incremental' : 'full', linesRead, ...(reset ? { reset } : {}) }
+  };
+}
+
+/**
+ * Lines of one source, following its plan; tracks how far into the active
+ * log it has read
+ */
+async function* readPlan(plan: SegmentPlan[], read: { activeOffset: number }): AsyncGenerator<{ line: string }> {
+  for (const step of plan) {
+    // Compressed since it was listed, or an active log rotated away
+    const segment = await locateSegment(step.segment);
+    if (!segment) continue;
+
+    for await (const { line, end } of readSegmentLines(segment, step.offset)) {
+      if (segment.number === null) read.activeOffset = end;
+      yield { line };
+    }
+  }
+}
+
+function addEntry(aggregates: LogAggregates, entry: ProxyLogEntry): void {
+  aggregates.totalRequests++;
+
+  // Track tokens and cost
+  aggregates.totalTokens += entry.prompt_tokens + entry.completion_tokens + entry.reasoning_tokens;
+  aggregates.totalCost += entry.cost;
+  aggregates.totalLatency += entry.latency_ms;
+
+  // Categorize incidents by status
+  if (entry.status === 429) {
+    aggregates.rateLimits.push({
+      timestamp: entry.timestamp,
+      session_id: entry.session_id,
+      model: entry.model,
+      // Rejected by the proxy's own limiter rather than by the API
+      local: entry.method.startsWith('RATELIMIT ')
+    });
+  } else if (entry.status === 403) {
+    aggregates.authFailures.push({
+      timestamp: entry.timestamp,
+      session_id: entry.session_id
+    });
+  } else if (entry.status >= 400) {
+    aggregates.errors.push({
+      timestamp: entry.timestamp,
+      status: entry.status,
+      session_id: entry.session_id,
+      model: entry.model
+    });
+  } else if (entry.status === 200) {
+    aggregates.successCount++;
+
+    // Detect stalls (gaps > 5 minutes between successful requests)
+    if (aggregates.lastSuccessAt) {
+      const gap = (new Date(entry.timestamp).getTime() - new Date(aggregates.lastSuccessAt).getTime()) / 1000; // seconds
+      if (gap > 300) { // 5 minutes
+        aggregates.stalls.push({
+          startTime: aggregates.lastSuccessAt,
+          endTime: entry.timestamp,
+          duration: gap
+        });
+      }
     }
+    aggregates.lastSuccessAt = entry.timestamp;
   }
 
-  return incidents;
+  // Check for context saturation (>85% of 200k context window). A request
+  // the proxy's pre-flight check rejected only has an estimate.
+  const preflight = entry.status === 400 && entry.method.startsWith('PREFLIGHT ');
+  const contextTokens = preflight ? entry.estimated_tokens ?? 0 : entry.prompt_tokens + entry.reasoning_tokens;
+  const contextUsage = contextTokens / 200000;
+  if (contextUsage > 0.85) {
+    aggregates.contextSaturations.push({
+      timestamp: entry.timestamp,
+      usage: contextUsage,
+      tokens: contextTokens,
+      ...(preflight ? { estimated: true } : {})
+    });
+  }
+
+  // Check for reasoning overflow (>80% of 10k budget)
+  if (entry.reasoning_tokens > 8000) {
+    aggregates.reasoningOverflows.push({
+      timestamp: entry.timestamp,
+      tokens: entry.reasoning_tokens
+    });
+  }
+}
+
+function summarize(aggregates: LogAggregates): any {
+  return {
+    totalRequests: aggregates.totalRequests,
+    successCount: aggregates.successCount,
+    rateLimits: aggregates.rateLimits,
+    errors: aggregates.errors,
+    stalls: aggregates.stalls,
+    contextSaturations: aggregates.contextSaturations,
+    reasoningOverflows: aggregates.reasoningOverflows,
+    authFailures: aggregates.authFailures,
+    averageLatency: aggregates.totalRequests > 0 ? Math.round(aggregates.totalLatency / aggregates.totalRequests) : 0,
+    totalTokens: aggregates.totalTokens,
+    totalCost: aggregates.totalCost
+  };
+}
+
+function matchesFilter(timestamp: string, sessionId: string, filter: SegmentFilter): boolean {
+  if (filter.sessionId && sessionId !== filter.sessionId) return false;
+  if (filter.from && new Date(timestamp) < filter.from) return false;
+  if (filter.to && new Date(timestamp) > filter.to) return false;
+  return true;
 }
 
 async function generateAuditReport(inventory: any, incidents: any): Promise<string> {
@@ -289,6 +356,7 @@ async function generateAuditReport(inventory: any, incidents: any): Promise<stri
 - **Has Tests**: ${inventory.hasTests ? 'Yes' : 'No'}
 - **Has Docs**: ${inventory.hasDocs ? 'Yes' : 'No'}
 - **Languages**: ${inventory.languages.join(', ')}
+- **Inventory Scan**: ${inventory.scan.wallMs}ms (${inventory.scan.filesScanned} files scanned, ${inventory.scan.filesReused} reused from cache)
 
 ## File Statistics
 ${Object.entries(inventory.filesByExtension)
@@ -309,7 +377,7 @@ ${inventory.recentlyModified.slice(0, 10).map((f: any) =>
 
 ## Session Incidents
 - **Total Requests**: ${incidents.totalRequests}
-- **Successful**: ${incidents.successfulRequests?.length || 0}
+- **Successful**: ${incidents.successCount || 0}
 - **Rate Limits**: ${incidents.rateLimits?.length || 0}
 - **Errors**: ${incidents.errors?.length || 0}
 - **Auth Failures**: ${incidents.authFailures?.length || 0}
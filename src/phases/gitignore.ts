@@ -0,0 +1,133 @@
+/**
+ * Gitignore Matching
+ *
+ * Enough of git's ignore rules for the audit's inventory walk to prune the
+ * same paths git does: comments, negation, directory-only patterns,
+ * anchored patterns, `*`, `?`, `[...]` and `**`. Each .gitignore applies
+ * to paths below its own directory; later rules override earlier ones.
+ */
+
+interface IgnoreRule {
+  base: string; // directory of the .gitignore, relative to the project root
+  pattern: RegExp;
+  negate: boolean;
+  dirOnly: boolean;
+  anchored: boolean; // matched against the path, not just the name
+}
+
+export class IgnoreRules {
+  private rules: IgnoreRule[];
+
+  constructor(rules: IgnoreRule[] = []) {
+    this.rules = rules;
+  }
+
+  /**
+   * Rules extended with a .gitignore found in `base`
+   */
+  extend(base: string, content: string): IgnoreRules {
+    const added = parseIgnoreFile(base, content);
+    return added.length > 0 ? new IgnoreRules([...this.rules, ...added]) : this;
+  }
+
+  /**
+   * Whether a path (relative to the project root, `/`-separated) is ignored
+   */
+  ignores(relativePath: string, isDirectory: boolean): boolean {
+    const name = relativePath.slice(relativePath.lastIndexOf('/') + 1);
+    let ignored = false;
+
+    for (const rule of this.rules) {
+      if (rule.dirOnly && !isDirectory) continue;
+      if (ignored === !rule.negate) continue; // can't change the outcome
+
+      if (rule.base && !relativePath.startsWith(rule.base + '/')) continue;
+
+      const subject = !rule.anchored ? name : rule.base ? relativePath.slice(rule.base.length + 1) : relativePath;
+      if (rule.pattern.test(subject)) ignored = !rule.negate;
+    }
+
+    return ignored;
+  }
+}
+
+function parseIgnoreFile(base: string, content: string): IgnoreRule[] {
+  const rules: IgnoreRule[] = [];
+
+  for (const raw of content.split(/\r?\n/)) {
+    // Trailing spaces are ignored unless escaped
+    let line = raw.replace(/(?<!\\)\s+$/, '');
+    if (!line || line.startsWith('#')) continue;
+
+    let negate = false;
+    if (line.startsWith('!')) {
+      negate = true;
+      line = line.slice(1);
+    } else if (line.startsWith('\\!') || line.startsWith('\\#')) {
+      line = line.slice(1);
+    }
+
+    let dirOnly = false;
+    if (line.endsWith('/')) {
+      dirOnly = true;
+      line = line.slice(0, -1);
+    }
+
+    // A slash anywhere but the end ties the pattern to this directory
+    const anchored = line.includes('/');
+    if (line.startsWith('/')) line = line.slice(1);
+    if (!line) continue;
+
+    rules.push({ base, pattern: globToRegExp(line), negate, dirOnly, anchored });
+  }
+
+  return rules;
+}
+
+function globToRegExp(glob: string): RegExp {
+  let source = '';
+
+  for (let i = 0; i < glob.length; i++) {
+    const char = glob[i];
+
+    if (char === '*') {
+      if (glob[i + 1] === '*') {
+        const atStart = i === 0 || glob[i - 1] === '/';
+        const atEnd = i + 2 === glob.length;
+        if (atStart && glob[i + 2] === '/') {
+          source += '(?:.*/)?'; // "**/" matches zero or more directories
+          i += 2;
+          continue;
+        }
+        if (atStart && atEnd) {
+          source += '.*'; // trailing "/**" matches everything inside
+          i += 1;
+          continue;
+        }
+      }
+      source += '[^/]*';
+    } else if (char === '?') {
+      source += '[^/]';
+    } else if (char === '[') {
+      const close = glob.indexOf(']', i + 2);
+      if (close === -1) {
+        source += '\\[';
+        continue;
+      }
+      let body = glob.slice(i + 1, close).replace(/\\/g, '\\\\');
+      if (body.startsWith('!')) body = '^' + body.slice(1);
+      source += `[${body}]`;
+      i = close;
+    } else if (char === '\\' && i + 1 < glob.length) {
+      source += escapeRegExp(glob[++i]);
+    } else {
+      source += escapeRegExp(char);
+    }
+  }
+
+  return new RegExp(`^${source}$`);
+}
+
+function escapeRegExp(value: string): string {
+  return value.replace(/[.*+?^${}()|[\]\\/]/g, '\\$&');
+}
@@ -0,0 +1,332 @@
+import fs from 'fs/promises';
+import path from 'path';
+import crypto from 'crypto';
+import { execSync } from 'child_process';
+import { IgnoreRules } from './gitignore.js';
+
+/**
+ * Project Inventory
+ *
+ * Walks the project tree for the audit phase, keeping up to
+ * SCAN_CONCURRENCY directories in flight, and prunes build output,
+ * dot-directories and anything .gitignore excludes.
+ *
+ * Each directory's listing (subdirectories, file sizes and mtimes) is cached
+ * in .delobotomize/inventory-cache.json, keyed by the directory's mtime.
+ * Adding, removing or renaming an entry changes that mtime, so on a later
+ * audit an unchanged directory costs one stat instead of a readdir plus a
+ * stat per file. Editing a file in place leaves its directory's mtime
+ * alone; a full scan (`delobotomize audit --full`) refreshes such files.
+ */
+
+export const INVENTORY_CACHE_FILE = 'inventory-cache.json';
+
+const CACHE_VERSION = 1;
+const SCAN_CONCURRENCY = 32;
+
+const LARGE_FILE_BYTES = 1000000; // Files > 1MB
+const RECENT_MS = 24 * 60 * 60 * 1000; // Last 24 hours
+
+const SKIP_NAMES = new Set([
+  'node_modules',
+  '.git',
+  '.delobotomize',
+  'dist',
+  'build',
+  'coverage',
+  '.next',
+  '.nuxt',
+  'vendor',
+  '__pycache__'
+]);
+
+type CachedFile = [name: string, size: number, mtimeMs: number];
+
+interface CachedDirectory {
+  mtimeMs: number;
+  rulesKey: string; // ignore rules inherited when this listing was taken
+  gitignore: { size: number; mtimeMs: number; content: string } | null;
+  dirs: string[];
+  files: CachedFile[];
+}
+
+interface InventoryCache {
+  version: number;
+  dirs: Record<string, CachedDirectory>;
+}
+
+interface DirectoryTask {
+  rel: string; // '/'-separated, '' for the project root
+  rules: IgnoreRules;
+  rulesKey: string;
+}
+
+export interface ScanOptions {
+  cachePath?: string;
+  full?: boolean; // ignore the cache and re-list every directory
+  concurrency?: number;
+}
+
+export interface ScanStats {
+  wallMs: number;
+  filesScanned: number;
+  filesReused: number;
+  directoriesScanned: number;
+  directoriesReused: number;
+}
+
+export async function scanProjectStructure(projectRoot: string, options: ScanOptions = {}): Promise<any> {
+  const started = Date.now();
+  const concurrency = options.concurrency || SCAN_CONCURRENCY;
+  const previous = options.cachePath && !options.full ? await loadCache(options.cachePath) : null;
+  const cache: InventoryCache = { version: CACHE_VERSION, dirs: {} };
+  const stats: ScanStats = { wallMs: 0, filesScanned: 0, filesReused: 0, directoriesScanned: 0, directoriesReused: 0 };
+
+  async function visit(task: DirectoryTask): Promise<DirectoryTask[]> {
+    const dir = path.join(projectRoot, task.rel);
+    let mtimeMs: number;
+    try {
+      mtimeMs = (await fs.stat(dir)).mtimeMs;
+    } catch {
+      return []; // removed while scanning
+    }
+
+    const cached = previous?.dirs[task.rel];
+    let listing: CachedDirectory | null = null;
+    if (cached && cached.mtimeMs === mtimeMs && cached.rulesKey === task.rulesKey && (await gitignoreUnchanged(dir, cached))) {
+      listing = cached;
+      stats.directoriesReused++;
+      stats.filesReused += cached.files.length;
+    } else {
+      listing = await listDirectory(dir, task, mtimeMs, concurrency);
+      if (!listing) return [];
+      stats.directoriesScanned++;
+      stats.filesScanned += listing.files.length;
+    }
+    cache.dirs[task.rel] = listing;
+
+    // Rules from this directory's .gitignore apply to everything below it
+    let rules = task.rules;
+    let rulesKey = task.rulesKey;
+    if (listing.gitignore) {
+      rules = rules.extend(task.rel, listing.gitignore.content);
+      rulesKey = hash(`${rulesKey}\0${task.rel}\0${listing.gitignore.content}`);
+    }
+
+    return listing.dirs.map(name => ({ rel: join(task.rel, name), rules, rulesKey }));
+  }
+
+  // Patterns git applies repository-wide on top of .gitignore files
+  const exclude = await readText(path.join(projectRoot, '.git', 'info', 'exclude'));
+  const root: DirectoryTask = {
+    rel: '',
+    rules: new IgnoreRules().extend('', exclude ?? ''),
+    rulesKey: exclude ? hash(exclude) : ''
+  };
+
+  await runPool([root], visit, concurrency);
+
+  if (options.cachePath) await saveCache(options.cachePath, cache);
+  stats.wallMs = Date.now() - started;
+
+  return buildInventory(projectRoot, cache, stats);
+}
+
+/**
+ * Process tasks, and the tasks they return, with at most `limit` in flight
+ */
+function runPool<T>(initial: T[], worker: (task: T) => Promise<T[]>, limit: number): Promise<void> {
+  const queue = [...initial];
+  let active = 0;
+
+  return new Promise((resolve, reject) => {
+    let failed = false;
+    const pump = () => {
+      if (failed) return;
+      if (queue.length === 0 && active === 0) return resolve();
+
+      while (active < limit && queue.length > 0) {
+        const task = queue.shift()!;
+        active++;
+        worker(task).then(
+          next => {
+            active--;
+            queue.push(...next);
+            pump();
+          },
+          error => {
+            failed = true;
+            reject(error);
+          }
+        );
+      }
+    };
+    pump();
+  });
+}
+
+async function listDirectory(
+  dir: string,
+  task: DirectoryTask,
+  mtimeMs: number,
+  concurrency: number
+): Promise<CachedDirectory | null> {
+  let entries;
+  try {
+    entries = await fs.readdir(dir, { withFileTypes: true });
+  } catch {
+    return null; // unreadable or removed
+  }
+
+  let gitignore: CachedDirectory['gitignore'] = null;
+  if (entries.some(entry => entry.name === '.gitignore' && entry.isFile())) {
+    gitignore = await readGitignore(dir);
+  }
+  const rules = gitignore ? task.rules.extend(task.rel, gitignore.content) : task.rules;
+
+  const dirs: string[] = [];
+  const fileNames: string[] = [];
+  for (const entry of entries) {
+    // Skip node_modules, .git, dist, etc.
+    if (SKIP_NAMES.has(entry.name) || entry.name.startsWith('.')) continue;
+
+    const rel = join(task.rel, entry.name);
+    if (entry.isDirectory()) {
+      if (!rules.ignores(rel, true)) dirs.push(entry.name);
+    } else if (entry.isFile()) {
+      if (!rules.ignores(rel, false)) fileNames.push(entry.name);
+    }
+  }
+
+  const files: CachedFile[] = [];
+  for (let i = 0; i < fileNames.length; i += concurrency) {
+    const batch = fileNames.slice(i, i + concurrency);
+    const statted = await Promise.all(batch.map(name => fs.stat(path.join(dir, name)).catch(() => null)));
+    statted.forEach((stat, j) => {
+      if (stat) files.push([batch[j], stat.size, stat.mtimeMs]);
+    });
+  }
+
+  return { mtimeMs, rulesKey: task.rulesKey, gitignore, dirs, files };
+}
+
+function buildInventory(projectRoot: string, cache: InventoryCache, stats: ScanStats): any {
+  const inventory: any = {
+    totalFiles: 0,
+    totalDirectories: 0,
+    gitTracked: false,
+    hasTests: false,
+    hasDocs: false,
+    languages: [],
+    filesByExtension: {},
+    largeFiles: [],
+    recentlyModified: [],
+    scan: stats
+  };
+
+  // Check if git repository
+  try {
+    execSync('git rev-parse --git-dir', { cwd: projectRoot, stdio: 'ignore' });
+    inventory.gitTracked = true;
+  } catch {
+    inventory.gitTracked = false;
+  }
+
+  const languages = new Set<string>();
+  const largeFiles: CachedFile[] = [];
+  const recentlyModified: CachedFile[] = [];
+  const dayAgo = Date.now() - RECENT_MS;
+
+  for (const [rel, listing] of Object.entries(cache.dirs)) {
+    if (rel) inventory.totalDirectories++;
+
+    for (const [name, size, mtimeMs] of listing.files) {
+      const file: CachedFile = [join(rel, name), size, mtimeMs];
+      inventory.totalFiles++;
+
+      const ext = path.extname(name);
+      if (ext) {
+        inventory.filesByExtension[ext] = (inventory.filesByExtension[ext] || 0) + 1;
+        languages.add(ext);
+      }
+
+      // Check for test files
+      if (name.includes('test') || name.includes('spec')) {
+        inventory.hasTests = true;
+      }
+
+      // Check for documentation
+      if (name.match(/readme|docs|documentation/i)) {
+        inventory.hasDocs = true;
+      }
+
+      if (size > LARGE_FILE_BYTES) largeFiles.push(file);
+      if (mtimeMs > dayAgo) recentlyModified.push(file);
+    }
+  }
+
+  inventory.languages = Array.from(languages);
+  inventory.largeFiles = largeFiles
+    .sort((a, b) => b[1] - a[1])
+    .slice(0, 10)
+    .map(([filePath, size, mtimeMs]) => ({ path: filePath, size, modified: new Date(mtimeMs) }));
+  inventory.recentlyModified = recentlyModified
+    .sort((a, b) => b[2] - a[2])
+    .slice(0, 20)
+    .map(([filePath, , mtimeMs]) => ({ path: filePath, modified: new Date(mtimeMs) }));
+
+  return inventory;
+}
+
+async function gitignoreUnchanged(dir: string, cached: CachedDirectory): Promise<boolean> {
+  if (!cached.gitignore) return true; // a new .gitignore changes the directory mtime
+  try {
+    const stat = await fs.stat(path.join(dir, '.gitignore'));
+    return stat.size === cached.gitignore.size && stat.mtimeMs === cached.gitignore.mtimeMs;
+  } catch {
+    return false;
+  }
+}
+
+async function readGitignore(dir: string): Promise<CachedDirectory['gitignore']> {
+  const file = path.join(dir, '.gitignore');
+  try {
+    const [stat, content] = await Promise.all([fs.stat(file), fs.readFile(file, 'utf-8')]);
+    return { size: stat.size, mtimeMs: stat.mtimeMs, content };
+  } catch {
+    return null;
+  }
+}
+
+async function loadCache(cachePath: string): Promise<InventoryCache | null> {
+  try {
+    const cache = JSON.parse(await fs.readFile(cachePath, 'utf-8'));
+    return cache.version === CACHE_VERSION ? cache : null;
+  } catch {
+    return null;
+  }
+}
+
+async function saveCache(cachePath: string, cache: InventoryCache): Promise<void> {
+  // Write then rename, so an interrupted audit leaves the old cache intact
+  await fs.mkdir(path.dirname(cachePath), { recursive: true });
+  const tmp = `${cachePath}.tmp`;
+  await fs.writeFile(tmp, JSON.stringify(cache));
+  await fs.rename(tmp, cachePath);
+}
+
+async function readText(file: string): Promise<string | null> {
+  try {
+    return await fs.readFile(file, 'utf-8');
+  } catch {
+    return null;
+  }
+}
+
+function join(rel: string, name: string): string {
+  return rel ? `${rel}/${name}` : name;
+}
+
+function hash(value: string): string {
+  return crypto.createHash('sha1').update(value).digest('hex');
+}